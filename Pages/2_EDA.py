@@ -1,5 +1,7 @@
+import io
+import os
 
-
+import matplotlib.pyplot as plt
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -7,7 +9,10 @@ import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from scipy.stats import ttest_ind
+
+from config import DATA_PATH
+from eda_data import NUM_COLS, binned_summary, coarsen, file_signature, load_dataset, stratified_sample
+from eda_data import summarize, uniform_subsample, violin_density
 
 st.markdown("# Manish's Plan to Stop Machine Breakdowns")
 st.markdown("")
@@ -43,45 +48,92 @@ st.markdown("""# Manish's Plan to Stop Machine Breakdowns
 ---
 """)
 
-# Load data
-df = pd.read_csv('D:/PM/data.csv')
-
-# Create failure type
-def get_failure_type(row):
-    if row['TWF'] == 1:
-        return 'TWF'
-    elif row['HDF'] == 1:
-        return 'HDF'
-    elif row['PWF'] == 1:
-        return 'PWF'
-    elif row['OSF'] == 1:
-        return 'OSF'
-    elif row['RNF'] == 1:
-        return 'RNF'
+# -------------------- Cached data layer --------------------
+# Everything below is computed once per dataset file and shared across reruns
+# and sessions; the (mtime, size) signature in each key rebuilds the caches
+# when the file changes.
+@st.cache_data(show_spinner="Loading dataset...")
+def cached_dataset(path, signature):
+    return load_dataset(path)
+
+@st.cache_data(show_spinner=False)
+def cached_summary(path, signature):
+    return summarize(cached_dataset(path, signature))
+
+# Chunked passes for datasets too large to hold or plot row by row
+@st.cache_data(show_spinner="Summarizing dataset...")
+def cached_binned_summary(path, signature):
+    return binned_summary(path)
+
+@st.cache_data(show_spinner="Sampling dataset...")
+def cached_sample(path, signature, n_rows):
+    return stratified_sample(path, n_rows)
+
+# The pair plot is cached as the rendered PNG: redrawing 25 panels of every
+# row costs more than computing everything else on the page. seaborn's pair
+# plot takes no weights, so in sampled mode it gets a uniform subsample
+@st.cache_data(show_spinner="Drawing pair plot...")
+def cached_pairplot(path, signature, sample_rows=None):
+    if sample_rows:
+        data = uniform_subsample(cached_sample(path, signature, sample_rows))
     else:
-        return 'no failure'
+        data = cached_dataset(path, signature)
+    grid = sns.pairplot(data[NUM_COLS])
+    image = io.BytesIO()
+    grid.savefig(image, format="png", dpi=200, bbox_inches="tight")
+    plt.close(grid.figure)
+    return image.getvalue()
 
-df['failure_type'] = df.apply(get_failure_type, axis=1)
-df.drop(['TWF', 'HDF', 'PWF', 'OSF', 'RNF'], axis=1, inplace=True)
+# Load data
+data_path = st.sidebar.text_input("Dataset path", DATA_PATH)
+try:
+    signature = file_signature(data_path)
+except OSError:
+    st.error(f"Dataset not found: `{data_path}`")
+    st.stop()
+
+# Rendering mode: raw rows for files up to RAW_MAX_BYTES; above that the
+# browser only gets server-side summaries (histograms, box statistics, 2-D
+# densities) or a sample that keeps every failure row
+RAW_MAX_BYTES = 50 * 2**20
+RAW, BINNED, SAMPLED = "Raw rows", "Binned summaries", "Stratified sample"
+mode = st.sidebar.radio(
+    "Rendering", [RAW, BINNED, SAMPLED],
+    index=0 if os.path.getsize(data_path) <= RAW_MAX_BYTES else 1,
+    help="Binned and sampled modes read the file in chunks, so they work for datasets larger than memory.",
+)
+sample_rows = None
+if mode == SAMPLED:
+    sample_rows = int(st.sidebar.number_input("Non-failure rows to sample", 1_000, 1_000_000, 20_000, step=1_000))
+
+if mode == RAW:
+    df = cached_dataset(data_path, signature)
+    summary = cached_summary(data_path, signature)
+else:
+    # Counts, correlations and tests still cover every row
+    summary = cached_binned_summary(data_path, signature)
+    df = cached_sample(data_path, signature, sample_rows) if mode == SAMPLED else None
+    if df is not None:
+        st.sidebar.caption(f"Plotting {len(df):,} of {summary['rows']:,} rows (all failures kept).")
 
 st.markdown("### ✅ Check 1: How Often Do Machines Break?")
 st.markdown("What’s the distribution of the `Machine failure` label in the dataset?")
-fail_rate = df['Machine failure'].mean() * 100
+fail_rate = summary['failure_rate']
 success_rate = 100 - fail_rate
-fail_counts = df['failure_type'].value_counts(normalize=True) * 100
+fail_counts = summary['failure_type_share']
 
 st.markdown(f"- The success rate of the machine is **{success_rate:.2f}%**")
 st.markdown(f"-The highest type of failure is HDF(Heat Dissipation Failure) with 1.15% failure rate.")
 
-fig1 = px.histogram(df, x='failure_type', title='Failure Type Distribution')
+type_counts = summary['failure_type_counts']
+fig1 = px.bar(x=type_counts.index.astype(str), y=type_counts.values, title='Failure Type Distribution')
 fig1.update_layout(xaxis_title='Failure Type', yaxis_title='Count')
 st.plotly_chart(fig1)
 
 st.markdown("### ✅ Check 2: What Products Are We Making?")
 st.markdown("Distribution of the 'productID' or `Type` variable:")
 
-type_dist = df['Type'].value_counts(normalize=True) * 100
-type_dist.index = type_dist.index.map({'L': 'Low', 'M': 'Medium', 'H': 'High'})
+type_dist = summary['type_share']
 
 st.markdown(f"- Low: **{type_dist['Low']:.1f}%**")
 st.markdown(f"- Medium: **{type_dist['Medium']:.1f}%**")
@@ -95,12 +147,23 @@ fig2 = px.pie(
 st.plotly_chart(fig2)
 
 st.markdown("### ✅ Check 3: How Are Machines Running? Any Weird Numbers?")
-num_cols = ['Air temperature [K]', 'Process temperature [K]', 'Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]']
+num_cols = NUM_COLS
 st.markdown("Let’s look at machine conditions. Are there any outliers?")
 
+# Box and violin plots take no weights, so in sampled mode (failures
+# oversampled) they are drawn from the summary of every row instead
 fig3 = make_subplots(rows=len(num_cols), cols=1, subplot_titles=num_cols, vertical_spacing=0.04)
 for i, col in enumerate(num_cols):
-    fig3.add_trace(go.Box(x=df[col], name=col), row=i+1, col=1)
+    if mode == RAW:
+        fig3.add_trace(go.Box(x=df[col], name=col), row=i+1, col=1)
+    else:
+        box = summary['columns'][col]['box']
+        fig3.add_trace(go.Box(
+            y=[col], name=col, orientation='h',
+            q1=[box['q1']], median=[box['median']], q3=[box['q3']],
+            lowerfence=[box['lowerfence']], upperfence=[box['upperfence']],
+            mean=[box['mean']], sd=[box['sd']],
+        ), row=i+1, col=1)
 fig3.update_layout(height=1200, width=800, title="Box Plots of Continuous Variables")
 st.plotly_chart(fig3)
 
@@ -114,8 +177,15 @@ fig4 = make_subplots(
 )
 
 for i, col in enumerate(outlier_cols):
+    if mode == RAW:
+        trace = go.Histogram(x=df[col], name=col)
+    elif df is not None:
+        trace = go.Histogram(x=df[col], y=df['sample_weight'], histfunc='sum', name=col)
+    else:
+        counts, edges = coarsen(summary['columns'][col]['counts'], summary['columns'][col]['edges'])
+        trace = go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=edges[1] - edges[0], name=col)
     fig4.add_trace(
-        go.Histogram(x=df[col], name=col),
+        trace,
         row=1,
         col=i+1
     )
@@ -128,6 +198,9 @@ fig4.update_layout(
     showlegend=False
 )
 st.plotly_chart(fig4)
+if mode != RAW:
+    outliers = {col: summary['columns'][col]['box']['outliers'] for col in outlier_cols}
+    st.markdown("Rows outside the whiskers: " + ", ".join(f"{col} **{n:,}**" for col, n in outliers.items()))
 
 
 st.markdown("Rotational speed may or may not be actual outliers, therefore we'll keep them in the dataset for now. (same for torque )")
@@ -137,7 +210,7 @@ st.markdown("I need to spot red flags. Is there any correlation between the cont
 
 test_cols = num_cols
 
-corr = df[num_cols + ['Machine failure']].corr()
+corr = summary['corr']
 fig5 = px.imshow(corr, text_auto=True, title="Correlation Heatmap", zmin=-1, zmax=1)
 st.plotly_chart(fig5)
 
@@ -152,12 +225,7 @@ fig5.update_layout(
 st.markdown("Let’s test the hypothesis that continuous variables influence failures using statistical tests.")
 st.markdown("**Null Hypothesis**: There is no signifcant relationship between the different columns and Machine Failure. \n\n**Alternate Hypothesis**: There is a significant relationship between the different columns and the machine failure label.")
 
-results = []
-for col in test_cols:
-    failed = df[df['Machine failure'] == 1][col]
-    not_failed = df[df['Machine failure'] == 0][col]
-    stat, p = ttest_ind(failed, not_failed)
-    results.append((col, p))
+results = list(summary['ttests']['p_value'].items())
 
 for col, p in results:
     st.markdown(f"- **{col}**: p-value = {p:.4f} {'✅ Significant' if p < 0.05 else '❌ Not Significant'}")
@@ -166,7 +234,7 @@ st.markdown("**Conclusion**: test confirmed that `Air temperature`, `Process tem
 st.markdown("### ✅ Check 5: Does Product Type Change How Machines Run?")
 st.markdown("  Do product types affect machine conditions? Is there any correlation between the `Product ID` (`Type`) and the continuous variables? For example, is the `Rotational speed` higher for high-quality products than low-quality ones, or do some products stress the machines more??")
 
-num_cols = ['Air temperature [K]', 'Process temperature [K]', 'Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]']
+num_cols = NUM_COLS
 
 fig = make_subplots(
     rows=len(num_cols),
@@ -176,18 +244,38 @@ fig = make_subplots(
 )
 
 for i, col in enumerate(num_cols):
-    fig.add_trace(
-        go.Violin(
-            x=df['Type'],
-            y=df[col],
-            name=col,
-            box_visible=True,
-            meanline_visible=True,
-            showlegend=False
-        ),
-        row=i + 1,
-        col=1
-    )
+    if mode == RAW:
+        fig.add_trace(
+            go.Violin(
+                x=df['Type'],
+                y=df[col],
+                name=col,
+                box_visible=True,
+                meanline_visible=True,
+                showlegend=False
+            ),
+            row=i + 1,
+            col=1
+        )
+        continue
+
+    # Violin outlines from the binned density, one per Type, with the box on top
+    column = summary['columns'][col]
+    for pos, (product_type, binned) in enumerate(column['by_type'].items()):
+        centers, density = violin_density(binned['counts'], column['edges'])
+        half_width = 0.4 * density / density.max()
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([pos - half_width, (pos + half_width)[::-1]]),
+            y=np.concatenate([centers, centers[::-1]]),
+            fill='toself', mode='lines', line_width=1, name=product_type, showlegend=False,
+        ), row=i + 1, col=1)
+        box = binned['box']
+        fig.add_trace(go.Box(
+            x=[pos], q1=[box['q1']], median=[box['median']], q3=[box['q3']],
+            lowerfence=[box['lowerfence']], upperfence=[box['upperfence']], mean=[box['mean']],
+            width=0.08, name=product_type, showlegend=False,
+        ), row=i + 1, col=1)
+    fig.update_xaxes(tickvals=list(range(len(column['by_type']))), ticktext=list(column['by_type']), row=i + 1, col=1)
 
 fig.update_layout(
     height=2000,
@@ -201,15 +289,35 @@ st.markdown("**Conclusion**: low-quality products may stress machines more, and
 st.markdown("### ✅ Check 6: Are There Sneaky Patterns to Catch?")
 st.markdown("  Let’s look deeper. Are there any interactions or non-linear relationships between the variables that matter for predictive maintenance? For example, does the torque shoot up fast with rotational speed, or are there other patterns to help us predict breakdowns?")
 
-num_cols = df[['Air temperature [K]', 
-               'Process temperature [K]', 
-               'Rotational speed [rpm]', 
-               'Torque [Nm]', 
-               'Tool wear [min]']]
-
-fig = sns.pairplot(num_cols)
-
-st.pyplot(fig)
+if df is not None:
+    st.image(cached_pairplot(data_path, signature, sample_rows))
+    if mode == SAMPLED:
+        st.caption("Drawn from a uniform subsample of the stratified sample, so failures appear at their real share.")
+else:
+    # Pair grid of 2-D densities: only PAIR_BINS x PAIR_BINS counts per panel reach the browser
+    n = len(NUM_COLS)
+    fig6 = make_subplots(rows=n, cols=n, horizontal_spacing=0.02, vertical_spacing=0.02)
+    for i, row_col in enumerate(NUM_COLS):
+        for j, col in enumerate(NUM_COLS):
+            if i == j:
+                counts, edges = coarsen(summary['columns'][col]['counts'], summary['columns'][col]['edges'])
+                fig6.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=edges[1] - edges[0],
+                                      marker_line_width=0, showlegend=False), row=i + 1, col=j + 1)
+                continue
+            grid = summary['pairs'][(min(col, row_col, key=NUM_COLS.index), max(col, row_col, key=NUM_COLS.index))]
+            grid = grid if j < i else grid.T   # rows of grid are the first column's bins
+            (x_low, x_high), (y_low, y_high) = summary['ranges'][col], summary['ranges'][row_col]
+            dx, dy = (x_high - x_low) / summary['pair_bins'], (y_high - y_low) / summary['pair_bins']
+            fig6.add_trace(go.Heatmap(
+                z=np.log1p(grid.T).astype(np.float32), x0=x_low + dx / 2, dx=dx, y0=y_low + dy / 2, dy=dy,
+                colorscale='Blues', showscale=False,
+            ), row=i + 1, col=j + 1)
+            if i == n - 1:
+                fig6.update_xaxes(title_text=col, row=i + 1, col=j + 1)
+            if j == 0:
+                fig6.update_yaxes(title_text=row_col, row=i + 1, col=j + 1)
+    fig6.update_layout(height=1000, width=1000, title="Pairwise densities (log count per bin)")
+    st.plotly_chart(fig6)
 
 st.markdown("Among all possible combinations of continuous variables, Rotational Speed vs Torque have a negative correlation and process temperature vs air temperature have a positive correlation.")
 
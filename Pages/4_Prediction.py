@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import plotly.graph_objects as go
 
 st.title("🛠️ Machine Failure Prediction")
 
@@ -41,6 +42,8 @@ with st.form("prediction_form"):
     )
     type_input = type_display_to_backend[type_display]  # send backend-compatible code
 
+    simulate_wear = st.checkbox("Also simulate tool wear until failure", value=True)
+
     submit = st.form_submit_button("🔍 Predict")
 
 # On submission
@@ -71,3 +74,38 @@ if submit:
 
     except requests.exceptions.RequestException as e:
         st.error(f" API request failed: {e}")
+
+    # -------------------- Tool wear what-if --------------------
+    # Same readings, tool wear swept over the range the models were trained on
+    # (see simulate.py)
+    if simulate_wear:
+        try:
+            response = requests.post(
+                "http://localhost:8000/simulate", params={"curves": "true"}, json={"machines": [payload]}
+            )
+            response.raise_for_status()
+            simulation = response.json()
+            result = simulation["results"][0]
+
+            st.markdown("### ⏳ Tool Wear What-If")
+            if result["failure_at"] is None:
+                st.info("No failure is predicted at any higher tool wear for these readings.")
+            else:
+                st.write(
+                    f"**Failure predicted from** {result['failure_at']:.0f} min of tool wear "
+                    f"({result['remaining']:.0f} min from now): **{result['failure_type']}**, "
+                    f"failure probability {result['failure_probability']:.2f}"
+                )
+
+            fig = go.Figure(go.Scatter(
+                x=simulation["grid"], y=result["failure_probability_curve"], mode="lines", name="Failure probability"
+            ))
+            fig.add_vline(x=tool_wear_min, line_dash="dash", line_color="gray", annotation_text="now")
+            if result["failure_at"] is not None:
+                fig.add_vline(x=result["failure_at"], line_color="red", annotation_text="failure")
+            fig.update_layout(xaxis_title="Tool wear (minutes)", yaxis_title="Failure probability",
+                              yaxis_range=[0, 1])
+            st.plotly_chart(fig, use_container_width=True)
+
+        except requests.exceptions.RequestException as e:
+            st.error(f" Simulation request failed: {e}")
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import sys
+import types
+
+import joblib
+
+from cascade import Cascade
+
+# Default artifact locations (relative to the app working directory)
+PREPROCESSOR_PATH = "preprocessing.joblib"   # Preprocessing pipeline
+MODEL_PATH = "model_failure.joblib"          # Binary model: Failure / No Failure
+MODEL2_PATH = "failure_type.joblib"          # Multiclass model: Type of failure
+
+
+# Custom functions used inside preprocessing or model
+def kelvin_to_celsius(k_temp):
+    return k_temp - 273.15
+
+def ordinal_encoding(X):
+    mapping = {"L": 0, "M": 1, "H": 2}
+    return X.replace(mapping)
+
+
+def register_custom_functions():
+    """Expose the custom functions on __main__, where the pickles look for them."""
+    module_name = "__main__"
+    if module_name not in sys.modules:
+        sys.modules[module_name] = types.ModuleType(module_name)
+
+    setattr(sys.modules[module_name], "kelvin_to_celsius", kelvin_to_celsius)
+    setattr(sys.modules[module_name], "ordinal_encoding", ordinal_encoding)
+
+
+def load_preprocessor(path=PREPROCESSOR_PATH):
+    register_custom_functions()
+    return joblib.load(path)
+
+
+def load_artifacts(preprocessor_path=PREPROCESSOR_PATH, model_path=MODEL_PATH, model2_path=MODEL2_PATH):
+    """Load (preprocessor, model, model2) from disk."""
+    preprocessor = load_preprocessor(preprocessor_path)
+    model = joblib.load(model_path)
+    model2 = joblib.load(model2_path)
+    return preprocessor, model, model2
+
+
+def artifact_version(*paths):
+    """Short fingerprint of the artifact files (path, size, mtime), to tell loaded versions apart."""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+def load_cascade(preprocessor_path=PREPROCESSOR_PATH, model_path=MODEL_PATH, model2_path=MODEL2_PATH, version=None,
+                 **settings):
+    """Load the artifacts and wrap them in a serving Cascade (see cascade.py).
+
+    ``version`` defaults to a fingerprint of the files (see artifact_version).
+    """
+    paths = (preprocessor_path, model_path, model2_path)
+    return Cascade(*load_artifacts(*paths), version=version or artifact_version(*paths), **settings)
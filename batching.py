@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from metrics import Histogram
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row requests into one vectorized cascade call.
+
+    Rows wait until ``max_rows`` have gathered or ``max_wait_ms`` has passed,
+    whichever comes first. When fewer than ``max_concurrency`` batches are
+    running, pending rows go out immediately, so an idle server adds no
+    latency and batches only grow with load.
+
+    ``run_batch(records, threshold, probabilities)`` is an async callable
+    returning one result per record, in order. Rows are only batched with
+    rows that asked for the same threshold / probabilities options. If a
+    batch fails, its rows are retried one by one so a bad reading only fails
+    its own request.
+    """
+
+    def __init__(self, run_batch, max_rows=64, max_wait_ms=2.0, max_concurrency=1):
+        self.run_batch = run_batch
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrency = max_concurrency
+
+        self._pending = {}   # options -> [(record, future, enqueued_at)]
+        self._timers = {}    # options -> TimerHandle
+        self._in_flight = 0
+        self._tasks = set()
+
+        # Tuning metrics
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self.wait_ms = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100])
+
+    async def submit(self, record, threshold=None, probabilities=False):
+        """Queue one row and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        options = (threshold, probabilities)
+
+        pending = self._pending.setdefault(options, [])
+        pending.append((record, future, time.perf_counter()))
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        if len(pending) >= self.max_rows or self._in_flight < self.max_concurrency:
+            self._flush(options)
+        elif options not in self._timers:
+            self._timers[options] = loop.call_later(self.max_wait, self._flush, options)
+
+        return await future
+
+    def _flush(self, options):
+        timer = self._timers.pop(options, None)
+        if timer is not None:
+            timer.cancel()
+
+        pending = self._pending.pop(options, [])
+        while pending:
+            batch, pending = pending[:self.max_rows], pending[self.max_rows:]
+            self.queue_depth -= len(batch)
+            self._in_flight += 1
+            task = asyncio.ensure_future(self._run(batch, options))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch, options):
+        start = time.perf_counter()
+        self.batches += 1
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.wait_ms.observe((start - enqueued_at) * 1000.0)
+
+        records = [record for record, _, _ in batch]
+        try:
+            try:
+                results = await self.run_batch(records, *options)
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception:
+                if len(batch) == 1:
+                    raise
+                await asyncio.gather(*(self._run_one(item, options) for item in batch))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            # Rows that queued up behind this batch go out now rather than on their timer
+            for waiting in list(self._pending):
+                if self._in_flight < self.max_concurrency:
+                    self._flush(waiting)
+
+    async def _run_one(self, item, options):
+        record, future, _ = item
+        try:
+            result = (await self.run_batch([record], *options))[0]
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_rows": self.max_rows,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self._in_flight,
+            "batches": self.batches,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.wait_ms.snapshot(),
+        }
@@ -0,0 +1,60 @@
+"""Compare sklearn RandomForest inference with the flattened FlatForest engine.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_forest [--repeat 5]
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from artifacts import load_artifacts
+from forest import FlatForest
+
+BATCH_SIZES = [1, 64, 4096, 100_000]
+
+
+def best_time(fn, X, repeat):
+    fn(X)  # warm-up
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore", FutureWarning)
+    preprocessor, model, model2 = load_artifacts()
+    X = preprocessor.transform(pd.read_csv(args.data))
+    rng = np.random.default_rng(0)
+
+    print(f"{'model':<22}{'batch':>8}{'sklearn ms':>14}{'flat ms':>12}{'speedup':>10}")
+    for name, forest in [("model_failure", model), ("failure_type", model2)]:
+        start = time.perf_counter()
+        flat = FlatForest(forest)
+        print(f"{name}: packed {flat.n_trees} trees / {flat.node_count} nodes in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+        for batch_size in BATCH_SIZES:
+            Xb = X[rng.integers(0, len(X), batch_size)]
+            if not np.array_equal(forest.predict_proba(Xb), flat.predict_proba(Xb)):
+                raise AssertionError(f"{name}: predict_proba mismatch at batch size {batch_size}")
+
+            repeat = args.repeat if batch_size < 10_000 else 1
+            sk = best_time(forest.predict_proba, Xb, repeat)
+            fl = best_time(flat.predict_proba, Xb, repeat)
+            print(f"{name:<22}{batch_size:>8}{sk * 1000:>14.3f}{fl * 1000:>12.3f}{sk / fl:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
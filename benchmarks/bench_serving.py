@@ -0,0 +1,367 @@
+"""Latency and throughput of the serving stack, from single stages to the API over HTTP.
+
+Rows from data.csv are replayed against each stage in-process (preprocessor,
+each model alone, the two-stage cascade, records in -> results out) and
+against the FastAPI app over HTTP, started on a local uvicorn. Every target
+is run for a fixed time at each batch size and concurrency (closed loop:
+each client thread sends its next request as soon as the previous one
+returns), and p50/p95/p99 latency, rows/s and peak RSS are reported.
+Results are saved as JSON so runs can be diffed between commits. Run from
+the repository root:
+
+    python -m benchmarks.bench_serving [--duration 2] [--batch-sizes 1,64,1024] [--concurrency 1,4,16]
+                                       [--no-http] [--out results.json]
+    python -m benchmarks.bench_serving --compare before.json after.json [--tolerance 0.1]
+
+The API runs with the current environment (PREPROCESS_MODE, FOREST_ENGINE,
+MODEL_FORMAT, INFERENCE_WORKERS, ...), so one run measures one serving
+configuration. The load generator runs in this process, so at high
+concurrency it can saturate before the server does; compare rows/s with
+the server's CPU use before drawing conclusions.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from cascade import FIELD_NAMES
+from features import FeatureKernel
+
+IN_PROCESS_TARGETS = ["preprocess_sklearn", "preprocess_kernel", "model_failure", "failure_type", "cascade",
+                      "end_to_end"]
+
+
+def latency_summary(latencies):
+    ms = np.asarray(latencies) * 1000.0
+    if not ms.size:
+        return None
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": ms.mean(), "max": ms.max()}
+
+
+def peak_rss_mib(pid=None):
+    """Peak resident set size of this process, or of ``pid`` (Linux), in MiB."""
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def closed_loop(make_client, batches, concurrency, duration):
+    """Run ``concurrency`` threads, each calling its client on successive batches for ``duration`` seconds.
+
+    ``make_client()`` is called once per thread and returns a callable
+    taking a batch index. Returns (latencies, requests, rows, errors, seconds).
+    """
+    latencies = [[] for _ in range(concurrency)]
+    rows = [0] * concurrency
+    errors = [0] * concurrency
+    start_barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(k):
+        client = make_client()
+        i = k
+        start_barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            batch = i % len(batches)
+            start = time.perf_counter()
+            try:
+                client(batch)
+            except Exception:
+                errors[k] += 1
+            else:
+                latencies[k].append(time.perf_counter() - start)
+                rows[k] += len(batches[batch])
+            i += concurrency
+
+    threads = [threading.Thread(target=worker, args=(k,), daemon=True) for k in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline[0] = time.perf_counter() + duration
+    start = time.perf_counter()
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = [latency for per_thread in latencies for latency in per_thread]
+    return merged, len(merged), sum(rows), sum(errors), elapsed
+
+
+def result_entry(transport, target, batch_size, concurrency, run, rss):
+    latencies, requests, rows, errors, seconds = run
+    return {
+        "transport": transport,
+        "target": target,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "requests": requests,
+        "rows": rows,
+        "errors": errors,
+        "seconds": seconds,
+        "requests_per_s": requests / seconds,
+        "rows_per_s": rows / seconds,
+        "latency_ms": latency_summary(latencies),
+        "peak_rss_mib": rss,
+    }
+
+
+def print_entry(entry):
+    latency = entry["latency_ms"] or {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+    rss = entry["peak_rss_mib"]
+    print(f"{entry['transport']:<10}{entry['target']:<20}{entry['batch_size']:>7}{entry['concurrency']:>5}"
+          f"{latency['p50']:>10.3f}{latency['p95']:>10.3f}{latency['p99']:>10.3f}{entry['rows_per_s']:>13,.0f}"
+          f"{'' if rss is None else f'{rss:>10.0f}'}{'  errors=' + str(entry['errors']) if entry['errors'] else ''}")
+
+
+def print_header():
+    print(f"{'transport':<10}{'target':<20}{'batch':>7}{'conc':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'rows/s':>13}{'RSS MiB':>10}")
+
+
+# -------------------- In-process targets --------------------
+
+def in_process_clients(cascade, preprocessor, frames, records, processed):
+    """Per-target factories of batch-index -> work callables (see closed_loop)."""
+    kernel = cascade.kernel or FeatureKernel(preprocessor)
+    model, model2 = cascade.model, cascade.model2
+    # Only rows the binary model flags reach the failure-type model in the
+    # cascade; alone it is timed on the whole batch
+    return {
+        "preprocess_sklearn": lambda: lambda i: preprocessor.transform(frames[i]),
+        "preprocess_kernel": lambda: lambda i: kernel.transform(frames[i]),
+        "model_failure": lambda: lambda i: model.predict_proba(processed[i]),
+        "failure_type": lambda: lambda i: model2.predict_proba(processed[i]),
+        "cascade": lambda: lambda i: cascade.predict(processed[i]),
+        "end_to_end": lambda: lambda i: cascade.predict(cascade.transform_records(records[i])),
+    }
+
+
+def bench_in_process(df, batch_sizes, concurrencies, duration, targets, n_batches):
+    import artifacts
+
+    cascade = artifacts.load_cascade()
+    preprocessor = cascade.preprocessor
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in batch_sizes:
+        frames = [df.iloc[rng.integers(0, len(df), batch_size)].reset_index(drop=True) for _ in range(n_batches)]
+        records = [frame.rename(columns=FIELD_NAMES).to_dict("records") for frame in frames]
+        processed = [preprocessor.transform(frame) for frame in frames]
+        clients = in_process_clients(cascade, preprocessor, frames, records, processed)
+        for target in targets:
+            for concurrency in concurrencies:
+                run = closed_loop(clients[target], frames, concurrency, duration)
+                entry = result_entry("inprocess", target, batch_size, concurrency, run, peak_rss_mib())
+                print_entry(entry)
+                results.append(entry)
+    return results
+
+
+# -------------------- HTTP --------------------
+
+def wait_ready(url, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/readyz", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout} s")
+
+
+def start_server(port, timeout=120):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(f"http://127.0.0.1:{port}", timeout)
+    except Exception:
+        server.terminate()
+        raise
+    return server
+
+
+def http_client_factory(host, port, bodies, path):
+    def make_client():
+        # One keep-alive connection per client thread
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        headers = {"Content-Type": "application/json"}
+
+        def send(i):
+            connection.request("POST", path, body=bodies[i], headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+            if response.status != 200 or b'"error"' in payload:
+                raise RuntimeError(payload[:200])
+        return send
+    return make_client
+
+
+def bench_http(df, batch_sizes, concurrencies, duration, n_batches, url=None, port=8798):
+    server = None
+    if url is None:
+        server = start_server(port)
+        url = f"http://127.0.0.1:{port}"
+    else:
+        wait_ready(url, 30)
+    host, _, port = url.split("://", 1)[1].rstrip("/").partition(":")
+    port = int(port or 80)
+
+    rng = np.random.default_rng(0)
+    results = []
+    try:
+        for batch_size in batch_sizes:
+            frames = [df.iloc[rng.integers(0, len(df), batch_size)] for _ in range(n_batches)]
+            records = [frame.rename(columns=FIELD_NAMES).to_dict("records") for frame in frames]
+            if batch_size == 1:
+                target, path = "predict", "/predict"
+                bodies = [json.dumps(rows[0]) for rows in records]
+            else:
+                target, path = "predict_batch", "/predict/batch"
+                bodies = [json.dumps({"rows": rows}) for rows in records]
+            for concurrency in concurrencies:
+                run = closed_loop(http_client_factory(host, port, bodies, path), records, concurrency, duration)
+                rss = peak_rss_mib(server.pid) if server is not None else None
+                entry = result_entry("http", target, batch_size, concurrency, run, rss)
+                print_entry(entry)
+                results.append(entry)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return results
+
+
+# -------------------- Results --------------------
+
+def run_metadata(args):
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except Exception:
+            return None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    settings = ["PREPROCESS_MODE", "FOREST_ENGINE", "FLAT_FOREST_MAX_ROWS", "MODEL_FORMAT", "INFERENCE_WORKERS",
+                "POOL_BATCH_ROWS", "MICROBATCH_MAX_ROWS", "MICROBATCH_MAX_WAIT_MS", "RESULT_CACHE_SIZE"]
+    return {
+        "commit": commit or None,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "packages": {name: version(name) for name in ("numpy", "pandas", "sklearn", "fastapi", "uvicorn")},
+        "settings": {name: os.environ[name] for name in settings if name in os.environ},
+        "args": vars(args),
+    }
+
+
+def compare(before_path, after_path, tolerance):
+    """Print p50/p99/rows/s changes between two result files; returns the number of regressions."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    def key(entry):
+        return entry["transport"], entry["target"], entry["batch_size"], entry["concurrency"]
+
+    old = {key(entry): entry for entry in before["results"]}
+    print(f"{before_path} ({before['meta'].get('commit')}) -> {after_path} ({after['meta'].get('commit')})")
+    print(f"{'transport':<10}{'target':<20}{'batch':>7}{'conc':>5}{'p50 ms':>18}{'p99 ms':>18}{'rows/s':>24}")
+    regressions = 0
+    for entry in after["results"]:
+        previous = old.get(key(entry))
+        if previous is None or not entry["latency_ms"] or not previous["latency_ms"]:
+            continue
+        changes = {
+            "p50": entry["latency_ms"]["p50"] / previous["latency_ms"]["p50"] - 1,
+            "p99": entry["latency_ms"]["p99"] / previous["latency_ms"]["p99"] - 1,
+            "rows_per_s": entry["rows_per_s"] / previous["rows_per_s"] - 1,
+        }
+        regressed = changes["p50"] > tolerance or changes["rows_per_s"] < -tolerance
+        regressions += regressed
+        print(f"{entry['transport']:<10}{entry['target']:<20}{entry['batch_size']:>7}{entry['concurrency']:>5}"
+              f"{entry['latency_ms']['p50']:>10.3f} {changes['p50']:>+6.0%}"
+              f"{entry['latency_ms']['p99']:>10.3f} {changes['p99']:>+6.0%}"
+              f"{entry['rows_per_s']:>16,.0f} {changes['rows_per_s']:>+6.0%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%} (p50 latency or rows/s)")
+    return regressions
+
+
+def int_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per target, batch size and concurrency")
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 64, 1024])
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16])
+    parser.add_argument("--targets", default=",".join(IN_PROCESS_TARGETS),
+                        help=f"in-process targets (default: all of {', '.join(IN_PROCESS_TARGETS)})")
+    parser.add_argument("--batches", type=int, default=64, help="distinct batches replayed per batch size")
+    parser.add_argument("--no-in-process", dest="in_process", action="store_false")
+    parser.add_argument("--no-http", dest="http", action="store_false")
+    parser.add_argument("--url", help="benchmark an already running API instead of starting uvicorn")
+    parser.add_argument("--port", type=int, default=8798)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files and exit")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+
+    warnings.simplefilter("ignore", FutureWarning)
+    targets = [target for target in args.targets.split(",") if target]
+    unknown = set(targets) - set(IN_PROCESS_TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    df = pd.read_csv(args.data, encoding="utf-8-sig", usecols=list(FIELD_NAMES))
+    print_header()
+    results = []
+    if args.in_process:
+        results += bench_in_process(df, args.batch_sizes, args.concurrency, args.duration, targets, args.batches)
+    if args.http:
+        results += bench_http(df, args.batch_sizes, args.concurrency, args.duration, args.batches, args.url,
+                              args.port)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": run_metadata(args), "results": results}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
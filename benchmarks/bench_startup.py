@@ -0,0 +1,113 @@
+"""Measure API cold-start cost: import, deserialize and first-prediction latency.
+
+Every run happens in a fresh interpreter so imports are really cold. With
+--server a local uvicorn is also started to time port bind (/healthz) and
+readiness (/readyz). Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs 5] [--server] [--format packed]
+
+--format packed loads models.pack (write it with ``python packed.py``)
+instead of the joblib artifacts, as MODEL_FORMAT=packed does.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+CHILD = r"""
+import json, sys, time, warnings
+warnings.simplefilter("ignore", FutureWarning)
+warm = sys.argv[1] == "warm"
+packed = sys.argv[2] == "packed"
+t = {}
+
+start = time.perf_counter()
+import main
+t["import_app"] = time.perf_counter() - start
+
+start = time.perf_counter()
+import artifacts, cascade, packed as packed_format
+t["import_deps"] = time.perf_counter() - start
+
+start = time.perf_counter()
+loaded = packed_format.load_packed() if packed else artifacts.load_cascade()
+t["deserialize"] = time.perf_counter() - start
+
+if warm:
+    start = time.perf_counter()
+    cascade.warm_up(loaded)
+    t["warm_up"] = time.perf_counter() - start
+
+record = {"air_temperature_K": 300.0, "process_temperature_K": 310.0, "rotational_speed_rpm": 1500,
+          "torque_Nm": 40.0, "tool_wear_min": 100, "type": "L"}
+for name in ("first_prediction", "second_prediction"):
+    start = time.perf_counter()
+    loaded.predict(loaded.transform_records([record]))
+    t[name] = time.perf_counter() - start
+
+print(json.dumps(t))
+"""
+
+
+def run_child(mode, model_format):
+    out = subprocess.run([sys.executable, "-c", CHILD, mode, model_format], capture_output=True, text=True,
+                         check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(url)
+
+
+def run_server(port, model_format, timeout=120):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env={**os.environ, "MODEL_FORMAT": model_format},
+    )
+    try:
+        deadline = start + timeout
+        bound = wait_for(f"http://127.0.0.1:{port}/healthz", deadline)
+        ready = wait_for(f"http://127.0.0.1:{port}/readyz", deadline)
+        return {"server_bind": bound - start, "server_ready": ready - start}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(title, runs):
+    print(title)
+    for key in runs[0]:
+        values = [run[key] * 1000 for run in runs]
+        print(f"  {key:<20}{statistics.median(values):>10.1f} ms   (min {min(values):.1f}, max {max(values):.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--server", action="store_true", help="also time a local uvicorn until bind and ready")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--format", choices=["joblib", "packed"], default="joblib")
+    args = parser.parse_args()
+
+    summarize("Cold start, no warm-up", [run_child("cold", args.format) for _ in range(args.runs)])
+    summarize("Cold start, with warm-up", [run_child("warm", args.format) for _ in range(args.runs)])
+    if args.server:
+        summarize(f"uvicorn main:app ({os.getcwd()})", [run_server(args.port, args.format) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
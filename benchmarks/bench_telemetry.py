@@ -0,0 +1,53 @@
+"""Measure per-machine telemetry window throughput (updates per second).
+
+Readings are drawn from data.csv and assigned to random machines, in blocks
+the size a streaming consumer would push. Run from the repository root:
+
+    python -m benchmarks.bench_telemetry [--machines 50000] [--block 10000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from cascade import FIELD_NAMES
+from telemetry import MachineStates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--machines", type=int, default=50_000)
+    parser.add_argument("--block", type=int, default=10_000)
+    parser.add_argument("--updates", type=int, default=2_000_000)
+    parser.add_argument("--window", type=int, default=32)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data, encoding="utf-8-sig")
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(df), args.block)
+    columns = {field: df[col].to_numpy()[rows] for col, field in FIELD_NAMES.items()}
+    machine_ids = np.array([f"M{i:06d}" for i in range(args.machines)], dtype=object)
+
+    states = MachineStates(window=args.window)
+    # Register every machine first so growth isn't part of the measurement
+    for start in range(0, args.machines, args.block):
+        block = machine_ids[start:start + args.block]
+        states.update(block, {field: np.resize(values, len(block)) for field, values in columns.items()})
+
+    blocks = [machine_ids[rng.integers(0, args.machines, args.block)] for _ in range(args.updates // args.block)]
+    start = time.perf_counter()
+    for block in blocks:
+        states.update(block, columns)
+    elapsed = time.perf_counter() - start
+
+    n_updates = len(blocks) * args.block
+    stats = states.stats()
+    print(f"{stats['machines']:,} machines, window {args.window}, blocks of {args.block:,}")
+    print(f"{n_updates:,} updates in {elapsed:.2f} s: {n_updates / elapsed:,.0f} updates/s")
+    print(f"ring buffers: {stats['buffer_bytes'] / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from config import PREPROCESS_MODE, FOREST_ENGINE, FLAT_FOREST_MAX_ROWS
+from features import FeatureKernel, TYPE_CODES
+from forest import FlatForest
+from metrics import metrics, observe_stage
+
+# Failure type labels, keyed by model2's class codes. The notebook's
+# LabelEncoder (train.FAILURE_TYPE_LABELS) sorts HDF, OSF, PWF, RNF, TWF and
+# "no failure", the failed rows with no failure-mode flag set.
+label_mapping = {
+    0: "Heat Dissipation Failure",
+    1: "Overstrain Failure",
+    2: "Power Failure",
+    3: "Random Failures",
+    4: "Tool Wear",
+    5: "Unspecified Failure"
+}
+
+# API field names -> training column names
+COLUMN_NAMES = {
+    "air_temperature_K": "Air temperature [K]",
+    "process_temperature_K": "Process temperature [K]",
+    "rotational_speed_rpm": "Rotational speed [rpm]",
+    "torque_Nm": "Torque [Nm]",
+    "tool_wear_min": "Tool wear [min]",
+    "type": "Type"
+}
+
+# Training column names -> API field names
+FIELD_NAMES = {col: field for field, col in COLUMN_NAMES.items()}
+
+
+def to_frame(records):
+    """Build a training-layout DataFrame from a list of row dicts or a dict of columns."""
+    return pd.DataFrame(records).rename(columns=COLUMN_NAMES)
+
+
+def run_models(model, model2, processed, threshold=None, probabilities=False):
+    """Run the two-stage cascade over a preprocessed block.
+
+    The binary model scores every row; the failure-type model only sees the
+    rows flagged as failures. Returns (failure, failure_type, failure_proba,
+    type_proba): failure_type holds None for rows that were not flagged.
+
+    With ``threshold`` a row is flagged when its failure probability is at
+    least the threshold; otherwise the binary model's own decision is used.
+    The probability arrays are only filled in when ``probabilities`` is set
+    (or a threshold needs them) and come from the same forward pass:
+    failure_proba has one entry per row, type_proba one row per input row
+    over ``model2.classes_`` (NaN for rows that were not flagged).
+    """
+    start = perf_counter()
+    failure_proba = type_proba = None
+    if threshold is None and not probabilities:
+        failure = np.asarray(model.predict(processed))
+    else:
+        proba = model.predict_proba(processed)
+        failure_proba = proba[:, np.flatnonzero(model.classes_ == 1)[0]]
+        if threshold is None:
+            failure = model.classes_.take(np.argmax(proba, axis=1), axis=0)
+        else:
+            failure = (failure_proba >= threshold).astype(np.int64)
+
+    failure_type = np.full(len(failure), None, dtype=object)
+    if probabilities:
+        type_proba = np.full((len(failure), len(model2.classes_)), np.nan)
+
+    flagged = np.flatnonzero(failure != 0)
+    metrics.inc("cascade_calls_total")
+    metrics.inc("cascade_rows_total", len(failure))
+    observe_stage("model_failure", perf_counter() - start)
+    if flagged.size:
+        start = perf_counter()
+        if probabilities:
+            flagged_proba = model2.predict_proba(processed[flagged])
+            type_proba[flagged] = flagged_proba
+            failure_type[flagged] = model2.classes_.take(np.argmax(flagged_proba, axis=1), axis=0)
+        else:
+            failure_type[flagged] = model2.predict(processed[flagged])
+        observe_stage("failure_type", perf_counter() - start)
+        metrics.inc("cascade_model2_calls_total")
+        metrics.inc("cascade_flagged_rows_total", flagged.size)
+
+    return failure, failure_type, failure_proba, type_proba
+
+
+def format_results(failure, failure_type, failure_proba=None, type_proba=None, type_classes=None):
+    """Turn cascade output into /predict-style response dicts, in input order."""
+    if type_proba is not None:
+        type_labels = [label_mapping.get(code, "Unknown Failure Type") for code in type_classes]
+
+    results = []
+    for i, (is_failure, type_code) in enumerate(zip(failure, failure_type)):
+        if is_failure == 0:
+            result = {"prediction": "No Failure"}
+        else:
+            result = {
+                "prediction": "Failure Detected",
+                "failure_type": label_mapping.get(type_code, "Unknown Failure Type")
+            }
+
+        if failure_proba is not None:
+            result["failure_probability"] = float(failure_proba[i])
+        if type_proba is not None and is_failure != 0:
+            distribution = {}
+            for label, p in zip(type_labels, type_proba[i]):
+                distribution[label] = distribution.get(label, 0.0) + float(p)
+            result["failure_type_probabilities"] = distribution
+
+        results.append(result)
+    return results
+
+
+def results_frame(failure, failure_type, failure_proba=None, type_proba=None, type_classes=None):
+    """Columnar version of format_results, for bulk output (CSV / NDJSON)."""
+    out = pd.DataFrame({
+        "prediction": np.where(failure != 0, "Failure Detected", "No Failure"),
+        "failure_type": [
+            None if code is None else label_mapping.get(code, "Unknown Failure Type")
+            for code in failure_type
+        ],
+    })
+    if failure_proba is not None:
+        out["failure_probability"] = failure_proba
+    if type_proba is not None:
+        for j, code in enumerate(type_classes):
+            label = label_mapping.get(code, "Unknown Failure Type")
+            out[f"p({label})"] = type_proba[:, j]
+    return out
+
+
+def synthetic_frame(preprocessor, n_rows=256, seed=0):
+    """Training-layout readings drawn uniformly over the range the scaler was fitted on, for every product Type.
+
+    ``preprocessor`` is the fitted pipeline or a FeatureKernel.
+    """
+    kernel = preprocessor if isinstance(preprocessor, FeatureKernel) else FeatureKernel(preprocessor)
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Type": np.resize(list(TYPE_CODES), n_rows)})
+    for col, (low, high) in kernel.input_ranges.items():
+        df[col] = rng.uniform(low, high, n_rows)
+    return df[kernel.input_columns]
+
+
+def warm_up(cascade, n_rows=256, seed=0):
+    """Run a synthetic batch through every stage so the first request doesn't pay for cold tree arrays.
+
+    Both forests see the whole batch (see synthetic_frame).
+    """
+    df = synthetic_frame(cascade.preprocessor, n_rows, seed)
+    processed = cascade.transform(df)
+    cascade.model.predict_proba(processed)
+    cascade.model2.predict_proba(processed)
+    cascade.predict(processed, probabilities=True)
+    cascade.predict(cascade.transform_records([{FIELD_NAMES[col]: df[col].iloc[0] for col in df.columns}]))
+
+
+def predict_processed(model, model2, processed, threshold=None, probabilities=False):
+    """Cascade pass over an already preprocessed block."""
+    failure, failure_type, failure_proba, type_proba = run_models(
+        model, model2, processed, threshold, probabilities
+    )
+    start = perf_counter()
+    results = format_results(failure, failure_type, failure_proba, type_proba, model2.classes_)
+    observe_stage("format", perf_counter() - start)
+    return results
+
+
+def predict_frame(preprocessor, model, model2, df, threshold=None, probabilities=False):
+    """One preprocess + one cascade pass over a whole DataFrame."""
+    return predict_processed(model, model2, preprocessor.transform(df), threshold, probabilities)
+
+
+class Cascade:
+    """The loaded preprocessor and both models, set up for serving.
+
+    Applies the PREPROCESS_MODE / FOREST_ENGINE settings: the compiled
+    feature kernel stands in for the ColumnTransformer and FlatForest for
+    the sklearn forests when enabled. ``forest_engine=None`` uses the models
+    as given. ``preprocessor`` may also be a FeatureKernel (as loaded from a
+    packed model file), which is then always used.
+    """
+
+    def __init__(self, preprocessor, model, model2, preprocess_mode=PREPROCESS_MODE,
+                 forest_engine=FOREST_ENGINE, flat_max_rows=FLAT_FOREST_MAX_ROWS, version=None):
+        self.preprocessor = preprocessor
+        # Identifies the loaded artifacts (see artifacts.artifact_version)
+        self.version = version
+
+        # Flattened array-backed forests, if enabled
+        if forest_engine == "flat" and not isinstance(model, FlatForest):
+            model = FlatForest(model, fallback_rows=flat_max_rows)
+            model2 = FlatForest(model2, fallback_rows=flat_max_rows)
+        self.model = model
+        self.model2 = model2
+
+        # Compiled NumPy feature kernel (pandas-free fast path), if enabled
+        if isinstance(preprocessor, FeatureKernel):
+            self.kernel = preprocessor
+        else:
+            self.kernel = FeatureKernel(preprocessor) if preprocess_mode == "compiled" else None
+        # API field for each preprocessor input column, in kernel input order
+        self._kernel_fields = [FIELD_NAMES[col] for col in self.kernel.input_columns] if self.kernel else []
+
+    def transform(self, df):
+        """Preprocess a training-layout DataFrame."""
+        start = perf_counter()
+        if self.kernel is not None:
+            processed = self.kernel.transform(df)
+        else:
+            processed = self.preprocessor.transform(df)
+        observe_stage("preprocess", perf_counter() - start)
+        return processed
+
+    def transform_records(self, records):
+        """Preprocess API-layout records (row dicts or a dict of columns).
+
+        A single row dict skips pandas when the kernel is on.
+        """
+        if self.kernel is not None and isinstance(records, list) and len(records) == 1:
+            start = perf_counter()
+            record = records[0]
+            row = self.kernel.transform_row([record[field] for field in self._kernel_fields])
+            observe_stage("preprocess", perf_counter() - start)
+            return row
+        start = perf_counter()
+        df = to_frame(records)
+        observe_stage("frame", perf_counter() - start)
+        return self.transform(df)
+
+    def run(self, processed, threshold=None, probabilities=False):
+        return run_models(self.model, self.model2, processed, threshold, probabilities)
+
+    def predict(self, processed, threshold=None, probabilities=False):
+        """/predict-style result dicts for a preprocessed block."""
+        return predict_processed(self.model, self.model2, processed, threshold, probabilities)
+
+    def predict_table(self, df, threshold=None, probabilities=False):
+        """Columnar results for a training-layout DataFrame."""
+        outputs = self.run(self.transform(df), threshold, probabilities)
+        return results_frame(*outputs, type_classes=self.model2.classes_)
@@ -0,0 +1,103 @@
+import os
+
+# Runtime settings for the API, read from the environment.
+
+# Preprocessing used by the predict routes:
+#   "sklearn"  - the fitted ColumnTransformer from preprocessing.joblib
+#   "compiled" - the NumPy feature kernel compiled from it (see features.py)
+PREPROCESS_MODE = os.getenv("PREPROCESS_MODE", "sklearn")
+
+# Artifact format loaded by the API:
+#   "joblib" - the three pickled sklearn artifacts
+#   "packed" - the single pickle-free file written by packed.py (models.pack);
+#              always serves through the feature kernel and the flat engine
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "joblib")
+
+# Tree ensemble engine used by the predict routes:
+#   "sklearn" - RandomForestClassifier.predict as loaded from joblib
+#   "flat"    - all trees packed into contiguous node arrays (see forest.py)
+FOREST_ENGINE = os.getenv("FOREST_ENGINE", "sklearn")
+
+# Batches larger than this go to sklearn's compiled traversal even in "flat"
+# mode (0 or empty = always use the flat engine)
+FLAT_FOREST_MAX_ROWS = int(os.getenv("FLAT_FOREST_MAX_ROWS", "256") or 0) or None
+
+# Default failure decision threshold on the binary model's failure probability
+# (empty = use the model's own decision, i.e. predict())
+DECISION_THRESHOLD = float(os.getenv("DECISION_THRESHOLD")) if os.getenv("DECISION_THRESHOLD") else None
+
+# Inference worker processes (0 = score in the API process itself). Workers
+# share memory-mapped model weights; see pool.py
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+
+# Rows per micro-batch dispatched to a worker
+POOL_BATCH_ROWS = int(os.getenv("POOL_BATCH_ROWS", "1024"))
+
+# Rows parsed and scored per chunk by /predict/stream and streaming.py; bounds
+# memory regardless of input size
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "10000"))
+
+# Micro-batching of concurrent single-row /predict requests (see batching.py):
+# rows are coalesced for up to MICROBATCH_MAX_ROWS rows or MICROBATCH_MAX_WAIT_MS
+# milliseconds (0 rows = no coalescing)
+MICROBATCH_MAX_ROWS = int(os.getenv("MICROBATCH_MAX_ROWS", "0"))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "2"))
+
+# Result cache for repeated readings (see result_cache.py): max entries
+# (0 = no cache) and time-to-live in seconds
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "0"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "60"))
+
+# Per-machine telemetry windows (see telemetry.py): readings kept per machine
+# and the number of machines to preallocate for (grows on demand)
+MACHINE_WINDOW = int(os.getenv("MACHINE_WINDOW", "32"))
+MACHINE_CAPACITY = int(os.getenv("MACHINE_CAPACITY", "1024"))
+
+# Dataset used by the EDA dashboard page (data.csv layout)
+DATA_PATH = os.getenv("DATA_PATH", "data.csv")
+
+# Memory-mapped columnar copies of data.csv-format files (see dataset.py),
+# built on first load and rebuilt when the CSV changes
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".dataset_cache")
+
+# Evaluations of the served models on the held-out split of DATA_PATH,
+# cached per artifact checksum (see evaluate.py) for the Metrics page
+EVAL_CACHE_DIR = os.getenv("EVAL_CACHE_DIR", ".eval_cache")
+
+# Fitted cross-validation folds and the memory-mapped training matrix of
+# model_search.py, reused by later searches
+SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR", ".search_cache")
+
+# Versioned model registry (see registry.py): directory of vNNNN/ versions and
+# the version to serve at startup (empty = the newest version in the registry,
+# or the artifacts in the working directory if the registry is empty)
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models")
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+
+# Poll the registry every this many seconds and swap in new versions as they
+# appear (0 = only reload through POST /admin/reload)
+MODEL_WATCH_INTERVAL_S = float(os.getenv("MODEL_WATCH_INTERVAL_S", "0"))
+
+# Canary batch a new version must pass before it is swapped in: rows of
+# CANARY_PATH (synthetic readings if missing) and the minimum share of them on
+# which its failure decision has to agree with the serving version
+CANARY_PATH = os.getenv("CANARY_PATH", "data.csv")
+CANARY_ROWS = int(os.getenv("CANARY_ROWS", "2000"))
+CANARY_MIN_AGREEMENT = float(os.getenv("CANARY_MIN_AGREEMENT", "0.9"))
+
+# Shadow scoring (see shadow.py): batches still waiting for the shadow model
+# beyond this many are skipped rather than queued
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "8"))
+
+# Token required in the X-Admin-Token header by the /admin routes; they answer
+# 404 while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Per-stage timing histograms and counters exported by GET /metrics (see
+# metrics.py); "0" turns recording off
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Sampling profiler (see profiler.py): the /admin/profile routes answer 404
+# unless enabled ("1"), and a profile stops itself after this many seconds
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
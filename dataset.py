@@ -0,0 +1,324 @@
+"""Compact, memory-mapped columnar copy of data.csv-format datasets.
+
+The CSV is parsed once, in chunks, into one binary file per column under
+DATASET_CACHE_DIR, with an explicit schema instead of pandas' defaults:
+
+    UDI                                  int32
+    Product ID                           int32 code into a string dictionary
+    Type                                 uint8 code (L / M / H)
+    temperatures, torque                 float32
+    rotational speed, tool wear          int16
+    Machine failure, TWF ... RNF         bit flags packed into one uint8
+
+That is 26 bytes per row against about 220 for ``pd.read_csv`` (int64 and
+float64 numbers, Python strings). Later loads map the column files
+read-only, decode only the projected columns, and evaluate row filters on
+the mapped columns before anything is copied. The copy is rebuilt when the
+CSV's (mtime, size) changes.
+
+Sensor readings have 0.1 resolution, so ``wide=True`` can restore exactly
+the float64 values ``pd.read_csv`` would give (the float32 value rounded
+back to one decimal); that is what training and evaluation use. A column
+with readings off that grid is stored as float64 instead.
+
+    python dataset.py [data.csv]      # convert and print the sizes
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from config import DATASET_CACHE_DIR
+
+# Failure mode flags in data.csv, in the order used to name a row's failure
+# type when more than one is set
+FAILURE_FLAGS = ["TWF", "HDF", "PWF", "OSF", "RNF"]
+NUM_COLS = ['Air temperature [K]', 'Process temperature [K]', 'Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]']
+TYPES = ["L", "M", "H"]
+
+FORMAT_VERSION = 1
+CHUNK_ROWS = 250_000
+
+# Stored columns: name -> dtype. Flag columns share the "failure bits" byte.
+FLOAT_COLS = ["Air temperature [K]", "Process temperature [K]", "Torque [Nm]"]
+INT_COLS = ["Rotational speed [rpm]", "Tool wear [min]"]
+FLAG_COLS = ["Machine failure"] + FAILURE_FLAGS
+SENSOR_DECIMALS = 1
+STORED = {
+    "UDI": np.int32,
+    "Product ID": np.int32,
+    "Type": np.uint8,
+    **{col: np.float32 for col in FLOAT_COLS},
+    **{col: np.int16 for col in INT_COLS},
+    "failure bits": np.uint8,
+}
+# Columns of the source CSV, in file order
+COLUMNS = ["UDI", "Product ID", "Type"] + NUM_COLS + FLAG_COLS
+
+# Row filter keeping failed machines only (see Dataset.mask)
+FAILED = [("Machine failure", "==", 1)]
+
+_OPS = {
+    "==": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+}
+
+
+def _file_name(column):
+    return "".join(ch if ch.isalnum() else "_" for ch in column.lower()).strip("_") + ".bin"
+
+
+def cache_dir_for(path, cache_dir=DATASET_CACHE_DIR):
+    """Directory of the columnar copy of one version of a CSV (path plus (mtime, size))."""
+    stat = os.stat(path)
+    source = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:10]
+    version = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}:{FORMAT_VERSION}".encode()).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{source}-{version}")
+
+
+def _widen_file(f):
+    """Rewrite a float32 column file written so far as exact float64 readings, to continue in float64."""
+    f.flush()
+    with open(f.name, "rb") as r:
+        values = np.frombuffer(r.read(), dtype=np.float32)
+    f.seek(0)
+    f.truncate()
+    f.write(np.round(values.astype(np.float64), SENSOR_DECIMALS).tobytes())
+
+
+def _is_current(directory, path):
+    """Whether directory holds a finished copy of the current version of path."""
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    stat = os.stat(path)
+    return meta.get("format_version") == FORMAT_VERSION and meta.get("signature") == [stat.st_mtime_ns, stat.st_size]
+
+
+def convert(path, cache_dir=DATASET_CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    """Parse a data.csv-format file once into column files; returns the cache directory.
+
+    Written to a temporary directory and renamed into place, so readers
+    never see a partial copy. Older copies of the same CSV are removed.
+    """
+    target = cache_dir_for(path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=os.path.basename(target) + ".tmp-", dir=cache_dir)
+
+    dtypes = dict(STORED)
+    files = {name: open(os.path.join(staging, _file_name(name)), "wb") for name in STORED}
+    product_ids = {}
+    rows = 0
+    try:
+        csv_dtypes = {"Product ID": str, "Type": str, **dict.fromkeys(FLOAT_COLS, np.float64)}
+        for chunk in pd.read_csv(path, encoding="utf-8-sig", usecols=COLUMNS, dtype=csv_dtypes, chunksize=chunk_rows):
+            columns = {"UDI": chunk["UDI"].to_numpy()}
+
+            inverse, uniques = pd.factorize(chunk["Product ID"])
+            codes = np.array([product_ids.setdefault(u, len(product_ids)) for u in uniques], dtype=np.int32)
+            columns["Product ID"] = codes[inverse]
+
+            types = pd.Categorical(chunk["Type"], categories=TYPES).codes
+            if (types < 0).any():
+                raise ValueError(f"Unknown Type {chunk['Type'][types < 0].iloc[0]!r} in {path}; expected L, M or H")
+            columns["Type"] = types
+
+            for col in FLOAT_COLS:
+                values = chunk[col].to_numpy()
+                columns[col] = values
+                # float32 only holds readings on the 0.1 grid exactly (see
+                # Dataset.column); a column with finer values is kept as float64
+                if dtypes[col] == np.float32 and not (np.round(values, SENSOR_DECIMALS) == values).all():
+                    dtypes[col] = np.float64
+                    _widen_file(files[col])
+            for col in INT_COLS:
+                values = chunk[col].to_numpy()
+                info = np.iinfo(STORED[col])
+                if values.min() < info.min or values.max() > info.max:
+                    raise ValueError(f"{col} out of {np.dtype(STORED[col]).name} range in {path}")
+                columns[col] = values
+
+            bits = np.zeros(len(chunk), dtype=np.uint8)
+            for bit, col in enumerate(FLAG_COLS):
+                bits |= (chunk[col].to_numpy() != 0).astype(np.uint8) << bit
+            columns["failure bits"] = bits
+
+            for name, values in columns.items():
+                files[name].write(np.ascontiguousarray(values, dtype=dtypes[name]).tobytes())
+            rows += len(chunk)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        for f in files.values():
+            f.close()
+
+    np.save(os.path.join(staging, "product_ids.npy"), np.array(list(product_ids), dtype="S"))
+    stat = os.stat(path)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "source": os.path.abspath(path),
+            "signature": [stat.st_mtime_ns, stat.st_size],
+            "rows": rows,
+            "columns": {name: {"file": _file_name(name), "dtype": np.dtype(dtype).str} for name, dtype in dtypes.items()},
+        }, f)
+
+    if _is_current(target, path):
+        # Another thread or process finished the same copy first. Readers may
+        # already map its files, so it is kept and this one is dropped
+        shutil.rmtree(staging, ignore_errors=True)
+    else:
+        # Only a stale or unfinished copy is removed
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.replace(staging, target)
+        except OSError:
+            # Lost the race to rename into place; keep the winner's copy
+            shutil.rmtree(staging, ignore_errors=True)
+            if not _is_current(target, path):
+                raise
+    prefix = os.path.basename(target).rsplit("-", 1)[0] + "-"
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and os.path.join(cache_dir, name) != target and ".tmp-" not in name:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    return target
+
+
+class Dataset:
+    """Read-only view of a converted CSV: stored columns are memory maps, decoded on demand."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        self._maps = {}
+        self._product_ids = None
+
+    def stored(self, name):
+        """The raw stored column (a read-only memory map)."""
+        if name not in self._maps:
+            spec = self.meta["columns"][name]
+            path = os.path.join(self.directory, spec["file"])
+            dtype = np.dtype(spec["dtype"])
+            if self.rows:
+                self._maps[name] = np.memmap(path, dtype=dtype, mode="r", shape=(self.rows,))
+            else:
+                self._maps[name] = np.empty(0, dtype=dtype)
+        return self._maps[name]
+
+    def _raw(self, name, rows):
+        if name in FLAG_COLS:
+            bits = self.stored("failure bits")
+            bits = bits[rows] if rows is not None else bits
+            return (bits >> FLAG_COLS.index(name)) & 1
+        values = self.stored(name)
+        return values[rows] if rows is not None else values
+
+    def column(self, name, rows=None, wide=False):
+        """One decoded column, for all rows or the given row positions / slice.
+
+        Type and Product ID come back as pandas Categoricals, flags as uint8.
+        With ``wide``, numbers are float64 / int64 as pd.read_csv gives them.
+        """
+        values = self._raw(name, rows)
+        if name == "Type":
+            return pd.Categorical.from_codes(values, categories=TYPES)
+        if name == "Product ID":
+            if self._product_ids is None:
+                self._product_ids = np.load(os.path.join(self.directory, "product_ids.npy")).astype(str)
+            return pd.Categorical.from_codes(values, categories=self._product_ids)
+        if not wide:
+            return np.array(values)
+        if values.dtype == np.float32:
+            return np.round(values.astype(np.float64), SENSOR_DECIMALS)
+        return values.astype(np.float64 if values.dtype.kind == "f" else np.int64)
+
+    def mask(self, where):
+        """Boolean row mask of a filter: a list of (column, op, value) conditions, all of which must hold.
+
+        ``op`` is one of == != < <= > >= or "in" (value is a list). Conditions
+        are evaluated on the stored columns; Type values are L / M / H.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        for column, op, value in where:
+            values = self._raw(column, None)
+            if column == "Type":
+                value = [TYPES.index(v) for v in value] if op == "in" else TYPES.index(value)
+            elif column == "Product ID":
+                raise ValueError("Filtering on Product ID is not supported")
+            if op == "in":
+                mask &= np.isin(values, np.asarray(value, dtype=values.dtype))
+            elif op in _OPS:
+                mask &= _OPS[op](values, np.asarray(value, dtype=values.dtype))
+            else:
+                raise ValueError(f"Unknown filter op {op!r}")
+        return mask
+
+    def frame(self, columns=None, where=None, rows=None, wide=False):
+        """DataFrame of the given columns (default: all CSV columns), for the rows matching ``where``.
+
+        ``rows`` (positions or a slice) narrows the rows first. The index holds
+        the row positions in the CSV.
+        """
+        columns = columns or COLUMNS
+        if where:
+            mask = self.mask(where)
+            if rows is not None:
+                within = np.zeros(self.rows, dtype=bool)
+                within[rows] = True
+                mask &= within
+            rows = np.flatnonzero(mask)
+        if rows is None:
+            index = pd.RangeIndex(self.rows)
+        elif isinstance(rows, slice):
+            index = pd.RangeIndex(self.rows)[rows]
+        else:
+            index = pd.Index(rows)
+        return pd.DataFrame({col: self.column(col, rows, wide) for col in columns}, index=index)
+
+    def iter_frames(self, columns=None, chunk_rows=CHUNK_ROWS, wide=False):
+        """frame() over consecutive row blocks of chunk_rows rows."""
+        for start in range(0, self.rows, chunk_rows):
+            yield self.frame(columns, rows=slice(start, min(start + chunk_rows, self.rows)), wide=wide)
+
+
+def open_dataset(path, cache_dir=DATASET_CACHE_DIR):
+    """The columnar copy of a CSV, converting it first if it is missing or out of date."""
+    directory = cache_dir_for(path, cache_dir)
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        os.makedirs(cache_dir, exist_ok=True)
+        directory = convert(path, cache_dir)
+    return Dataset(directory)
+
+
+def load(path, columns=None, where=None, wide=False, cache_dir=DATASET_CACHE_DIR):
+    """Load a data.csv-format file through its columnar copy: only ``columns``, only rows matching ``where``."""
+    return open_dataset(path, cache_dir).frame(columns, where, wide=wide)
+
+
+def iter_chunks(path, columns=None, chunk_rows=CHUNK_ROWS, wide=False, cache_dir=DATASET_CACHE_DIR):
+    """Chunked load() of all rows, for passes over files larger than memory."""
+    return open_dataset(path, cache_dir).iter_frames(columns, chunk_rows, wide)
+
+
+if __name__ == "__main__":
+    import time
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "data.csv"
+    start = time.perf_counter()
+    data = open_dataset(csv_path)
+    seconds = time.perf_counter() - start
+    stored = sum(os.path.getsize(os.path.join(data.directory, name)) for name in os.listdir(data.directory))
+    start = time.perf_counter()
+    pandas_bytes = pd.read_csv(csv_path, encoding="utf-8-sig").memory_usage(deep=True).sum()
+    print(f"{data.rows:,} rows in {data.directory} ({stored / 2 ** 20:.1f} MiB, opened in {seconds:.2f} s)")
+    print(f"pd.read_csv: {pandas_bytes / 2 ** 20:.1f} MiB in memory, {time.perf_counter() - start:.2f} s")
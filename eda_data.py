@@ -0,0 +1,292 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ttest_ind, ttest_ind_from_stats
+
+import dataset
+from dataset import FAILED, FAILURE_FLAGS, NUM_COLS
+
+NO_FAILURE = "no failure"
+# Columns the EDA page works from, plus the flags failure_type is derived from
+EDA_COLS = ["Type"] + NUM_COLS + ["Machine failure"]
+
+TYPE_NAMES = {'L': 'Low', 'M': 'Medium', 'H': 'High'}
+
+
+def file_signature(path):
+    """(mtime, size) of a file: part of every cache key, so caches are rebuilt when the file changes."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def failure_types(df):
+    """Failure type label of every row: the first failure flag set, else 'no failure'."""
+    flags = df[FAILURE_FLAGS].to_numpy() == 1
+    labels = np.select(list(flags.T), FAILURE_FLAGS, NO_FAILURE)
+    return pd.Categorical(labels, categories=FAILURE_FLAGS + [NO_FAILURE])
+
+
+def load_dataset(path):
+    """The EDA columns of data.csv (compact dtypes, see dataset.py), with the five failure flags replaced by a
+    single failure_type column."""
+    df = dataset.load(path, EDA_COLS + FAILURE_FLAGS)
+    df["failure_type"] = failure_types(df)
+    return df.drop(columns=FAILURE_FLAGS)
+
+
+def summarize(df):
+    """Aggregates and statistical tests shown on the EDA page, computed in one go."""
+    failed = df["Machine failure"].to_numpy() == 1
+    ttests = pd.DataFrame(
+        [ttest_ind(df.loc[failed, col], df.loc[~failed, col]) for col in NUM_COLS],
+        index=NUM_COLS, columns=["statistic", "p_value"],
+    )
+    type_share = df["Type"].value_counts(normalize=True) * 100
+    return {
+        "rows": len(df),
+        "failure_rate": df["Machine failure"].mean() * 100,
+        "failure_type_counts": df["failure_type"].value_counts(sort=False),
+        "failure_type_share": df["failure_type"].value_counts(normalize=True, sort=False) * 100,
+        "type_share": type_share.rename(index=TYPE_NAMES),
+        "describe": df[NUM_COLS].describe(),
+        "corr": df[NUM_COLS + ["Machine failure"]].corr(),
+        "ttests": ttests,
+    }
+
+
+
+# -------------------- Chunked summaries for large datasets --------------------
+# The dataset is read in chunks and reduced to fixed-size NumPy summaries, so
+# memory use and what the browser receives do not grow with the row count.
+# Chunks come from the columnar copy (dataset.py) with exact float64 values,
+# so the CSV is parsed once, not on every pass.
+
+CHUNK_ROWS = 250_000
+FINE_BINS = 4096     # per-column histogram resolution, used for quantiles
+PLOT_BINS = 64       # bins per histogram sent to the browser (divides FINE_BINS)
+PAIR_BINS = 48       # bins per axis of the 2-D pairwise densities
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Read the dataset in chunks, with failure_type derived as in load_dataset."""
+    for chunk in dataset.iter_chunks(path, EDA_COLS + FAILURE_FLAGS, chunk_rows, wide=True):
+        chunk["failure_type"] = failure_types(chunk)
+        yield chunk.drop(columns=FAILURE_FLAGS)
+
+
+def _bin_index(values, low, high, n_bins):
+    if high <= low:
+        return np.zeros(len(values), dtype=np.int64)
+    index = ((values - low) * (n_bins / (high - low))).astype(np.int64)
+    return np.clip(index, 0, n_bins - 1)
+
+
+def _quantiles(counts, edges, qs):
+    """Quantiles of binned data, interpolated linearly inside the bin."""
+    cdf = np.cumsum(counts)
+    out = []
+    for q in qs:
+        target = q * cdf[-1]
+        k = min(int(np.searchsorted(cdf, target)), len(counts) - 1)
+        below = cdf[k - 1] if k else 0
+        frac = (target - below) / counts[k] if counts[k] else 0.0
+        out.append(float(edges[k] + frac * (edges[k + 1] - edges[k])))
+    return out
+
+
+def box_stats(counts, edges, low, high, mean, sd):
+    """Box plot statistics of binned data: quartiles and Tukey whiskers, to bin resolution."""
+    q1, median, q3 = _quantiles(counts, edges, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = np.flatnonzero((counts > 0) & (edges[1:] >= q1 - 1.5 * iqr) & (edges[:-1] <= q3 + 1.5 * iqr))
+    return {
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "lowerfence": float(max(low, edges[inside[0]])),
+        "upperfence": float(min(high, edges[inside[-1] + 1])),
+        "mean": float(mean),
+        "sd": float(sd),
+        "outliers": int(counts[:inside[0]].sum() + counts[inside[-1] + 1:].sum()),
+    }
+
+
+def coarsen(counts, edges, n_bins=PLOT_BINS):
+    """Merge fine histogram bins down to n_bins (which must divide len(counts))."""
+    step = len(counts) // n_bins
+    return counts.reshape(n_bins, step).sum(axis=1), edges[::step]
+
+
+def violin_density(counts, edges, n_points=128, smooth=2.0):
+    """Smoothed density curve (bin centers, density) of a binned column, for violin outlines."""
+    counts, edges = coarsen(counts, edges, n_points)
+    offsets = np.arange(-4 * smooth, 4 * smooth + 1)
+    kernel = np.exp(-0.5 * (offsets / smooth) ** 2)
+    density = np.convolve(counts, kernel / kernel.sum(), mode="same")
+    total = counts.sum() * (edges[1] - edges[0])
+    return (edges[:-1] + edges[1:]) / 2, density / total if total else density
+
+
+def binned_summary(path, chunk_rows=CHUNK_ROWS):
+    """Everything summarize() returns, plus binned distributions, from two chunked passes.
+
+    Pass one accumulates counts, ranges and (shifted) first and second
+    moments, which give exact means, correlations and t-tests. Pass two
+    fills FINE_BINS-bin histograms per column, overall and per Type (for
+    quantiles, box and violin plots), and PAIR_BINS x PAIR_BINS counts
+    for every pair of columns.
+    """
+    cols = NUM_COLS + ["Machine failure"]
+    k = len(NUM_COLS)
+    n = 0
+    shift = None
+    sum_x = np.zeros(len(cols))
+    sum_xx = np.zeros((len(cols), len(cols)))
+    low = np.full(k, np.inf)
+    high = np.full(k, -np.inf)
+    group_n = np.zeros(2)            # not failed, failed
+    group_sum = np.zeros((2, k))
+    group_sumsq = np.zeros((2, k))
+    failure_type_counts = None
+    type_counts = pd.Series(dtype=np.int64)
+
+    for chunk in iter_chunks(path, chunk_rows):
+        X = chunk[cols].to_numpy(dtype=np.float64)
+        if shift is None:
+            shift = X.mean(axis=0)
+        D = X - shift
+        n += len(X)
+        sum_x += D.sum(axis=0)
+        sum_xx += D.T @ D
+        low = np.minimum(low, X[:, :k].min(axis=0))
+        high = np.maximum(high, X[:, :k].max(axis=0))
+
+        failed = chunk["Machine failure"].to_numpy() == 1
+        for g, mask in enumerate((~failed, failed)):
+            group_n[g] += mask.sum()
+            group_sum[g] += D[mask, :k].sum(axis=0)
+            group_sumsq[g] += (D[mask, :k] ** 2).sum(axis=0)
+
+        counts = chunk["failure_type"].value_counts(sort=False)
+        failure_type_counts = counts if failure_type_counts is None else failure_type_counts + counts
+        type_counts = type_counts.add(chunk["Type"].value_counts(), fill_value=0)
+
+    if not n:
+        raise ValueError(f"No rows in {path}")
+
+    mean = sum_x / n
+    cov = sum_xx / n - np.outer(mean, mean)
+    scale = np.sqrt(np.diag(cov))
+    corr = pd.DataFrame(cov / np.outer(scale, scale), index=cols, columns=cols)
+    mean += shift
+
+    group_mean = group_sum / group_n[:, None]
+    group_sd = np.sqrt((group_sumsq - group_n[:, None] * group_mean ** 2) / (group_n[:, None] - 1))
+    group_mean += shift[:k]
+    stat, p_value = ttest_ind_from_stats(group_mean[1], group_sd[1], group_n[1], group_mean[0], group_sd[0], group_n[0])
+    ttests = pd.DataFrame({"statistic": stat, "p_value": p_value}, index=NUM_COLS)
+
+    types = [t for t in TYPE_NAMES if t in type_counts.index]
+    fine = np.zeros((k, FINE_BINS), dtype=np.int64)
+    fine_by_type = np.zeros((k, len(types), FINE_BINS), dtype=np.int64)
+    type_sum = np.zeros((k, len(types)))
+    type_sumsq = np.zeros((k, len(types)))
+    pairs = {(i, j): np.zeros((PAIR_BINS, PAIR_BINS), dtype=np.int64) for i in range(k) for j in range(i + 1, k)}
+
+    for chunk in iter_chunks(path, chunk_rows):
+        X = chunk[NUM_COLS].to_numpy(dtype=np.float64)
+        code = pd.Categorical(chunk["Type"], categories=types).codes.astype(np.int64)
+        known = code >= 0
+        pair_index = []
+        for c in range(k):
+            index = _bin_index(X[:, c], low[c], high[c], FINE_BINS)
+            fine[c] += np.bincount(index, minlength=FINE_BINS)
+            fine_by_type[c] += np.bincount(
+                code[known] * FINE_BINS + index[known], minlength=len(types) * FINE_BINS
+            ).reshape(len(types), FINE_BINS)
+            d = X[known, c] - shift[c]
+            type_sum[c] += np.bincount(code[known], weights=d, minlength=len(types))
+            type_sumsq[c] += np.bincount(code[known], weights=d * d, minlength=len(types))
+            pair_index.append(_bin_index(X[:, c], low[c], high[c], PAIR_BINS))
+        for (i, j), grid in pairs.items():
+            grid += np.bincount(pair_index[i] * PAIR_BINS + pair_index[j], minlength=PAIR_BINS ** 2).reshape(PAIR_BINS, PAIR_BINS)
+
+    columns = {}
+    for c, col in enumerate(NUM_COLS):
+        edges = np.linspace(low[c], high[c], FINE_BINS + 1)
+        sd = np.sqrt(cov[c, c] * n / (n - 1)) if n > 1 else 0.0
+        by_type = {}
+        for t, name in enumerate(types):
+            count = fine_by_type[c, t].sum()
+            if count:
+                type_mean = type_sum[c, t] / count
+                type_sd = np.sqrt(max(type_sumsq[c, t] / count - type_mean ** 2, 0.0))
+                by_type[name] = {
+                    "counts": fine_by_type[c, t],
+                    "box": box_stats(fine_by_type[c, t], edges, low[c], high[c], type_mean + shift[c], type_sd),
+                }
+        columns[col] = {
+            "edges": edges,
+            "counts": fine[c],
+            "box": box_stats(fine[c], edges, low[c], high[c], mean[c], sd),
+            "by_type": by_type,
+        }
+
+    describe = pd.DataFrame({
+        col: [n, mean[c], np.sqrt(cov[c, c] * n / (n - 1)) if n > 1 else np.nan, low[c],
+              *_quantiles(columns[col]["counts"], columns[col]["edges"], [0.25, 0.5, 0.75]), high[c]]
+        for c, col in enumerate(NUM_COLS)
+    }, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"])
+
+    type_share = type_counts / n * 100
+    return {
+        "rows": n,
+        "failure_rate": group_n[1] / n * 100,
+        "failure_type_counts": failure_type_counts,
+        "failure_type_share": failure_type_counts / n * 100,
+        "type_share": type_share.reindex(types).rename(index=TYPE_NAMES),
+        "describe": describe,
+        "corr": corr,
+        "ttests": ttests,
+        "columns": columns,
+        "pairs": {(NUM_COLS[i], NUM_COLS[j]): grid for (i, j), grid in pairs.items()},
+        "pair_bins": PAIR_BINS,
+        "ranges": {col: (float(low[c]), float(high[c])) for c, col in enumerate(NUM_COLS)},
+    }
+
+
+def stratified_sample(path, n_rows, seed=0):
+    """Every failure row plus a uniform sample of at most n_rows other rows.
+
+    Rows are picked on the failure flags of the columnar copy (see
+    dataset.py) and only the picked rows are decoded. ``sample_weight`` is
+    the number of dataset rows each sampled row stands for, to undo the
+    oversampling of failures.
+    """
+    data = dataset.open_dataset(path)
+    failed = data.mask(FAILED)
+    ok = np.flatnonzero(~failed)
+    n_ok = len(ok)
+    if n_ok > n_rows:
+        ok = np.random.default_rng(seed).choice(ok, n_rows, replace=False)
+    rows = np.sort(np.concatenate([np.flatnonzero(failed), ok]))
+    if not len(rows):
+        raise ValueError(f"No rows in {path}")
+
+    sample = data.frame(EDA_COLS + FAILURE_FLAGS, rows=rows)
+    sample["failure_type"] = failure_types(sample)
+    sample = sample.drop(columns=FAILURE_FLAGS)
+    sample["sample_weight"] = np.where(sample["Machine failure"] == 1, 1.0, n_ok / max(len(ok), 1))
+    return sample
+
+
+def uniform_subsample(sample, seed=0):
+    """Rows of a stratified_sample kept with probability proportional to their ``sample_weight``.
+
+    Every dataset row then has the same chance of being kept, so failures
+    appear at their real share (for plots that take no weights).
+    """
+    weight = sample["sample_weight"].to_numpy()
+    keep = np.random.default_rng(seed).random(len(sample)) < weight / weight.max()
+    return sample[keep]
@@ -0,0 +1,295 @@
+"""Evaluate the served models on the held-out split of the training data.
+
+The test rows are the ones train.py holds out (same seed and test size, see
+train.split_rows): the binary model is scored on the 20% test split of all
+rows, the failure-type model on the 20% test split of the failed rows. The
+whole holdout goes through in one vectorized pass: the features are built
+once by the FeatureKernel, each forest runs predict_proba once, and every
+metric comes from confusion counts and a single sort of the failure scores.
+
+Results are cached on disk under EVAL_CACHE_DIR, keyed by the SHA-256 of
+the three artifacts and of the data file, so the Metrics page renders from
+the cache and each model version is evaluated once.
+
+    python evaluate.py [--dir models/v0003] [--data data.csv] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from artifacts import MODEL2_PATH, MODEL_PATH, PREPROCESSOR_PATH, load_artifacts
+from config import DATA_PATH, EVAL_CACHE_DIR, MODEL_VERSION
+from eda_data import file_signature
+from features import FeatureKernel
+from registry import ARTIFACT_FILES, ModelRegistry, file_checksum
+from train import FAILURE_TYPE_LABELS, RANDOM_STATE, TEST_SIZE, load_training_data, split_rows
+
+# Bumped when the result layout changes, so older cache entries are ignored
+EVAL_FORMAT_VERSION = 1
+# Points kept per ROC / PR curve, and calibration bins
+CURVE_POINTS = 400
+CALIBRATION_BINS = 10
+
+FAILURE_LABELS = ["No Failure", "Failure"]
+
+# (absolute path, file signature) -> SHA-256, so unchanged files are hashed once per process
+_checksums = {}
+
+
+def checksum(path):
+    key = (os.path.abspath(path), file_signature(path))
+    if key not in _checksums:
+        _checksums[key] = file_checksum(path)
+    return _checksums[key]
+
+
+def serving_artifacts():
+    """(name, artifact paths) of the version the API serves: MODEL_VERSION, the newest registry version, or ".".
+
+    Mirrors the API's startup choice; the joblib artifacts are evaluated
+    whatever MODEL_FORMAT is, since the packed copy scores identically.
+    """
+    registry = ModelRegistry()
+    version = MODEL_VERSION or registry.latest()
+    if version:
+        version_dir = registry.path(version)
+        return version, tuple(os.path.join(version_dir, name) for name in ARTIFACT_FILES)
+    return "working directory", (PREPROCESSOR_PATH, MODEL_PATH, MODEL2_PATH)
+
+
+def evaluation_key(artifact_paths, data_path=DATA_PATH):
+    """Cache key of one evaluation: the artifact and data checksums plus the split settings."""
+    digest = hashlib.sha256(json.dumps({
+        "format": EVAL_FORMAT_VERSION,
+        "artifacts": [checksum(path) for path in artifact_paths],
+        "data": checksum(data_path),
+        "split": [TEST_SIZE, RANDOM_STATE],
+    }).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(key, cache_dir=EVAL_CACHE_DIR):
+    return os.path.join(cache_dir, f"{key}.joblib")
+
+
+def load_evaluation(key, cache_dir=EVAL_CACHE_DIR):
+    """A cached evaluation, or None if this key hasn't been evaluated yet."""
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path)
+
+
+# -------------------- Metrics --------------------
+# NumPy versions of the sklearn.metrics used in the notebooks; they agree with
+# sklearn but need one bincount or one sort each, whatever the row count.
+
+def confusion(y_true, y_pred, n_classes):
+    """Confusion matrix: rows are true classes, columns predicted classes."""
+    counts = np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes)
+    return counts.reshape(n_classes, n_classes)
+
+
+def class_report(matrix, labels):
+    """Per-class precision, recall, F1 and support, plus macro and weighted averages (as classification_report)."""
+    tp = np.diag(matrix).astype(np.float64)
+    support = matrix.sum(axis=1)
+    predicted = matrix.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    # Classes neither present nor predicted are left out, as sklearn does
+    seen = (support + predicted) > 0
+    precision, recall, f1, support = precision[seen], recall[seen], f1[seen], support[seen]
+    report = pd.DataFrame({"Precision": precision, "Recall": recall, "F1 Score": f1, "Support": support},
+                          index=np.asarray(labels, dtype=object)[seen])
+    weights = support / support.sum()
+    report.loc["Macro Avg"] = [precision.mean(), recall.mean(), f1.mean(), support.sum()]
+    report.loc["Weighted Avg"] = [precision @ weights, recall @ weights, f1 @ weights, support.sum()]
+    return report
+
+
+def _thin(n_points, max_points=CURVE_POINTS):
+    """Indices of at most max_points evenly spaced points of a curve, ends included."""
+    return np.unique(np.linspace(0, n_points - 1, min(n_points, max_points)).round().astype(np.int64))
+
+
+def threshold_curves(y_true, scores, max_points=CURVE_POINTS):
+    """ROC and precision-recall curves of a binary score, with ROC AUC and average precision.
+
+    One sort of the scores gives the true and false positive counts at
+    every distinct threshold; the curves are then thinned to max_points
+    for plotting, while the areas use every threshold.
+    """
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = scores[order]
+    hits = y_true[order]
+    ends = np.r_[np.flatnonzero(np.diff(sorted_scores)), len(sorted_scores) - 1]
+    tps = np.cumsum(hits)[ends].astype(np.float64)
+    fps = ends + 1 - tps
+    thresholds = sorted_scores[ends]
+
+    tpr = np.r_[0.0, tps / tps[-1]]
+    fpr = np.r_[0.0, fps / fps[-1]]
+    precision = tps / (tps + fps)
+    recall = tps / tps[-1]
+    roc_keep = _thin(len(tpr), max_points)
+    pr_keep = _thin(len(precision), max_points)
+    return {
+        "roc": pd.DataFrame({"fpr": fpr[roc_keep], "tpr": tpr[roc_keep],
+                             "threshold": np.r_[np.inf, thresholds][roc_keep]}),
+        "roc_auc": float(np.trapz(tpr, fpr)),
+        "pr": pd.DataFrame({"recall": recall[pr_keep], "precision": precision[pr_keep],
+                            "threshold": thresholds[pr_keep]}),
+        "average_precision": float(np.sum(np.diff(np.r_[0.0, recall]) * precision)),
+    }
+
+
+def calibration(y_true, scores, n_bins=CALIBRATION_BINS):
+    """Reliability table: mean predicted probability and observed failure rate per probability bin."""
+    bins = np.minimum((scores * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    predicted = np.bincount(bins, weights=scores, minlength=n_bins)
+    observed = np.bincount(bins, weights=y_true, minlength=n_bins)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        table = pd.DataFrame({
+            "bin_low": np.arange(n_bins) / n_bins,
+            "bin_high": np.arange(1, n_bins + 1) / n_bins,
+            "mean_predicted": predicted / counts,
+            "observed_rate": observed / counts,
+            "rows": counts,
+        })
+    return table, float(np.mean((scores - y_true) ** 2))
+
+
+def classification_summary(y_true, y_pred, labels):
+    matrix = confusion(y_true, y_pred, len(labels))
+    return {
+        "rows": int(len(y_true)),
+        "labels": list(labels),
+        "accuracy": float(np.trace(matrix) / matrix.sum()),
+        "confusion": matrix,
+        "report": class_report(matrix, labels),
+    }
+
+
+# -------------------- Evaluation --------------------
+
+def evaluate(artifact_paths=None, data_path=DATA_PATH, name=None):
+    """Score the artifacts (default: the served version) on the held-out rows of data_path.
+
+    Returns a dict of metrics, curves and per-step timings.
+    """
+    if artifact_paths is None:
+        name, artifact_paths = serving_artifacts()
+    name = name or os.path.dirname(os.path.abspath(artifact_paths[0]))
+    timings = {}
+
+    start = time.perf_counter()
+    preprocessor, model, model2 = load_artifacts(*artifact_paths)
+    kernel = FeatureKernel(preprocessor)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X, y, y_type = load_training_data(data_path)
+    _, test_rows, _, test_rows2 = split_rows(y, y_type)
+    timings["read + split"] = time.perf_counter() - start
+
+    # Features for both holdouts in one block
+    start = time.perf_counter()
+    rows = np.r_[test_rows, test_rows2]
+    processed = kernel.transform(X.iloc[rows])
+    features, features2 = processed[:len(test_rows)], processed[len(test_rows):]
+    timings["preprocess"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = model.predict_proba(features)
+    proba2 = model2.predict_proba(features2)
+    timings["predict"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_true = y.to_numpy()[test_rows].astype(np.int64)
+    failure_index = list(model.classes_).index(1)
+    scores = proba[:, failure_index]
+    y_pred = model.classes_[proba.argmax(axis=1)].astype(np.int64)
+    failure = classification_summary(y_true, y_pred, FAILURE_LABELS)
+    failure.update(threshold_curves(y_true, scores))
+    failure["calibration"], failure["brier"] = calibration(y_true, scores)
+
+    type_true = y_type.to_numpy()[test_rows2]
+    type_pred = model2.classes_[proba2.argmax(axis=1)].astype(np.int64)
+    failure_type = classification_summary(type_true, type_pred, FAILURE_TYPE_LABELS)
+    timings["metrics"] = time.perf_counter() - start
+
+    return {
+        "format": EVAL_FORMAT_VERSION,
+        "model": name,
+        "artifacts": [os.path.abspath(path) for path in artifact_paths],
+        "data": os.path.abspath(data_path),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "timings": timings,
+        "failure": failure,
+        "failure_type": failure_type,
+    }
+
+
+def evaluate_cached(artifact_paths=None, data_path=DATA_PATH, cache_dir=EVAL_CACHE_DIR, force=False, name=None):
+    """Cached evaluate(): returns the stored result for these artifacts and data, computing it first if needed."""
+    if artifact_paths is None:
+        name, artifact_paths = serving_artifacts()
+    key = evaluation_key(artifact_paths, data_path)
+    if not force:
+        result = load_evaluation(key, cache_dir)
+        if result is not None:
+            return result
+    result = evaluate(artifact_paths, data_path, name)
+    result["key"] = key
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(key, cache_dir)
+    # A temporary file of its own, so concurrent evaluations (the Metrics page
+    # and the CLI) never write into each other's copy
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".tmp-", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump(result, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="directory holding the three joblib artifacts (default: the served version)")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--cache-dir", default=EVAL_CACHE_DIR)
+    parser.add_argument("--force", action="store_true", help="re-evaluate even if a cached result exists")
+    args = parser.parse_args()
+
+    paths = None
+    if args.dir:
+        paths = tuple(os.path.join(args.dir, name) for name in ARTIFACT_FILES)
+    result = evaluate_cached(paths, args.data, args.cache_dir, args.force)
+
+    failure, failure_type = result["failure"], result["failure_type"]
+    print(f"{result['model']} on {failure['rows']:,} held-out rows of {result['data']} (key {result['key']})")
+    print(f"  failure:      accuracy {failure['accuracy']:.4f}  F1 {failure['report'].loc['Failure', 'F1 Score']:.4f}  "
+          f"ROC AUC {failure['roc_auc']:.4f}  AP {failure['average_precision']:.4f}  Brier {failure['brier']:.4f}")
+    print(f"  failure type: accuracy {failure_type['accuracy']:.4f}  "
+          f"macro F1 {failure_type['report'].loc['Macro Avg', 'F1 Score']:.4f}  ({failure_type['rows']:,} rows)")
+    for stage, seconds in result["timings"].items():
+        print(f"  {stage:<14}{seconds:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
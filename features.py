@@ -0,0 +1,192 @@
+import threading
+
+import numpy as np
+
+KELVIN_OFFSET = 273.15
+TYPE_CODES = {"L": 0, "M": 1, "H": 2}
+
+
+class FeatureKernel:
+    """Fixed NumPy replacement for the fitted preprocessing ColumnTransformer.
+
+    The fitted transformer is compiled once into three column ops (Kelvin ->
+    Celsius shift, L/M/H ordinal code, MinMaxScaler min/scale) that write
+    straight into a float64 feature matrix laid out like
+    ``preprocessor.transform``. The arithmetic is the same as sklearn's, so
+    the output matches it bit for bit.
+
+    The compiled ops are plain numbers (see params / from_params), so a
+    kernel can be rebuilt without sklearn or the pickled custom functions.
+    It also stands in for the preprocessor itself (``feature_names_in_``,
+    ``transform``) when no sklearn pipeline is loaded.
+    """
+
+    def __init__(self, preprocessor):
+        from sklearn.preprocessing import FunctionTransformer, MinMaxScaler
+
+        self.input_columns = list(preprocessor.feature_names_in_)
+        index = {col: i for i, col in enumerate(self.input_columns)}
+
+        self._shift = []     # (input index, output index)
+        self._ordinal = []   # (input index, output index)
+        self._scale = []     # (input index, output index, scale, min)
+        self._clip = None
+        # Input column -> (low, high) the scaler was fitted on
+        self.input_ranges = {}
+
+        out = 0
+        for name, trans, cols in preprocessor.transformers_:
+            cols = [self.input_columns[c] if isinstance(c, (int, np.integer)) else c for c in cols]
+            if trans == "drop" or not cols:
+                continue
+            if trans == "passthrough":
+                raise ValueError(f"Unsupported passthrough columns in preprocessor: {cols}")
+
+            if isinstance(trans, FunctionTransformer) and trans.kw_args is None:
+                func_name = getattr(trans.func, "__name__", None)
+                if func_name == "kelvin_to_celsius":
+                    target = self._shift
+                elif func_name == "ordinal_encoding":
+                    target = self._ordinal
+                else:
+                    raise ValueError(f"Unsupported function in preprocessor step '{name}': {func_name}")
+                for col in cols:
+                    target.append((index[col], out))
+                    out += 1
+
+            elif isinstance(trans, MinMaxScaler):
+                if trans.clip:
+                    self._clip = (float(trans.feature_range[0]), float(trans.feature_range[1]))
+                for col, scale, min_, low, high in zip(cols, trans.scale_, trans.min_, trans.data_min_,
+                                                       trans.data_max_):
+                    self._scale.append((index[col], out, float(scale), float(min_)))
+                    self.input_ranges[col] = (float(low), float(high))
+                    out += 1
+
+            else:
+                raise ValueError(f"Unsupported transformer in preprocessor step '{name}': {trans!r}")
+
+        self.n_features_out = out
+        self._local = threading.local()
+
+    @property
+    def feature_names_in_(self):
+        return self.input_columns
+
+    def output_columns(self, column):
+        """Indexes of the output features computed from one input column."""
+        i = self.input_columns.index(column)
+        ops = self._shift + self._ordinal + [op[:2] for op in self._scale]
+        return sorted(o for source, o in ops if source == i)
+
+    def params(self):
+        """The compiled ops as JSON-ready plain values."""
+        return {
+            "input_columns": self.input_columns,
+            "shift": self._shift,
+            "ordinal": self._ordinal,
+            "scale": self._scale,
+            "clip": self._clip,
+            "input_ranges": self.input_ranges,
+            "n_features_out": self.n_features_out,
+        }
+
+    @classmethod
+    def from_params(cls, params):
+        kernel = cls.__new__(cls)
+        kernel.input_columns = list(params["input_columns"])
+        kernel._shift = [tuple(op) for op in params["shift"]]
+        kernel._ordinal = [tuple(op) for op in params["ordinal"]]
+        kernel._scale = [tuple(op) for op in params["scale"]]
+        kernel._clip = tuple(params["clip"]) if params["clip"] is not None else None
+        kernel.input_ranges = {col: tuple(bounds) for col, bounds in params["input_ranges"].items()}
+        kernel.n_features_out = params["n_features_out"]
+        kernel._local = threading.local()
+        return kernel
+
+    def _row_buffer(self):
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.empty((1, self.n_features_out), dtype=np.float64)
+        return row
+
+    def transform_row(self, values, out=None):
+        """Transform one reading given in ``input_columns`` order.
+
+        Writes into ``out`` or a preallocated per-thread row, which is reused by
+        the next call on the same thread.
+        """
+        row = self._row_buffer() if out is None else out
+        for i, o in self._shift:
+            row[0, o] = values[i] - KELVIN_OFFSET
+        for i, o in self._ordinal:
+            try:
+                row[0, o] = TYPE_CODES[values[i]]
+            except KeyError:
+                raise ValueError(f"Unknown Type {values[i]!r}; expected one of L, M, H") from None
+        for i, o, scale, min_ in self._scale:
+            value = values[i] * scale + min_
+            if self._clip is not None:
+                value = min(max(value, self._clip[0]), self._clip[1])
+            row[0, o] = value
+        return row
+
+    def transform(self, columns, out=None):
+        """Transform a block given as a DataFrame or a dict of columns keyed by training column name."""
+        n_rows = len(columns[self.input_columns[0]])
+        if out is None:
+            out = np.empty((n_rows, self.n_features_out), dtype=np.float64)
+
+        for i, o in self._shift:
+            out[:, o] = np.asarray(columns[self.input_columns[i]], dtype=np.float64) - KELVIN_OFFSET
+        for i, o in self._ordinal:
+            types = np.asarray(columns[self.input_columns[i]], dtype=object)
+            codes = np.full(n_rows, -1, dtype=np.int64)
+            for type_name, code in TYPE_CODES.items():
+                codes[types == type_name] = code
+            if (codes < 0).any():
+                bad = types[codes < 0][0]
+                raise ValueError(f"Unknown Type {bad!r}; expected one of L, M, H")
+            out[:, o] = codes
+        for i, o, scale, min_ in self._scale:
+            col = np.asarray(columns[self.input_columns[i]], dtype=np.float64) * scale
+            col += min_
+            if self._clip is not None:
+                np.clip(col, self._clip[0], self._clip[1], out=col)
+            out[:, o] = col
+        return out
+
+
+def verify_parity(preprocessor, csv_path="data.csv"):
+    """Check the kernel against ``preprocessor.transform`` over a whole CSV, bit for bit.
+
+    Both the block path and the single-row path are compared. Returns the
+    number of rows checked; raises AssertionError on the first mismatch.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    expected = np.asarray(preprocessor.transform(df), dtype=np.float64)
+    kernel = FeatureKernel(preprocessor)
+
+    block = kernel.transform(df)
+    mismatch = np.flatnonzero((block.view(np.uint64) != expected.view(np.uint64)).any(axis=1))
+    if mismatch.size:
+        raise AssertionError(f"Block transform differs from sklearn at row {mismatch[0]}")
+
+    for n, values in enumerate(df[kernel.input_columns].itertuples(index=False, name=None)):
+        row = kernel.transform_row(values)
+        if row.tobytes() != expected[n].tobytes():
+            raise AssertionError(f"Row transform differs from sklearn at row {n}")
+
+    return len(df)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from artifacts import load_preprocessor
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "data.csv"
+    n_rows = verify_parity(load_preprocessor(), csv_path)
+    print(f"Feature kernel matches preprocessor.transform bit for bit on {n_rows} rows of {csv_path}")
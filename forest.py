@@ -0,0 +1,179 @@
+import copy
+
+import numpy as np
+
+# Rows walked per chunk; bounds the (rows x trees) working arrays
+CHUNK_ROWS = 16384
+
+# Tree levels walked between dropping the (row, tree) pairs that reached a leaf
+LEVELS_PER_COMPACTION = 6
+
+# Packed node arrays, as returned by FlatForest.arrays()
+ARRAY_NAMES = ["feature", "threshold", "children", "leaf_index", "value", "roots"]
+
+
+def float32_thresholds(threshold):
+    """Largest float32 not above each float64 threshold.
+
+    Features are compared as float32, and for a float32 ``x``, ``x > t``
+    holds exactly when ``x > float32_thresholds(t)`` does, so the trees
+    keep every decision at half the threshold storage.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    rounded = threshold.astype(np.float32)
+    above = rounded > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+class FlatForest:
+    """Array-backed copy of a fitted RandomForestClassifier for inference.
+
+    All trees are packed into contiguous node arrays (feature, threshold,
+    children, leaf value) and walked together for a whole batch of rows in
+    vectorized NumPy, without sklearn's per-call validation, joblib dispatch
+    or per-estimator Python overhead.
+
+    ``predict_proba`` reproduces sklearn exactly: rows are compared as
+    float32 against the thresholds (see float32_thresholds), per-tree leaf
+    distributions are summed in estimator order and then divided by the
+    number of trees. Class distributions are only stored for leaves.
+
+    The NumPy walk wins where sklearn's fixed per-call cost dominates (small
+    batches); sklearn's compiled traversal wins on large ones. Batches larger
+    than ``fallback_rows`` are handed to the wrapped forest.
+    """
+
+    def __init__(self, forest, fallback_rows=None):
+        self.forest = forest
+        self.fallback_rows = fallback_rows
+        self.classes_ = forest.classes_
+        self.n_classes_ = len(forest.classes_)
+        self.n_features_in_ = forest.n_features_in_
+
+        features, thresholds, children, leaf_index, values, roots = [], [], [], [], [], []
+        offset = n_leaves = 0
+        self.max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            ids = np.arange(n_nodes) + offset
+            is_leaf = tree.children_left == -1
+
+            left = np.where(is_leaf, ids, tree.children_left + offset)
+            right = np.where(is_leaf, ids, tree.children_right + offset)
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            children.append(np.stack([left, right], axis=1))
+            leaf_index.append(np.where(is_leaf, np.cumsum(is_leaf) - 1 + n_leaves, -1))
+            values.append(tree.value[is_leaf, 0, :self.n_classes_])
+            roots.append(offset)
+
+            self.max_depth = max(self.max_depth, tree.max_depth)
+            offset += n_nodes
+            n_leaves += int(is_leaf.sum())
+
+        self._set_arrays({
+            "feature": np.concatenate(features).astype(np.intp),
+            "threshold": float32_thresholds(np.concatenate(thresholds)),
+            # children[2 * node] is the left child, children[2 * node + 1] the right one
+            "children": np.ascontiguousarray(np.concatenate(children), dtype=np.intp).ravel(),
+            # row of ``value`` for each leaf node, -1 for split nodes
+            "leaf_index": np.concatenate(leaf_index).astype(np.intp),
+            "value": np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            "roots": np.asarray(roots, dtype=np.intp),
+        })
+
+    def _set_arrays(self, arrays):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.is_leaf = self.leaf_index >= 0
+        self.n_trees = len(self.roots)
+        self.node_count = len(self.feature)
+
+    def arrays(self):
+        """The packed node arrays, keyed by ARRAY_NAMES (see from_arrays)."""
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    @classmethod
+    def from_arrays(cls, arrays, classes, n_features_in, max_depth=None):
+        """Rebuild a forest from its packed arrays alone (no sklearn estimator, no fallback).
+
+        The arrays are used as given, so they can be read-only memory maps;
+        index arrays may use any integer dtype.
+        """
+        flat = cls.__new__(cls)
+        flat.forest = None
+        flat.fallback_rows = None
+        flat.classes_ = np.asarray(classes)
+        flat.n_classes_ = len(flat.classes_)
+        flat.n_features_in_ = n_features_in
+        flat.max_depth = max_depth
+        flat._set_arrays(arrays)
+        return flat
+
+    def without_fallback(self):
+        """Copy sharing the packed arrays but not the wrapped sklearn forest (e.g. to ship to other processes)."""
+        flat = copy.copy(self)
+        flat.forest = None
+        flat.fallback_rows = None
+        return flat
+
+    def _check_X(self, X):
+        # sklearn trees compare float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has shape {X.shape}, but the forest expects {self.n_features_in_} features"
+            )
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity.")
+        return X
+
+    def apply(self, X):
+        """Leaf reached (row of ``value``) by every row in every tree, shape (n_rows, n_trees)."""
+        X = self._check_X(X)
+        leaves = np.empty((X.shape[0], self.n_trees), dtype=np.intp)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            leaves[start:start + CHUNK_ROWS] = self._apply_chunk(chunk)
+        return leaves
+
+    def _apply_chunk(self, X):
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+
+        # One active (row, tree) pair per entry; pairs drop out as they reach a leaf
+        pair = np.arange(n_rows * self.n_trees)
+        node = np.tile(self.roots, n_rows)
+        row_base = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+
+        leaves = np.empty(n_rows * self.n_trees, dtype=np.intp)
+        while pair.size:
+            # Leaves are their own children, so pairs that reached one stay put;
+            # dropping them only every few levels saves most of the compaction
+            for _ in range(LEVELS_PER_COMPACTION):
+                go_right = flat_X[row_base + self.feature[node]] > self.threshold[node]
+                node = self.children[2 * node + go_right]
+            done = self.is_leaf[node]
+            if done.any():
+                leaves[pair[done]] = self.leaf_index[node[done]]
+                keep = ~done
+                pair, node, row_base = pair[keep], node[keep], row_base[keep]
+
+        return leaves.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X):
+        if self.fallback_rows is not None and len(X) > self.fallback_rows:
+            return self.forest.predict_proba(X)
+
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.n_classes_), dtype=np.float64)
+        for t in range(self.n_trees):
+            proba += self.value[leaves[:, t]]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
@@ -1,42 +1,264 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import joblib
-import pandas as pd
-import sys
-import types
-
-# Failure type labels (from model2)
-label_mapping = {
-    1: "Overstrain Failure",
-    2: "Power Failure",
-    3: "Random Failures",
-    4: "Tool Wear",
-    5: "Heat Dissipation Failure"
-}
-
-# Custom functions used inside preprocessing or model
-def kelvin_to_celsius(k_temp):
-    return k_temp - 273.15
-
-def ordinal_encoding(X):
-    mapping = {"L": 0, "M": 1, "H": 2}
-    return X.replace(mapping)
-
-# Register functions for joblib deserialization
-module_name = "__main__"
-if module_name not in sys.modules:
-    sys.modules[module_name] = types.ModuleType(module_name)
-
-setattr(sys.modules[module_name], "kelvin_to_celsius", kelvin_to_celsius)
-setattr(sys.modules[module_name], "ordinal_encoding", ordinal_encoding)
-
-# Load models and preprocessor
-preprocessor = joblib.load("preprocessing.joblib")     # Preprocessing pipeline
-model = joblib.load("model_failure.joblib")            # Binary model: Failure / No Failure
-model2 = joblib.load("failure_type.joblib")            # Multiclass model: Type of failure
+import asyncio
+import hmac
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, model_validator
+from starlette.requests import ClientDisconnect
+from typing import Dict, List, Optional
+
+# Only light imports here: pandas, sklearn and the model artifacts are loaded
+# by the background loader below, after the server has bound its port
+from batching import MicroBatcher
+from config import DECISION_THRESHOLD, INFERENCE_WORKERS, MICROBATCH_MAX_ROWS, MICROBATCH_MAX_WAIT_MS
+from config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S, STREAM_CHUNK_ROWS
+from config import ADMIN_TOKEN, MODEL_FORMAT, MODEL_VERSION, MODEL_WATCH_INTERVAL_S, PROFILE_ENABLED, PROFILE_MAX_SECONDS
+from metrics import format_histogram, format_value, metrics, observe_stage
+from result_cache import ResultCache
+
+# Serving state, filled in by load_models() (see config.py for the serving settings)
+cascade = None
+# Process pool for inference, started with the app when INFERENCE_WORKERS > 0
+pool = None
+# Request coalescer for /predict, started with the app when MICROBATCH_MAX_ROWS > 0
+batcher = None
+# Rolling per-machine telemetry windows (see telemetry.py), fed by /telemetry
+machines = None
+# Cache of results for repeated readings, when RESULT_CACHE_SIZE > 0
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S) if RESULT_CACHE_SIZE > 0 else None
+# Startup progress and per-stage timings (seconds), reported by /readyz
+startup = {"status": "loading", "error": None, "timings": {}}
+# Second model version scoring the same traffic for comparison (see shadow.py), set by /admin/shadow
+shadow = None
+shadow_tasks = set()
+# Canary reports of the latest model reloads, newest last
+reloads = deque(maxlen=20)
+# One reload at a time
+reload_lock = asyncio.Lock()
+# Latest sampling profile (see profiler.py), started through /admin/profile/start
+profile = None
+# What-if sweeps over the serving models (see simulate.py), built on the first /simulate
+simulator = None
+
+def load_cascade_and_warm_up():
+    timings = startup["timings"]
+
+    start = time.perf_counter()
+    import artifacts
+    import cascade as cascade_module
+    from registry import ModelRegistry
+    timings["import"] = time.perf_counter() - start
+
+    # MODEL_VERSION, else the newest registry version, else the artifacts in
+    # the working directory (in MODEL_FORMAT)
+    start = time.perf_counter()
+    registry = ModelRegistry()
+    version = MODEL_VERSION or registry.latest()
+    if version:
+        loaded = registry.load(version)
+    elif MODEL_FORMAT == "packed":
+        from packed import load_packed
+        loaded = load_packed()
+    else:
+        loaded = artifacts.load_cascade()
+    timings["deserialize"] = time.perf_counter() - start
+
+    # Pre-touch the tree arrays so the first real request doesn't pay for it
+    start = time.perf_counter()
+    cascade_module.warm_up(loaded)
+    timings["warm_up"] = time.perf_counter() - start
+    return loaded
+
+async def load_models():
+    global cascade, pool, batcher, machines
+    try:
+        loaded = await run_in_threadpool(load_cascade_and_warm_up)
+        from telemetry import MachineStates
+        machines = MachineStates()
+
+        if INFERENCE_WORKERS > 0:
+            from pool import InferencePool
+
+            start = time.perf_counter()
+            pool = InferencePool(loaded, INFERENCE_WORKERS)
+            await run_in_threadpool(pool.warm_up)
+            startup["timings"]["pool"] = time.perf_counter() - start
+        if MICROBATCH_MAX_ROWS > 0:
+            batcher = MicroBatcher(
+                run_predict,
+                max_rows=MICROBATCH_MAX_ROWS,
+                max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                max_concurrency=pool.n_workers if pool is not None else 1,
+            )
+
+        cascade = loaded
+        startup["status"] = "ready"
+    except Exception as e:
+        startup["status"] = "failed"
+        startup["error"] = str(e)
+
+# Load a registry version (the newest by default) next to the serving one and
+# run the canary batch on it; returns (candidate or None, canary report)
+def load_candidate(version=None):
+    from registry import ModelRegistry, canary_check
+
+    registry = ModelRegistry()
+    version = version or registry.latest()
+    if version is None:
+        raise FileNotFoundError(f"No model versions in {registry.root}")
+    candidate = registry.load(version)
+    return candidate, canary_check(candidate, cascade)
+
+# Swap in a new version once it passes the canary. Requests already running
+# finish on the version (and worker pool) they started with; the old pool is
+# shut down after its queued blocks are scored.
+async def swap_models(version=None):
+    global cascade, pool
+    async with reload_lock:
+        start = time.perf_counter()
+        try:
+            candidate, report = await run_in_threadpool(load_candidate, version)
+        except Exception as e:
+            candidate, report = None, {"version": version, "passed": False, "reason": f"{type(e).__name__}: {e}"}
+
+        if report["passed"]:
+            new_pool = None
+            if INFERENCE_WORKERS > 0:
+                from pool import InferencePool
+
+                new_pool = await run_in_threadpool(InferencePool, candidate, INFERENCE_WORKERS)
+                await run_in_threadpool(new_pool.warm_up)
+            old_pool = pool
+            report["previous"] = cascade.version
+            cascade, pool = candidate, new_pool
+            if old_pool is not None:
+                await run_in_threadpool(old_pool.close, False)
+
+        report["seconds"] = time.perf_counter() - start
+        report["at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        reloads.append(report)
+        return report
+
+# Swap in each new registry version as it appears (MODEL_WATCH_INTERVAL_S > 0).
+# Only versions published after the watcher started count, so a manual
+# rollback through /admin/reload sticks.
+async def watch_registry():
+    from registry import ModelRegistry
+
+    registry = ModelRegistry()
+    seen = await run_in_threadpool(registry.latest)
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL_S)
+        latest = await run_in_threadpool(registry.latest)
+        if latest != seen and cascade is not None:
+            seen = latest
+            if latest != cascade.version:
+                await swap_models(latest)
+
+@asynccontextmanager
+async def lifespan(app):
+    global pool, batcher, shadow
+    # Load in the background so the server binds (and answers /healthz) immediately
+    loader = asyncio.create_task(load_models())
+    watcher = asyncio.create_task(watch_registry()) if MODEL_WATCH_INTERVAL_S > 0 else None
+    try:
+        yield
+    finally:
+        for task in (loader, watcher):
+            if task is not None and not task.done():
+                task.cancel()
+        shadow = None
+        batcher = None
+        if pool is not None:
+            pool.close()
+            pool = None
+
+def require_ready():
+    if cascade is None:
+        raise HTTPException(status_code=503, detail=f"Model {startup['status']}")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin routes are disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+def require_profiling():
+    if not PROFILE_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (PROFILE_ENABLED=1)")
+
+# Request latency and count per route and status code. A plain ASGI
+# middleware: no extra task or body buffering per request. The start time is
+# left in the scope for the parse_validate stage (see observe_parse).
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            return await self.app(scope, receive, send)
+        start = scope["metrics_start"] = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            labels = route_labels(route.path if route is not None else "unmatched", status[0])
+            metrics.observe("request_seconds", time.perf_counter() - start, labels[0])
+            metrics.inc("requests_total", labels=labels[1])
+
+# (route) and (route, status) label tuples, built once per pair
+_route_labels = {}
+
+def route_labels(path, status):
+    labels = _route_labels.get((path, status))
+    if labels is None:
+        labels = _route_labels[(path, status)] = ((("route", path),), (("route", path), ("status", status)))
+    return labels
+
+# Time from the first byte of the request to the handler: body read, JSON
+# parsing and pydantic validation
+def observe_parse(request):
+    start = request.scope.get("metrics_start")
+    if start is not None:
+        observe_stage("parse_validate", time.perf_counter() - start)
+
+# Failed predict requests: 422 for readings the models can't take (e.g. an
+# unknown Type), 500 otherwise, with the message in the body
+def error_response(route, e):
+    metrics.inc("errors_total", labels=(("route", route), ("error", type(e).__name__)))
+    return JSONResponse({"error": str(e)}, status_code=422 if isinstance(e, ValueError) else 500)
 
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Liveness: the process is up and serving HTTP
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+# Readiness: models loaded and warmed up
+@app.get("/readyz")
+def readyz():
+    body = {
+        "status": startup["status"],
+        "version": cascade.version if cascade is not None else None,
+        "timings": startup["timings"],
+    }
+    if startup["error"]:
+        body["error"] = startup["error"]
+    return JSONResponse(body, status_code=200 if cascade is not None else 503)
 
 # Input schema
 class InputData(BaseModel):
@@ -47,41 +269,453 @@ class InputData(BaseModel):
     tool_wear_min: int
     type: str  # "L", "M", or "H"
 
+# Columnar batch schema: one array per field, all the same length
+class ColumnarInputData(BaseModel):
+    air_temperature_K: List[float]
+    process_temperature_K: List[float]
+    rotational_speed_rpm: List[int]
+    torque_Nm: List[float]
+    tool_wear_min: List[int]
+    type: List[str]
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        lengths = {name: len(getattr(self, name)) for name in type(self).model_fields}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"All columns must have the same length, got {lengths}")
+        return self
+
+    def __len__(self):
+        return len(self.type)
+
+# Batch schema: either a list of rows or columnar arrays
+class BatchInputData(BaseModel):
+    rows: Optional[List[InputData]] = None
+    columns: Optional[ColumnarInputData] = None
+
+    @model_validator(mode="after")
+    def check_one_layout(self):
+        if (self.rows is None) == (self.columns is None):
+            raise ValueError("Provide exactly one of 'rows' or 'columns'")
+        return self
+
+# Telemetry schema: a reading tagged with its machine (data.csv Product ID) and,
+# optionally, its time; readings without a timestamp are spaced one unit apart
+class TelemetryReading(InputData):
+    machine_id: str
+    timestamp: Optional[float] = None
+
+class TelemetryBatch(BaseModel):
+    readings: List[TelemetryReading]
+
+# Score API-layout records (row dicts or a dict of columns): on the process pool if there is one, otherwise
+# in the threadpool so the event loop stays free
+# (the cascade is passed in so a request never straddles a model swap)
+def predict_records(current, records, threshold, probabilities):
+    processed = current.transform_records(records)
+    return current.predict(processed, threshold, probabilities)
+
+async def run_predict(records, threshold, probabilities):
+    if pool is not None:
+        start = time.perf_counter()
+        results = await pool.predict(records, threshold, probabilities)
+        observe_stage("pool", time.perf_counter() - start)
+    else:
+        results = await run_in_threadpool(predict_records, cascade, records, threshold, probabilities)
+    if shadow is not None:
+        score_shadow(shadow, records, results, threshold)
+    return results
+
+# Compare with the shadow version in the background, after the results are ready
+def score_shadow(scorer, records, results, threshold):
+    if scorer.try_acquire():
+        task = asyncio.ensure_future(run_in_threadpool(scorer.compare, records, results, threshold))
+        shadow_tasks.add(task)
+        task.add_done_callback(shadow_tasks.discard)
+
+# Score one row: the batcher coalesces it with other concurrent requests
+async def predict_one(record, threshold, probabilities):
+    if batcher is not None:
+        return await batcher.submit(record, threshold, probabilities)
+    return (await run_predict([record], threshold, probabilities))[0]
+
+# Score row dicts, serving repeated readings from the result cache without
+# touching the preprocessor or either forest
+async def predict_rows(rows, threshold, probabilities):
+    if result_cache is None:
+        if len(rows) == 1:
+            return [await predict_one(rows[0], threshold, probabilities)]
+        return await run_predict(rows, threshold, probabilities)
+
+    start = time.perf_counter()
+    version = cascade.version
+    result_cache.check_version(version)
+    keys = [result_cache.key(row, threshold, probabilities) for row in rows]
+    results = [result_cache.get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    observe_stage("cache_lookup", time.perf_counter() - start)
+    if len(misses) == 1:
+        fresh = [await predict_one(rows[misses[0]], threshold, probabilities)]
+    elif misses:
+        fresh = await run_predict([rows[i] for i in misses], threshold, probabilities)
+    else:
+        fresh = []
+    for i, result in zip(misses, fresh):
+        results[i] = result
+        # Not cached if the model was swapped meanwhile
+        if cascade.version == version:
+            result_cache.put(keys[i], result)
+    return results
+
 # Predict route
+# Query options shared by the predict routes:
+#   probabilities - also return the failure probability and failure-type distribution
+#   threshold     - flag a failure when its probability is at least this value
+#                   (defaults to DECISION_THRESHOLD, else the binary model's decision)
 @app.post("/predict")
-def predict(data: InputData):
+async def predict(
+    request: Request,
+    data: InputData,
+    probabilities: bool = False,
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+):
+    observe_parse(request)
+    if threshold is None:
+        threshold = DECISION_THRESHOLD
+    require_ready()
     try:
-        # Convert to DataFrame
-        input_dict = data.dict()
-        df = pd.DataFrame([input_dict])
-
-        # Rename to match training column names
-        df.rename(columns={
-            "air_temperature_K": "Air temperature [K]",
-            "process_temperature_K": "Process temperature [K]",
-            "rotational_speed_rpm": "Rotational speed [rpm]",
-            "torque_Nm": "Torque [Nm]",
-            "tool_wear_min": "Tool wear [min]",
-            "type": "Type"
-        }, inplace=True)
-
-        # Preprocess
-        processed_input = preprocessor.transform(df)
-
         # Step 1: Binary classification (Failure / No Failure)
-        failure_prediction = model.predict(processed_input)[0]
+        # Step 2: Multiclass classification (Type of failure), only if flagged
+        # (the compiled kernel skips the DataFrame for single rows)
+        return (await predict_rows([data.dict()], threshold, probabilities))[0]
+
+    except Exception as e:
+        return error_response("/predict", e)
 
-        if failure_prediction == 0:
-            return {"prediction": "No Failure"}
+# Batch predict route: one preprocess and one cascade pass for the whole block
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    data: BatchInputData,
+    probabilities: bool = False,
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+):
+    observe_parse(request)
+    if threshold is None:
+        threshold = DECISION_THRESHOLD
+    require_ready()
+    try:
+        if data.rows is not None:
+            records = [row.dict() for row in data.rows]
         else:
-            # Step 2: Multiclass classification (Type of failure)
-            failure_type_prediction = model2.predict(processed_input)[0]
-            failure_label = label_mapping.get(failure_type_prediction, "Unknown Failure Type")
+            records = data.columns.dict()
+
+        if not len(data.rows if data.rows is not None else data.columns):
+            return {"predictions": []}
 
-            return {
-                "prediction": "Failure Detected",
-                "failure_type": failure_label
-            }
+        # Results come back in input order
+        if result_cache is not None:
+            if data.rows is None:
+                records = [dict(zip(records, values)) for values in zip(*records.values())]
+            return {"predictions": await predict_rows(records, threshold, probabilities)}
+        return {"predictions": await run_predict(records, threshold, probabilities)}
 
     except Exception as e:
-        return {"error": str(e)}
+        return error_response("/predict/batch", e)
+
+# Push readings into their machines' rolling windows; returns one JSON-ready
+# feature dict per reading
+def update_machines(readings):
+    columns = {field: [getattr(r, field) for r in readings] for field in InputData.model_fields}
+    timestamps = [float("nan") if r.timestamp is None else r.timestamp for r in readings]
+    features = machines.update([r.machine_id for r in readings], columns, timestamps)
+    names = list(features)
+    return [dict(zip(names, values)) for values in zip(*(features[name].tolist() for name in names))]
+
+# Telemetry route: update each machine's rolling window (means, stds, slopes and
+# failure-mode physics) and score the readings through the cascade
+@app.post("/telemetry")
+async def telemetry(
+    data: TelemetryBatch,
+    probabilities: bool = False,
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+):
+    if threshold is None:
+        threshold = DECISION_THRESHOLD
+    require_ready()
+    try:
+        if not data.readings:
+            return {"predictions": []}
+        features = await run_in_threadpool(update_machines, data.readings)
+        records = [reading.dict(include=set(InputData.model_fields)) for reading in data.readings]
+        results = await run_predict(records, threshold, probabilities)
+        return {"predictions": [{**result, "machine": machine} for result, machine in zip(results, features)]}
+
+    except Exception as e:
+        return error_response("/telemetry", e)
+
+# Current rolling features of one machine
+@app.get("/machines/{machine_id}")
+def machine_state(machine_id: str):
+    require_ready()
+    features = machines.snapshot(machine_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail="Unknown machine")
+    return {"machine_id": machine_id, **features}
+
+# What-if schema: the machines' current readings, the reading to sweep (an
+# InputData field) over a grid (default: the range the models were fitted on)
+# and, optionally, values of other readings to try as scenarios
+class SimulationInput(BaseModel):
+    machines: List[InputData]
+    sweep: str = "tool_wear_min"
+    grid: Optional[List[float]] = None
+    scenarios: Optional[Dict[str, List[float]]] = None
+
+# Sweep in the API process; the simulator (sorted split thresholds) is rebuilt
+# only when the serving cascade changes
+def run_simulation(current, data, threshold, from_current, curves):
+    global simulator
+    from cascade import COLUMN_NAMES, FIELD_NAMES, to_frame
+    from simulate import Simulator
+
+    if simulator is None or simulator.cascade is not current:
+        simulator = Simulator(current)
+    for field in [data.sweep, *(data.scenarios or {})]:
+        if field not in COLUMN_NAMES or field == "type":
+            raise ValueError(f"Cannot vary {field!r}; expected one of {list(COLUMN_NAMES)[:-1]}")
+    machines = to_frame([machine.dict() for machine in data.machines])
+    scenarios = {COLUMN_NAMES[field]: values for field, values in (data.scenarios or {}).items()}
+    result, grid, probability = simulator.sweep(
+        machines, COLUMN_NAMES[data.sweep], data.grid, scenarios, threshold, from_current, curves=True
+    )
+
+    result = result.rename(columns=FIELD_NAMES)
+    result.insert(0, "machine", result.index)
+    records = result.astype(object).where(result.notna(), None).to_dict("records")
+    body = {"sweep": data.sweep, "results": records}
+    if curves:
+        body["grid"] = grid.tolist()
+        for record, curve in zip(records, probability.tolist()):
+            record["failure_probability_curve"] = curve
+    return body
+
+# What-if / remaining useful life: sweep one reading of each machine (tool
+# wear by default), per scenario, and return the first value at which a
+# failure is flagged, the failure probability and predicted failure type
+# there, and how far that is from the current reading.
+#   from_current - only count grid values at or above the current reading
+#   curves       - also return the grid and each failure probability curve
+@app.post("/simulate")
+async def simulate(
+    request: Request,
+    data: SimulationInput,
+    from_current: bool = True,
+    curves: bool = False,
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+):
+    observe_parse(request)
+    if threshold is None:
+        threshold = DECISION_THRESHOLD
+    require_ready()
+    try:
+        if not data.machines:
+            return {"sweep": data.sweep, "results": []}
+        return await run_in_threadpool(run_simulation, cascade, data, threshold, from_current, curves)
+
+    except Exception as e:
+        return error_response("/simulate", e)
+
+# Result cache size, hit/miss and eviction counters
+@app.get("/stats/cache")
+def cache_stats():
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+# Micro-batching queue depth and batch-size / wait-time histograms, for tuning
+# MICROBATCH_MAX_ROWS and MICROBATCH_MAX_WAIT_MS
+@app.get("/stats/batching")
+def batching_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+# Tracked machines and ring buffer memory
+@app.get("/stats/machines")
+def machine_stats():
+    require_ready()
+    return machines.stats()
+
+# Prometheus text exposition: per-stage and per-route latency histograms,
+# cascade branch and error counters, plus the micro-batching, result cache
+# and telemetry figures. Failure-type branch rate =
+# pm_cascade_flagged_rows_total / pm_cascade_rows_total.
+@app.get("/metrics")
+def metrics_endpoint():
+    lines = metrics.render()
+    lines += format_value("model_info", "gauge", "Serving model version", 1,
+                          (("version", cascade.version if cascade is not None else ""),))
+    if batcher is not None:
+        lines += format_histogram("microbatch_size_rows", batcher.batch_sizes, text="Rows per micro-batch")
+        lines += format_histogram("microbatch_queue_wait_ms", batcher.wait_ms,
+                                  text="Time rows waited for their micro-batch (ms)")
+        lines += format_value("microbatch_queue_depth", "gauge", "Rows waiting for a micro-batch", batcher.queue_depth)
+    if result_cache is not None:
+        stats = result_cache.stats()
+        for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            lines += format_value(f"result_cache_{name}_total", "counter", f"Result cache {name}", stats[name])
+    if machines is not None:
+        lines += format_value("telemetry_machines", "gauge", "Machines with a rolling window", len(machines))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# Shadow version and its disagreement counts
+@app.get("/stats/shadow")
+def shadow_stats():
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, **shadow.stats()}
+
+# Model registry: versions on disk, the serving and shadow versions and the
+# latest reload reports
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+def list_models():
+    from registry import ModelRegistry
+
+    registry = ModelRegistry()
+    versions = []
+    for version in registry.versions():
+        manifest = registry.manifest(version)
+        versions.append({"name": version, **{
+            key: manifest.get(key) for key in ("created", "published", "mode", "parent", "rows_seen", "trees")
+        }})
+    return {
+        "serving": cascade.version if cascade is not None else None,
+        "shadow": shadow.cascade.version if shadow is not None else None,
+        "registry": registry.root,
+        "versions": versions,
+        "reloads": list(reloads),
+    }
+
+# Load a registry version (default: the newest), check it on the canary batch
+# and swap it in without interrupting traffic; 409 with the canary report if it fails
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+async def reload_models(version: Optional[str] = None):
+    require_ready()
+    report = await swap_models(version)
+    return JSONResponse(report, status_code=200 if report["passed"] else 409)
+
+# Score all traffic with a second registry version as well and record how often
+# it disagrees with the serving one (see /stats/shadow)
+@app.post("/admin/shadow", dependencies=[Depends(require_admin)])
+async def start_shadow(version: str):
+    global shadow
+    require_ready()
+    from shadow import ShadowScorer
+
+    try:
+        candidate, report = await run_in_threadpool(load_candidate, version)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404 if isinstance(e, FileNotFoundError) else 400, detail=str(e))
+    shadow = ShadowScorer(candidate)
+    return {"shadow": version, "canary": report}
+
+@app.delete("/admin/shadow", dependencies=[Depends(require_admin)])
+def stop_shadow():
+    global shadow
+    stats = shadow.stats() if shadow is not None else None
+    shadow = None
+    return {"enabled": False, "final": stats}
+
+# Sampling profiler for production debugging: samples every thread's stack
+# until stopped (or PROFILE_MAX_SECONDS). GET /admin/profile?format=collapsed
+# returns flamegraph-ready stacks.
+@app.post("/admin/profile/start", dependencies=[Depends(require_profiling), Depends(require_admin)])
+def start_profile(interval_ms: float = Query(5.0, ge=0.5, le=1000.0)):
+    global profile
+    from profiler import SamplingProfiler
+
+    if profile is not None and profile.running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    profile = SamplingProfiler(interval_ms / 1000.0, PROFILE_MAX_SECONDS).start()
+    return profile.summary()
+
+@app.post("/admin/profile/stop", dependencies=[Depends(require_profiling), Depends(require_admin)])
+def stop_profile():
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile started")
+    return profile.stop().summary()
+
+@app.get("/admin/profile", dependencies=[Depends(require_profiling), Depends(require_admin)])
+def get_profile(format: str = Query("summary", pattern="^(summary|collapsed)$")):
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile started")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    return profile.summary()
+
+# StreamingResponse that leaves receive() to the endpoint, so the request body
+# can still be read while results stream out (the stock response consumes
+# incoming messages to watch for disconnects)
+class DuplexStreamingResponse(StreamingResponse):
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+# Streaming route for bulk backfills: data.csv-layout CSV (Content-Type: text/csv)
+# or NDJSON in, NDJSON or CSV out. The body is parsed in bounded-size chunks
+# and results are streamed back as each chunk is scored. With machine_features,
+# rows carrying a Product ID also feed the per-machine telemetry windows and
+# get their rolling features.
+@app.post("/predict/stream")
+async def predict_stream(
+    request: Request,
+    output: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    chunk_rows: int = Query(STREAM_CHUNK_ROWS, ge=1, le=1_000_000),
+    probabilities: bool = False,
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0),
+    machine_features: bool = False,
+):
+    if threshold is None:
+        threshold = DECISION_THRESHOLD
+    require_ready()
+    from streaming import QueueReader, score_stream
+
+    input_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+
+    # Bounded hand-off from the event loop to the parser thread
+    body = QueueReader()
+
+    # A client that disconnects mid-upload ends the parser's input with an
+    # error rather than leaving it (and its threadpool thread) waiting
+    async def pump_body():
+        try:
+            async for data in request.stream():
+                if data:
+                    await run_in_threadpool(body.feed, data)
+        except asyncio.CancelledError:
+            body.fail(ClientDisconnect())
+            raise
+        except Exception as e:
+            body.fail(e)
+            return
+        await run_in_threadpool(body.feed, None)
+
+    pump = asyncio.create_task(pump_body())
+
+    async def results():
+        stream = score_stream(cascade, body, input_format, output, chunk_rows, threshold, probabilities,
+                              machines if machine_features else None)
+        try:
+            async for data in iterate_in_threadpool(stream):
+                yield data
+        finally:
+            body.abandon()
+            pump.cancel()
+
+    media_type = "text/csv" if output == "csv" else "application/x-ndjson"
+    return DuplexStreamingResponse(results(), media_type=media_type)
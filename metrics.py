@@ -0,0 +1,199 @@
+"""Low-overhead serving metrics, exported in the Prometheus text format by GET /metrics.
+
+Stage timings are plain ``time.perf_counter()`` pairs around each step of
+the hot path, recorded into fixed-bucket histograms. Each thread records
+into its own shard of the registry without taking a lock (a bisect and a
+few dict lookups, a fraction of a microsecond per observation); shards are
+merged when /metrics is scraped. Work done inside inference worker
+processes (INFERENCE_WORKERS > 0) is not visible here; the API process
+records the whole round trip as the ``pool`` stage instead.
+"""
+import bisect
+import threading
+
+from config import METRICS_ENABLED
+
+PREFIX = "pm_"
+
+# Latency buckets in seconds: 10 us .. 10 s
+LATENCY_BUCKETS = [
+    1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0,
+]
+
+
+class Histogram:
+    """Fixed-bucket counter: counts[i] is the number of observations <= bounds[i] (last bucket is +Inf)."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.add(value)
+
+    def add(self, value):
+        """observe() without the lock, for a histogram only one thread writes to."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, count in enumerate(list(other.counts)):
+            self.counts[i] += count
+        self.total += other.total
+        self.sum += other.sum
+
+    def snapshot(self):
+        labels = [str(b) for b in self.bounds] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "sum": self.sum,
+        }
+
+
+def _labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in pairs) + "}"
+
+
+def format_header(name, kind, text):
+    return [f"# HELP {PREFIX}{name} {text}", f"# TYPE {PREFIX}{name} {kind}"]
+
+
+def format_value(name, kind, text, value, labels=()):
+    """HELP / TYPE lines and one sample, for a counter or gauge kept outside the registry."""
+    return format_header(name, kind, text) + [f"{PREFIX}{name}{_labels(labels)} {value}"]
+
+
+def format_histogram(name, histogram, labels=(), text=None):
+    """Prometheus sample lines (cumulative buckets, _sum, _count) for one Histogram, with a header if ``text`` is given."""
+    lines = format_header(name, "histogram", text) if text else []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds + ["+Inf"], histogram.counts):
+        cumulative += count
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+    lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {histogram.sum}")
+    lines.append(f"{PREFIX}{name}_count{_labels(labels)} {histogram.total}")
+    return lines
+
+
+class Metrics:
+    """Labelled counters and histograms, rendered in the Prometheus text exposition format.
+
+    Labels are tuples of (name, value) pairs. ``enabled=False`` turns every
+    observation into a no-op.
+
+    Every thread writes to its own shard (histograms and counters dicts)
+    with no locking; render() and counter() add the shards up. A scrape
+    racing a write may see that one observation in the bucket counts but
+    not yet in _sum / _count.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._help = {}         # metric name -> (type, help text)
+        self._local = threading.local()
+        self._shards = []       # per-thread ({(name, labels): Histogram}, {(name, labels): value})
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def _new_shard(self):
+        local = self._local
+        local.histograms, local.counters = shard = ({}, {})
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    # observe() and inc() run several times per request, so they are kept flat
+    def observe(self, name, value, labels=(), bounds=LATENCY_BUCKETS):
+        if not self.enabled:
+            return
+        try:
+            histograms = self._local.histograms
+        except AttributeError:
+            histograms = self._new_shard()[0]
+        histogram = histograms.get((name, labels))
+        if histogram is None:
+            histogram = histograms[(name, labels)] = Histogram(bounds)
+        histogram.counts[bisect.bisect_left(histogram.bounds, value)] += 1
+        histogram.total += 1
+        histogram.sum += value
+
+    def inc(self, name, value=1, labels=()):
+        if not self.enabled:
+            return
+        try:
+            counters = self._local.counters
+        except AttributeError:
+            counters = self._new_shard()[1]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def _merged(self):
+        with self._lock:
+            shards = list(self._shards)
+        histograms, counters = {}, {}
+        for shard_histograms, shard_counters in shards:
+            # dict.copy() runs under the GIL, so a concurrent insert can't break the iteration
+            for key, histogram in shard_histograms.copy().items():
+                if key not in histograms:
+                    histograms[key] = Histogram(histogram.bounds)
+                histograms[key].merge(histogram)
+            for key, value in shard_counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    def counter(self, name, labels=()):
+        return self._merged()[1].get((name, labels), 0)
+
+    def render(self):
+        lines = []
+        histograms, counters = self._merged()
+        counters = sorted(counters.items())
+        histograms = sorted(histograms.items(), key=lambda item: item[0])
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.extend(format_header(name, kind, self._help.get(name, (kind, name))[1]))
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            lines.extend(format_histogram(name, histogram, labels))
+        return lines
+
+
+# Process-wide registry used by the API and the cascade
+metrics = Metrics(enabled=METRICS_ENABLED)
+metrics.describe("stage_seconds", "histogram", "Time spent in each step of the predict path")
+metrics.describe("request_seconds", "histogram", "HTTP request latency by route, from first byte to response")
+metrics.describe("requests_total", "counter", "HTTP requests by route and status code")
+metrics.describe("errors_total", "counter", "Failed predict requests by route and exception type")
+metrics.describe("cascade_calls_total", "counter", "Cascade passes over a preprocessed block")
+metrics.describe("cascade_rows_total", "counter", "Rows scored by the binary failure model")
+metrics.describe("cascade_flagged_rows_total", "counter", "Rows flagged as failures and passed to the failure-type model")
+metrics.describe("cascade_model2_calls_total", "counter", "Cascade passes in which the failure-type model ran")
+
+# Stage label tuples, built once
+STAGES = {
+    stage: (("stage", stage),)
+    for stage in ("parse_validate", "frame", "preprocess", "model_failure", "failure_type", "format", "pool",
+                  "cache_lookup")
+}
+
+
+def observe_stage(stage, seconds):
+    metrics.observe("stage_seconds", seconds, STAGES[stage])
@@ -0,0 +1,349 @@
+"""Compare candidate models and hyper-parameters for both tasks, in parallel, with successive halving.
+
+Replaces the serial comparison in notebooks/models.ipynb. Every candidate
+configuration is cross-validated on a small stratified subset of the
+training split first; after each round only the best 1/FACTOR of the
+configurations go on, on FACTOR times more rows, until the last round uses
+the whole training split. The (configuration, round, fold) fits run in a
+pool of worker processes. The preprocessed training matrix is written once
+as .npy files and memory-mapped read-only by every worker, not pickled to
+each one.
+
+Each finished fold is stored under SEARCH_CACHE_DIR, keyed by the training
+data, the configuration, the rows and the fold, so a rerun (or a run with
+more candidates) only fits what it hasn't seen. The leaderboard lists F1
+next to single-row and batch inference latency, measured serially after
+the search on each configuration's last fitted fold.
+
+    python model_search.py [--data data.csv] [--task both] [--workers 4] [--folds 3] [--factor 3]
+
+The held-out test rows of train.py are never used here (see evaluate.py).
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from config import SEARCH_CACHE_DIR
+from train import RANDOM_STATE, build_preprocessing, load_training_data, split_rows
+
+# Candidate grid: model name -> (estimator class, fixed params, list of searched params)
+CANDIDATES = {
+    "LogisticRegression": (LogisticRegression, {"max_iter": 1000}, [
+        {"C": C, "class_weight": class_weight} for C in (0.1, 1.0, 10.0) for class_weight in (None, "balanced")
+    ]),
+    "SVC": (SVC, {"random_state": RANDOM_STATE}, [
+        {"C": C, "class_weight": class_weight} for C in (1.0, 10.0) for class_weight in (None, "balanced")
+    ]),
+    "DecisionTreeClassifier": (DecisionTreeClassifier, {"random_state": RANDOM_STATE}, [
+        {"max_depth": max_depth, "class_weight": class_weight}
+        for max_depth in (None, 8, 16) for class_weight in (None, "balanced")
+    ]),
+    "RandomForestClassifier": (RandomForestClassifier, {"random_state": RANDOM_STATE, "n_jobs": 1}, [
+        {"n_estimators": n_estimators, "max_depth": max_depth, "class_weight": "balanced"}
+        for n_estimators in (50, 100) for max_depth in (None, 16)
+    ]),
+}
+
+TASKS = ["failure", "failure_type"]
+FOLDS = 3
+FACTOR = 3
+# Smallest round: at least this many training rows (failures are ~3% of
+# rows, so smaller rounds hold too few to rank the models)
+MIN_ROWS = 2000
+# Rows per call for the batch latency figure, and single-row calls timed
+LATENCY_BATCH_ROWS = 1024
+LATENCY_CALLS = 50
+
+# Training arrays written by prepare_data, one .npy file each
+DATA_ARRAYS = ["X", "y", "X_type", "y_type"]
+
+# Training matrix of the running search, memory-mapped by each worker (see _init_worker)
+_worker_data = {}
+
+
+def _init_worker(data_dir):
+    global _worker_data
+    # An unconverged fit is scored like any other
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
+    _worker_data = {
+        name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+        for name in DATA_ARRAYS
+    }
+
+
+def task_data(data, task):
+    return (data["X"], data["y"]) if task == "failure" else (data["X_type"], data["y_type"])
+
+
+def score(task, y_true, y_pred):
+    """Binary F1 of the failure class, or macro F1 over the failure types."""
+    if task == "failure":
+        return f1_score(y_true, y_pred)
+    return f1_score(y_true, y_pred, average="macro")
+
+
+def config_id(model, params):
+    return f"{model}({', '.join(f'{k}={v}' for k, v in params.items())})"
+
+
+def build_model(model, params):
+    cls, fixed, _ = CANDIDATES[model]
+    return cls(**fixed, **params)
+
+
+def fold_key(data_key, task, model, params, n_rows, fold, n_folds):
+    payload = json.dumps([data_key, task, model, params, n_rows, fold, n_folds, RANDOM_STATE], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def round_folds(y, n_rows, n_folds):
+    """Stratified (train, validation) row positions of every fold of a round on n_rows rows."""
+    rows = np.arange(len(y))
+    if n_rows < len(y):
+        # Stratified unless a class is too rare to split
+        counts = np.bincount(y)
+        stratify = y if counts[counts > 0].min() >= 2 else None
+        rows = train_test_split(rows, train_size=n_rows, stratify=stratify, random_state=RANDOM_STATE)[0]
+    folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    return [(rows[train], rows[valid]) for train, valid in folds.split(rows, y[rows])]
+
+
+def _fit_fold(cache_dir, key, task, model, params, n_rows, fold, n_folds):
+    """Fit and score one fold in a worker; the result (and the fitted model) go to the fold cache."""
+    X, y = task_data(_worker_data, task)
+    y = np.asarray(y)
+    train_rows, valid_rows = round_folds(y, n_rows, n_folds)[fold]
+
+    start = time.perf_counter()
+    estimator = build_model(model, params).fit(X[train_rows], y[train_rows])
+    fit_seconds = time.perf_counter() - start
+    result = {
+        "f1": float(score(task, y[valid_rows], estimator.predict(X[valid_rows]))),
+        "fit_seconds": fit_seconds,
+    }
+    # The .json marks the fold as done, so it is renamed into place last
+    _write_atomic(os.path.join(cache_dir, f"{key}.joblib"), lambda f: joblib.dump(estimator, f))
+    _write_atomic(os.path.join(cache_dir, f"{key}.json"), lambda f: f.write(json.dumps(result).encode()))
+    return result
+
+
+def _write_atomic(path, write):
+    """Call write(file) on a temporary file next to path, then rename it over path."""
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_fold(cache_dir, key):
+    """The cached result of a fold, or None if it is missing or unreadable (it is then refitted)."""
+    path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(path) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(os.path.join(cache_dir, f"{key}.joblib")):
+        return None
+    return result
+
+
+def round_sizes(n_rows, n_candidates, factor=FACTOR, min_rows=MIN_ROWS):
+    """Training rows per halving round, ending with all n_rows."""
+    n_rounds = 1 + math.ceil(math.log(max(n_candidates, 1), factor))
+    while n_rounds > 1 and n_rows / factor ** (n_rounds - 1) < min_rows:
+        n_rounds -= 1
+    return [int(n_rows / factor ** (n_rounds - 1 - r)) for r in range(n_rounds)]
+
+
+def prepare_data(data_path, cache_dir):
+    """Preprocess the training splits as train.py does and write them as .npy files; returns (data dir, key)."""
+    X, y, y_type = load_training_data(data_path)
+    train_rows, _, train_rows2, _ = split_rows(y, y_type)
+    preprocessing = build_preprocessing()
+    arrays = {
+        "X": np.ascontiguousarray(preprocessing.fit_transform(X.iloc[train_rows]), dtype=np.float64),
+        "y": y.to_numpy()[train_rows].astype(np.int64),
+        "X_type": np.ascontiguousarray(preprocessing.transform(X.iloc[train_rows2]), dtype=np.float64),
+        "y_type": y_type.to_numpy()[train_rows2].astype(np.int64),
+    }
+    digest = hashlib.sha256()
+    for name, array in arrays.items():
+        digest.update(name.encode() + str(array.shape).encode() + array.tobytes())
+    data_key = digest.hexdigest()[:16]
+
+    data_dir = os.path.join(cache_dir, f"data-{data_key}")
+    if not _data_complete(data_dir):
+        # Written to a staging directory and renamed into place, so the workers
+        # of a concurrent search never map a file that is being rewritten
+        staging = tempfile.mkdtemp(prefix=f"data-{data_key}.tmp-", dir=cache_dir)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(staging, f"{name}.npy"), array)
+            if os.path.exists(data_dir) and not _data_complete(data_dir):
+                # Left half-written by an older version of this script
+                shutil.rmtree(data_dir, ignore_errors=True)
+            os.replace(staging, data_dir)
+        except OSError:
+            # Another search renamed the same arrays into place first; keep those
+            if not _data_complete(data_dir):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return data_dir, data_key
+
+
+def _data_complete(data_dir):
+    return all(os.path.exists(os.path.join(data_dir, f"{name}.npy")) for name in DATA_ARRAYS)
+
+
+def measure_latency(estimator, X, calls=LATENCY_CALLS, batch_rows=LATENCY_BATCH_ROWS):
+    """(median single-row predict latency in ms, batch predict cost in us per row)."""
+    row = np.array(X[:1])
+    estimator.predict(row)
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        estimator.predict(row)
+        timings.append(time.perf_counter() - start)
+    batch = np.array(X[:batch_rows])
+    start = time.perf_counter()
+    estimator.predict(batch)
+    batch_seconds = time.perf_counter() - start
+    return float(np.median(timings)) * 1e3, batch_seconds / len(batch) * 1e6
+
+
+def search(data_path="data.csv", tasks=TASKS, models=None, workers=None, n_folds=FOLDS, factor=FACTOR,
+           min_rows=MIN_ROWS, cache_dir=SEARCH_CACHE_DIR):
+    """Successive-halving search over CANDIDATES for each task; returns the leaderboard DataFrame."""
+    workers = workers or os.cpu_count()
+    os.makedirs(cache_dir, exist_ok=True)
+    data_dir, data_key = prepare_data(data_path, cache_dir)
+    data = {name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+            for name in DATA_ARRAYS}
+    configs = [(model, params) for model in (models or CANDIDATES) for params in CANDIDATES[model][2]]
+
+    rows = []
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(data_dir,),
+    )
+    try:
+        for task in tasks:
+            X, y = task_data(data, task)
+            sizes = round_sizes(len(y), len(configs), factor, min_rows)
+            print(f"{task}: {len(configs)} configurations, {len(y):,} training rows, "
+                  f"rounds of {', '.join(f'{n:,}' for n in sizes)} rows", flush=True)
+
+            alive = list(configs)
+            # config id -> (last round reached, its rows, its fold results, cache key of its fold 0, model, params)
+            reached = {}
+            for round_index, n_rows in enumerate(sizes):
+                start = time.perf_counter()
+                jobs, results, cached = {}, {}, 0
+                for model, params in alive:
+                    for fold in range(n_folds):
+                        key = fold_key(data_key, task, model, params, n_rows, fold, n_folds)
+                        result = load_fold(cache_dir, key)
+                        if result is not None:
+                            results[(config_id(model, params), fold)] = result
+                            cached += 1
+                        else:
+                            future = executor.submit(_fit_fold, cache_dir, key, task, model, params, n_rows, fold,
+                                                     n_folds)
+                            jobs[future] = (config_id(model, params), fold)
+                for future in as_completed(jobs):
+                    results[jobs[future]] = future.result()
+
+                scores = []
+                for model, params in alive:
+                    name = config_id(model, params)
+                    folds = [results[(name, fold)] for fold in range(n_folds)]
+                    key = fold_key(data_key, task, model, params, n_rows, 0, n_folds)
+                    reached[name] = (round_index, n_rows, folds, key, model, params)
+                    scores.append(np.mean([fold["f1"] for fold in folds]))
+                print(f"  round {round_index + 1}: {len(alive)} configurations on {n_rows:,} rows, "
+                      f"{len(jobs)} folds fitted, {cached} cached, {time.perf_counter() - start:.1f} s", flush=True)
+
+                if round_index < len(sizes) - 1:
+                    keep = max(1, math.ceil(len(alive) / factor))
+                    order = np.argsort(scores, kind="stable")[::-1][:keep]
+                    alive = [alive[i] for i in order]
+
+            # Latency, measured here one model at a time so parallel fits don't skew it
+            for name, (round_index, n_rows, folds, key, model, params) in reached.items():
+                estimator = joblib.load(os.path.join(cache_dir, f"{key}.joblib"))
+                latency_ms, batch_us = measure_latency(estimator, X)
+                f1 = [fold["f1"] for fold in folds]
+                rows.append({
+                    "task": task,
+                    "model": model,
+                    "params": json.dumps(params),
+                    "rounds": round_index + 1,
+                    "rows": n_rows,
+                    "f1": float(np.mean(f1)),
+                    "f1_std": float(np.std(f1)),
+                    "fit_seconds": float(np.mean([fold["fit_seconds"] for fold in folds])),
+                    "latency_ms": latency_ms,
+                    "batch_us_per_row": batch_us,
+                })
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    leaderboard = pd.DataFrame(rows)
+    return leaderboard.sort_values(["task", "rounds", "f1"], ascending=[True, False, False], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--task", choices=TASKS + ["both"], default="both")
+    parser.add_argument("--models", nargs="+", choices=list(CANDIDATES), help="model families to search (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--folds", type=int, default=FOLDS)
+    parser.add_argument("--factor", type=int, default=FACTOR, help="keep 1/FACTOR of the configurations per round")
+    parser.add_argument("--min-rows", type=int, default=MIN_ROWS, help="training rows in the first round, at least")
+    parser.add_argument("--cache-dir", default=SEARCH_CACHE_DIR)
+    parser.add_argument("--out", help="write the leaderboard to this CSV file")
+    args = parser.parse_args()
+
+    tasks = TASKS if args.task == "both" else [args.task]
+    start = time.perf_counter()
+    leaderboard = search(args.data, tasks, args.models, args.workers, args.folds, args.factor, args.min_rows,
+                         args.cache_dir)
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60, "display.float_format", "{:.4f}".format):
+        for task, board in leaderboard.groupby("task", sort=False):
+            print(f"\n{task}")
+            print(board.drop(columns="task").to_string(index=False))
+    print(f"\ntotal {time.perf_counter() - start:.1f} s")
+    if args.out:
+        leaderboard.to_csv(args.out, index=False)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Single-file, pickle-free model format for serving.
+
+The preprocessing parameters and both forests are packed into one file:
+
+    magic "PMPACK\\0\\0" | format version (uint32) | header length (uint32) |
+    JSON header | flat node arrays, each aligned to 64 bytes
+
+The header holds the compiled preprocessing ops (see features.FeatureKernel)
+and, per model, its classes and the dtype, shape and file offset of each
+packed node array (see forest.FlatForest). Loading parses the header and
+maps the arrays read-only straight from the file: nothing is unpickled, no
+sklearn objects are built and the custom preprocessing functions are not
+needed. Pages are shared between processes serving the same file.
+
+    python packed.py [--from-dir .] [--out models.pack] [--check data.csv]
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from cascade import Cascade
+from features import FeatureKernel
+from forest import ARRAY_NAMES, FlatForest
+
+MAGIC = b"PMPACK\0\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+# Default location, next to the joblib artifacts
+PACKED_PATH = "models.pack"
+MODEL_NAMES = ["model", "model2"]
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _index_dtype(max_value):
+    return np.uint8 if max_value < 2 ** 8 else np.uint16 if max_value < 2 ** 16 else np.int32
+
+
+def compact_arrays(flat):
+    """A FlatForest's arrays in the narrowest dtypes that hold them exactly."""
+    arrays = flat.arrays()
+    if flat.node_count >= 2 ** 31:
+        raise ValueError(f"Forest too large to pack: {flat.node_count} nodes")
+    return {
+        "feature": arrays["feature"].astype(_index_dtype(flat.n_features_in_)),
+        "threshold": arrays["threshold"].astype(np.float32),
+        "children": arrays["children"].astype(np.int32),
+        "leaf_index": arrays["leaf_index"].astype(np.int32),
+        "value": arrays["value"].astype(np.float64),
+        "roots": arrays["roots"].astype(np.int32),
+    }
+
+
+def export_packed(preprocessor, model, model2, path=PACKED_PATH, info=None):
+    """Write the preprocessor and both forests (sklearn or FlatForest) as one packed file.
+
+    The file is written next to ``path`` and renamed into place. Returns the
+    number of bytes written.
+    """
+    kernel = preprocessor if isinstance(preprocessor, FeatureKernel) else FeatureKernel(preprocessor)
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "preprocessor": kernel.params(),
+        "models": {},
+        **(info or {}),
+    }
+    blocks = []
+    offset = 0
+    for name, forest in zip(MODEL_NAMES, (model, model2)):
+        flat = forest if isinstance(forest, FlatForest) else FlatForest(forest)
+        entry = {
+            "classes": flat.classes_.tolist(),
+            "n_features_in": int(flat.n_features_in_),
+            "n_trees": int(flat.n_trees),
+            "max_depth": None if flat.max_depth is None else int(flat.max_depth),
+            "arrays": {},
+        }
+        for array_name, array in compact_arrays(flat).items():
+            array = np.ascontiguousarray(array)
+            offset = _aligned(offset)
+            entry["arrays"][array_name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            blocks.append((offset, array))
+            offset += array.nbytes
+        header["models"][name] = entry
+
+    # Array offsets are relative to the data section, which starts on the
+    # first aligned byte after the header
+    header_bytes = json.dumps(header).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    # A temporary file of its own, so concurrent exports to the same path
+    # never write into each other's copy
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".tmp-", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + struct.pack("<II", FORMAT_VERSION, len(header_bytes)) + header_bytes)
+            for block_offset, array in blocks:
+                f.seek(data_start + block_offset)
+                f.write(array.tobytes())
+            size = f.tell()
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
+
+
+def read_header(buffer):
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a packed model file")
+    format_version, header_length = struct.unpack_from("<II", buffer, len(MAGIC))
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported packed model format version {format_version} (expected {FORMAT_VERSION})")
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(buffer[start:start + header_length]))
+    return header, _aligned(start + header_length)
+
+
+def load_packed(path=PACKED_PATH, version=None, **settings):
+    """Serve a packed file: a Cascade over the FeatureKernel and FlatForests mapped from it.
+
+    ``version`` defaults to a fingerprint of the file (see artifacts.artifact_version).
+    """
+    from artifacts import artifact_version
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header, data_start = read_header(buffer)
+
+    models = []
+    for name in MODEL_NAMES:
+        entry = header["models"][name]
+        arrays = {}
+        for array_name in ARRAY_NAMES:
+            spec = entry["arrays"][array_name]
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            arrays[array_name] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+        models.append(FlatForest.from_arrays(arrays, entry["classes"], entry["n_features_in"], entry["max_depth"]))
+
+    kernel = FeatureKernel.from_params(header["preprocessor"])
+    settings.setdefault("forest_engine", None)
+    return Cascade(kernel, *models, version=version or artifact_version(path), **settings)
+
+
+def check_packed(path, preprocessor, model, model2, csv_path="data.csv"):
+    """Compare the packed file against the sklearn artifacts over a CSV; returns the rows checked.
+
+    Features must match bit for bit and both models' predict_proba exactly.
+    """
+    import pandas as pd
+
+    packed = load_packed(path)
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    expected = preprocessor.transform(df)
+    processed = packed.transform(df)
+    if processed.tobytes() != np.ascontiguousarray(expected, dtype=np.float64).tobytes():
+        raise AssertionError("Packed preprocessing differs from preprocessor.transform")
+    for name, forest, flat in [("model", model, packed.model), ("model2", model2, packed.model2)]:
+        if not np.array_equal(forest.predict_proba(expected), flat.predict_proba(processed)):
+            raise AssertionError(f"Packed {name} predict_proba differs from sklearn")
+    return len(df)
+
+
+def main():
+    from artifacts import MODEL2_PATH, MODEL_PATH, PREPROCESSOR_PATH, load_artifacts
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from-dir", default=".", help="directory holding the three joblib artifacts")
+    parser.add_argument("--out", help=f"packed file to write (default: <from-dir>/{PACKED_PATH})")
+    parser.add_argument("--check", metavar="CSV", help="verify the packed file against the joblib artifacts on a CSV")
+    args = parser.parse_args()
+
+    out = args.out or os.path.join(args.from_dir, PACKED_PATH)
+    artifacts = load_artifacts(*(
+        os.path.join(args.from_dir, os.path.basename(path)) for path in (PREPROCESSOR_PATH, MODEL_PATH, MODEL2_PATH)
+    ))
+    size = export_packed(*artifacts, out)
+    print(f"wrote {out} ({size / 2 ** 20:.2f} MiB)")
+    if args.check:
+        n_rows = check_packed(out, *artifacts, args.check)
+        print(f"packed models match the joblib artifacts exactly on {n_rows} rows of {args.check}")
+
+
+if __name__ == "__main__":
+    main()
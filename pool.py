@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+
+from cascade import FIELD_NAMES, format_results, to_frame
+from config import POOL_BATCH_ROWS
+from packed import export_packed, load_packed
+
+# Cascade held by each worker process, built by _init_worker
+_worker_cascade = None
+
+
+def _init_worker(packed_path):
+    global _worker_cascade
+    # The node arrays are read-only memory maps of the packed file, so every
+    # worker shares the same page-cache copy instead of holding its own
+    _worker_cascade = load_packed(packed_path)
+
+
+def _worker_pid():
+    return os.getpid()
+
+
+def _run_block(columns, threshold, probabilities):
+    cascade = _worker_cascade
+    failure, failure_type, failure_proba, type_proba = cascade.run(
+        cascade.transform(columns), threshold, probabilities
+    )
+    # Plain arrays, not views of the worker's memory maps
+    return tuple(None if a is None else np.asarray(a) for a in (failure, failure_type, failure_proba, type_proba))
+
+
+class InferencePool:
+    """Pool of inference processes serving the cascade from shared, memory-mapped weights.
+
+    The preprocessor and both forests are written once as a packed model
+    file (see packed.py); workers map it read-only, so the node arrays are
+    shared pages and resident memory does not grow with the worker count.
+    (sklearn's own Tree objects copy their nodes into private memory on
+    unpickling, so mmapping the original joblib files would not share
+    anything.)
+
+    Workers always use the compiled feature kernel and the flat engine, so
+    results are identical to the in-process sklearn path. They get no
+    sklearn fallback for large blocks (see FlatForest): that would mean a
+    private copy of the trees in every worker.
+    """
+
+    def __init__(self, cascade, n_workers, batch_rows=POOL_BATCH_ROWS):
+        self.n_workers = n_workers
+        self.batch_rows = batch_rows
+        self.type_classes = cascade.model2.classes_
+
+        self._dir = tempfile.mkdtemp(prefix="pm-pool-")
+        packed_path = os.path.join(self._dir, "models.pack")
+        export_packed(cascade.preprocessor, cascade.model, cascade.model2, packed_path)
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(packed_path,),
+        )
+
+    def warm_up(self):
+        """Start every worker process now rather than on the first requests."""
+        wait([self.executor.submit(_worker_pid) for _ in range(self.n_workers)])
+
+    async def run(self, columns, threshold=None, probabilities=False):
+        """Run the cascade on a block of columns (training column name -> array) across the pool."""
+        n_rows = len(next(iter(columns.values())))
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(
+                self.executor, _run_block,
+                {col: values[start:start + self.batch_rows] for col, values in columns.items()},
+                threshold, probabilities,
+            )
+            for start in range(0, n_rows, self.batch_rows)
+        ))
+        return tuple(
+            None if part[0] is None else np.concatenate(part)
+            for part in zip(*parts)
+        )
+
+    async def predict(self, records, threshold=None, probabilities=False):
+        """/predict-style result dicts for API-layout records (row dicts or a dict of columns)."""
+        df = to_frame(records)
+        columns = {col: df[col].to_numpy() for col in FIELD_NAMES}
+        outputs = await self.run(columns, threshold, probabilities)
+        return format_results(*outputs, type_classes=self.type_classes)
+
+    def close(self, cancel_futures=True):
+        """Stop the workers; with ``cancel_futures=False`` queued blocks are still scored first."""
+        self.executor.shutdown(wait=True, cancel_futures=cancel_futures)
+        shutil.rmtree(self._dir, ignore_errors=True)
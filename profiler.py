@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Leaf frames of threads that are parked (idle workers, the event loop
+# waiting for I/O); samples ending in them are dropped
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+class SamplingProfiler:
+    """Statistical profiler for a running server: samples every thread's Python stack at a fixed interval.
+
+    Sampling happens in a daemon thread through ``sys._current_frames()``,
+    so nothing is instrumented and the server pays nothing until a profile
+    is started; while it runs, each sample costs a walk of every thread's
+    stack. Stacks are counted in the collapsed format (``outer;...;inner
+    count``) read by flamegraph.pl and speedscope. Native code (NumPy,
+    sklearn's Cython trees) shows up as the Python frame that called it.
+    The profile stops itself after ``max_seconds``.
+    """
+
+    def __init__(self, interval=0.005, max_seconds=300.0):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self._stop = threading.Event()
+        # Guards stacks and samples: the API reads them while the sampler writes
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self.started = time.time()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                sampled.append(";".join(reversed(stack)))
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+        self.stopped = time.time()
+
+    def _snapshot(self):
+        with self._lock:
+            return self.stacks.copy(), self.samples
+
+    def collapsed(self):
+        """The profile in collapsed-stack format, most frequent stacks first."""
+        stacks, _ = self._snapshot()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def summary(self, top=20):
+        """Sample counts and the functions most often on top of a busy stack."""
+        stacks, samples = self._snapshot()
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000.0,
+            "started": self.started,
+            "stopped": self.stopped,
+            "samples": samples,
+            "stacks": len(stacks),
+            "top_functions": [{"function": name, "samples": count} for name, count in leaves.most_common(top)],
+        }
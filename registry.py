@@ -0,0 +1,241 @@
+"""On-disk registry of versioned model artifacts.
+
+Each version is a directory ``<root>/vNNNN/`` holding the three joblib
+artifacts and a manifest.json with their SHA-256 checksums (plus whatever
+train.py recorded: parent version, rows, drift, timings). A version only
+counts once its manifest exists, and the manifest is written last, so a
+half-written directory is never served.
+
+    python registry.py list
+    python registry.py publish .          # copy the artifacts in . as a new version
+    python registry.py verify v0003
+
+Published versions also get a packed copy of the models (see packed.py), so
+every version can be served in either MODEL_FORMAT.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import MODEL2_PATH, MODEL_PATH, PREPROCESSOR_PATH, load_artifacts, load_cascade
+from cascade import COLUMN_NAMES, synthetic_frame, warm_up
+from config import CANARY_MIN_AGREEMENT, CANARY_PATH, CANARY_ROWS, MODEL_FORMAT, MODEL_REGISTRY_DIR
+from packed import PACKED_PATH, export_packed, load_packed
+
+MANIFEST = "manifest.json"
+ARTIFACT_FILES = [os.path.basename(path) for path in (PREPROCESSOR_PATH, MODEL_PATH, MODEL2_PATH)]
+# Copied along when present: the incremental training state (so a published
+# version can seed incremental training) and the packed models
+EXTRA_FILES = ["training_state.joblib", PACKED_PATH]
+
+VERSION_PATTERN = re.compile(r"^v(\d{4,})$")
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(version_dir, manifest):
+    """Add the artifact checksums to ``manifest`` and write it, atomically, as the directory's manifest.json."""
+    manifest = dict(manifest)
+    manifest["checksums"] = {
+        name: file_checksum(os.path.join(version_dir, name))
+        for name in ARTIFACT_FILES + EXTRA_FILES
+        if os.path.exists(os.path.join(version_dir, name))
+    }
+    tmp_path = os.path.join(version_dir, MANIFEST + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, default=float)
+    os.replace(tmp_path, os.path.join(version_dir, MANIFEST))
+    return manifest
+
+
+def verify(version_dir, names=ARTIFACT_FILES):
+    """Raise ValueError unless every artifact in version_dir matches its manifest checksum."""
+    with open(os.path.join(version_dir, MANIFEST)) as f:
+        checksums = json.load(f).get("checksums", {})
+    bad = [
+        name for name in names
+        if name not in checksums
+        or not os.path.exists(os.path.join(version_dir, name))
+        or file_checksum(os.path.join(version_dir, name)) != checksums[name]
+    ]
+    if bad:
+        raise ValueError(f"{version_dir}: checksum mismatch or missing file: {', '.join(bad)}")
+
+
+class ModelRegistry:
+    """Versions under ``root``, oldest first."""
+
+    def __init__(self, root=MODEL_REGISTRY_DIR):
+        self.root = root
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        names = [
+            name for name in os.listdir(self.root)
+            if VERSION_PATTERN.match(name) and os.path.exists(os.path.join(self.root, name, MANIFEST))
+        ]
+        return sorted(names, key=lambda name: int(VERSION_PATTERN.match(name).group(1)))
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def next_version(self):
+        """Number of the next version to publish."""
+        if not os.path.isdir(self.root):
+            return 1
+        numbers = [int(m.group(1)) for m in map(VERSION_PATTERN.match, os.listdir(self.root)) if m]
+        return max(numbers, default=0) + 1
+
+    def path(self, version):
+        if not VERSION_PATTERN.match(version or ""):
+            raise ValueError(f"Invalid version name: {version!r} (expected vNNNN)")
+        version_dir = os.path.join(self.root, version)
+        if not os.path.exists(os.path.join(version_dir, MANIFEST)):
+            raise FileNotFoundError(f"Unknown model version: {version}")
+        return version_dir
+
+    def manifest(self, version):
+        with open(os.path.join(self.path(version), MANIFEST)) as f:
+            return json.load(f)
+
+    def load(self, version, model_format=MODEL_FORMAT, **settings):
+        """Verify a version's checksums and load it as a serving Cascade tagged with the version name."""
+        version_dir = self.path(version)
+        if model_format == "packed":
+            verify(version_dir, [PACKED_PATH])
+            return load_packed(os.path.join(version_dir, PACKED_PATH), version=version, **settings)
+        verify(version_dir)
+        return load_cascade(*(os.path.join(version_dir, name) for name in ARTIFACT_FILES), version=version,
+                            **settings)
+
+    def publish(self, source_dir, info=None):
+        """Copy the artifacts in source_dir into the registry as the next version; returns its name.
+
+        Files are staged in a temporary directory and renamed into place, so
+        the version appears complete or not at all.
+        """
+        version = f"v{self.next_version():04d}"
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f".{version}.tmp")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        manifest = {}
+        if os.path.exists(os.path.join(source_dir, MANIFEST)):
+            with open(os.path.join(source_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+        for name in ARTIFACT_FILES + EXTRA_FILES:
+            if os.path.exists(os.path.join(source_dir, name)):
+                shutil.copy2(os.path.join(source_dir, name), os.path.join(staging, name))
+            elif name in ARTIFACT_FILES:
+                shutil.rmtree(staging)
+                raise FileNotFoundError(f"{os.path.join(source_dir, name)} not found")
+        if not os.path.exists(os.path.join(staging, PACKED_PATH)):
+            artifacts = load_artifacts(*(os.path.join(staging, name) for name in ARTIFACT_FILES))
+            export_packed(*artifacts, os.path.join(staging, PACKED_PATH))
+
+        manifest.update(info or {})
+        manifest.update({
+            "version": int(version[1:]),
+            "published": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "source": os.path.abspath(source_dir),
+        })
+        write_manifest(staging, manifest)
+        os.rename(staging, os.path.join(self.root, version))
+        return version
+
+
+# -------------------- Canary --------------------
+
+def canary_frame(preprocessor, path=CANARY_PATH, n_rows=CANARY_ROWS):
+    """Training-layout canary readings: the first n_rows of path, or synthetic ones if it doesn't exist."""
+    if path and os.path.exists(path):
+        return pd.read_csv(path, encoding="utf-8-sig", nrows=n_rows, usecols=list(COLUMN_NAMES.values()))
+    return synthetic_frame(preprocessor, n_rows)
+
+
+def canary_check(candidate, current=None, df=None, min_agreement=CANARY_MIN_AGREEMENT):
+    """Score a canary batch with a candidate Cascade and decide whether it may replace ``current``.
+
+    The candidate must take the same input columns as the serving version,
+    return a finite failure probability in [0, 1] for every row and, when
+    there is a serving version, agree with its failure decision on at least
+    ``min_agreement`` of the rows. Returns a report dict with ``passed`` and,
+    if it failed, ``reason``.
+    """
+    if df is None:
+        df = canary_frame(candidate.preprocessor)
+    report = {"version": candidate.version, "rows": len(df), "passed": False}
+    try:
+        warm_up(candidate)
+        if current is not None and list(candidate.preprocessor.feature_names_in_) != list(
+                current.preprocessor.feature_names_in_):
+            report["reason"] = "input columns differ from the serving version"
+            return report
+
+        failure, failure_type, failure_proba, _ = candidate.run(candidate.transform(df), probabilities=True)
+        report["failure_rate"] = float(np.mean(failure != 0))
+        if not np.all(np.isfinite(failure_proba)) or failure_proba.min() < 0 or failure_proba.max() > 1:
+            report["reason"] = "failure probabilities outside [0, 1]"
+            return report
+
+        if current is not None:
+            current_failure, current_type, _, _ = current.run(current.transform(df))
+            report["agreement"] = float(np.mean(failure == current_failure))
+            both = (failure != 0) & (current_failure != 0)
+            if both.any():
+                report["type_agreement"] = float(np.mean(failure_type[both] == current_type[both]))
+            if report["agreement"] < min_agreement:
+                report["reason"] = f"failure decision agrees with {current.version} on " \
+                                   f"{report['agreement']:.1%} of rows (< {min_agreement:.0%})"
+                return report
+    except Exception as e:
+        report["reason"] = f"{type(e).__name__}: {e}"
+        return report
+
+    report["passed"] = True
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=MODEL_REGISTRY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list versions with their manifests")
+    publish = commands.add_parser("publish", help="copy a directory of artifacts in as a new version")
+    publish.add_argument("source_dir")
+    check = commands.add_parser("verify", help="check a version's checksums and run the canary on it")
+    check.add_argument("version")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "list":
+        for version in registry.versions():
+            manifest = registry.manifest(version)
+            print(f"{version}  {manifest.get('created') or manifest.get('published', '')}  "
+                  f"{manifest.get('mode', '')}  rows_seen={manifest.get('rows_seen', '?')}  "
+                  f"trees={manifest.get('trees', '?')}")
+    elif args.command == "publish":
+        print(f"published {registry.publish(args.source_dir)}")
+    else:
+        candidate = registry.load(args.version)
+        print(json.dumps(canary_check(candidate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Reporting resolution of each /predict field; readings are rounded to it to
+# build the cache key, so float noise below the sensor resolution still hits
+RESOLUTION_DIGITS = {
+    "air_temperature_K": 1,       # 0.1 K
+    "process_temperature_K": 1,   # 0.1 K
+    "rotational_speed_rpm": 0,    # 1 rpm
+    "torque_Nm": 1,               # 0.1 Nm
+    "tool_wear_min": 0,           # 1 min
+}
+
+
+class ResultCache:
+    """In-process LRU + TTL cache of full cascade results (binary + failure type).
+
+    Keys are the normalized reading plus the response options. Entries are
+    tagged with the version of the loaded artifacts; when a different
+    version is seen the whole cache is dropped, so a model reload never
+    serves stale results.
+    """
+
+    def __init__(self, max_entries, ttl_seconds=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(record, threshold=None, probabilities=False):
+        values = tuple(
+            round(record[field], digits) if digits else int(round(record[field]))
+            for field, digits in RESOLUTION_DIGITS.items()
+        )
+        return values + (record["type"], threshold, bool(probabilities))
+
+    def check_version(self, version):
+        """Drop every entry if the artifacts changed since they were cached."""
+        if version != self.version:
+            with self._lock:
+                if version != self.version:
+                    if self.version is not None:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self.version = version
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,93 @@
+import threading
+from collections import deque
+
+from config import SHADOW_MAX_PENDING
+
+
+class ShadowScorer:
+    """Score live traffic with a second model version and count how often it disagrees.
+
+    The serving version's results are returned to the client as usual;
+    ``compare`` re-scores the same records with the shadow Cascade (in the
+    caller's worker thread, after the response is ready) and records
+    disagreements on the failure decision and, for rows both flag, on the
+    failure type. When more than ``max_pending`` batches are waiting, new
+    ones are skipped so shadowing never backs up the serving path.
+    """
+
+    def __init__(self, cascade, max_pending=SHADOW_MAX_PENDING, examples=20):
+        self.cascade = cascade
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self.pending = 0
+
+        self.batches = 0
+        self.rows = 0
+        self.skipped_batches = 0
+        self.errors = 0
+        self.failure_disagreements = 0
+        self.both_failed = 0
+        self.type_disagreements = 0
+        # Most recent disagreeing rows: (record, serving result, shadow result)
+        self.examples = deque(maxlen=examples)
+
+    def try_acquire(self):
+        """Reserve a slot for one batch; False means the batch should be skipped."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.skipped_batches += 1
+                return False
+            self.pending += 1
+            return True
+
+    def compare(self, records, results, threshold=None):
+        """Re-score API-layout records and compare with the serving results (call after try_acquire)."""
+        try:
+            if isinstance(records, dict):
+                records = [dict(zip(records, values)) for values in zip(*records.values())]
+            shadow_results = self.cascade.predict(self.cascade.transform_records(records), threshold)
+
+            failure = type_ = both = 0
+            examples = []
+            for record, served, shadowed in zip(records, results, shadow_results):
+                if served["prediction"] != shadowed["prediction"]:
+                    failure += 1
+                    examples.append((record, served, shadowed))
+                elif "failure_type" in served:
+                    both += 1
+                    if served["failure_type"] != shadowed["failure_type"]:
+                        type_ += 1
+                        examples.append((record, served, shadowed))
+
+            with self._lock:
+                self.batches += 1
+                self.rows += len(records)
+                self.failure_disagreements += failure
+                self.both_failed += both
+                self.type_disagreements += type_
+                self.examples.extend(examples)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.cascade.version,
+                "batches": self.batches,
+                "rows": self.rows,
+                "pending_batches": self.pending,
+                "skipped_batches": self.skipped_batches,
+                "errors": self.errors,
+                "failure_disagreements": self.failure_disagreements,
+                "failure_disagreement_rate": self.failure_disagreements / self.rows if self.rows else None,
+                "type_disagreements": self.type_disagreements,
+                "type_disagreement_rate": self.type_disagreements / self.both_failed if self.both_failed else None,
+                "recent_disagreements": [
+                    {"input": record, "serving": served, "shadow": shadowed}
+                    for record, served, shadowed in self.examples
+                ],
+            }
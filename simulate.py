@@ -0,0 +1,400 @@
+"""What-if sweeps and remaining useful life from the serving models.
+
+For a batch of machines, one reading (``Tool wear [min]`` by default) is
+swept over a grid while the other readings stay as they are. For each
+machine the result is:
+- the first grid value at which the cascade flags a failure,
+- the failure probability at that value,
+- the failure type the second model predicts there.
+
+Other readings, such as torque or speed, can be varied as scenarios. Every
+machine is then swept once per combination of scenario values.
+
+The sweep does not score one row per machine and grid point. The split
+thresholds of the failure model are sorted per feature once (SplitIndex),
+and each sweep uses them in two ways:
+- Grid points with no threshold between them take the same branch at every
+  node, so only the first point of each such run is scored.
+- Each tree is walked once per machine. A node on another feature takes the
+  machine's branch as usual. A node on the swept feature splits the grid
+  range still on the path in two at its threshold. The path through the
+  unchanged features is shared by every grid point, not walked again for
+  each one.
+
+Leaf values are summed in tree order as in FlatForest, so the probabilities
+equal ``predict_proba`` on the expanded rows exactly.
+
+    python simulate.py machines.csv [--column "Tool wear [min]"] [--grid 0:250:1]
+        [--scenario "Torque [Nm]=40,50,60"] [--threshold 0.5] [--out rul.csv] [--check]
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from cascade import label_mapping
+from config import DECISION_THRESHOLD
+from dataset import INT_COLS
+from features import FeatureKernel
+from forest import FlatForest
+
+SWEEP_COLUMN = "Tool wear [min]"
+# Points in a default grid, spread over the range the scaler was fitted on
+GRID_POINTS = 256
+# Machines x trees x scored grid points per chunk of machines; bounds the working arrays
+CHUNK_LEAVES = 1 << 24
+
+
+class SplitIndex:
+    """Split nodes of a FlatForest grouped by feature and sorted by threshold."""
+
+    def __init__(self, forest):
+        split = np.flatnonzero(~forest.is_leaf)
+        self.nodes = {}
+        self.thresholds = {}
+        for feature in range(forest.n_features_in_):
+            nodes = split[forest.feature[split] == feature]
+            nodes = nodes[np.argsort(forest.threshold[nodes], kind="stable")]
+            self.nodes[feature] = nodes
+            self.thresholds[feature] = forest.threshold[nodes]
+
+    def regions(self, feature, values):
+        """Number of thresholds on ``feature`` below each value.
+
+        Values with the same count take the same branch at every node on
+        ``feature`` (a row goes right when its value is above the threshold).
+        """
+        return np.searchsorted(self.thresholds[feature], values, side="left")
+
+    def cuts(self, feature, values):
+        """For each node in ``nodes[feature]``, how many of the sorted ``values`` go left."""
+        return np.searchsorted(values, self.thresholds[feature], side="right")
+
+
+def sweep_segments(forest, index, X, features, values):
+    """Leaves reached by every machine and tree along a sweep, as ranges of sweep points.
+
+    ``X`` holds the preprocessed machines and ``values`` the preprocessed
+    sweep points, one row per swept feature in ``features``. Each row of
+    ``values`` must be sorted ascending, and its columns stand in for
+    ``X[:, features]``. Returns (row, tree, lo, hi, leaf) arrays: points
+    ``lo`` to ``hi - 1`` of that row reach ``leaf`` in that tree. The ranges
+    of one row and tree cover every point once.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    values = np.asarray(values, dtype=np.float32)
+    n_rows, n_features = X.shape
+    n_points = values.shape[1]
+
+    # Grid points going left at each node on a swept feature, -1 elsewhere
+    cut = np.full(forest.node_count, -1, dtype=np.intp)
+    for feature, feature_values in zip(features, values):
+        cut[index.nodes[feature]] = index.cuts(feature, feature_values)
+
+    # One active (row, tree, point range) entry per path; a path forks where a node splits its range
+    pair = np.arange(n_rows * forest.n_trees)
+    node = np.tile(forest.roots, n_rows)
+    row_base = np.repeat(np.arange(n_rows) * n_features, forest.n_trees)
+    lo = np.zeros(pair.size, dtype=np.intp)
+    hi = np.full(pair.size, n_points, dtype=np.intp)
+
+    segments = []
+    flat_X = X.ravel()
+    while True:
+        done = forest.is_leaf[node]
+        if done.any():
+            segments.append((pair[done], lo[done], hi[done], forest.leaf_index[node[done]]))
+            keep = ~done
+            pair, node, row_base, lo, hi = pair[keep], node[keep], row_base[keep], lo[keep], hi[keep]
+        if not pair.size:
+            break
+
+        k = cut[node]
+        fixed = k < 0
+        # Other features: the machine's own branch for the whole range
+        walk = node[fixed]
+        go_right = flat_X[row_base[fixed] + forest.feature[walk]] > forest.threshold[walk]
+        node[fixed] = forest.children[2 * walk + go_right]
+
+        split = np.flatnonzero(~fixed)
+        if split.size:
+            # Swept feature: points [lo, k) go left, [k, hi) go right
+            k = k[split]
+            s_pair, s_node, s_base, s_lo, s_hi = pair[split], node[split], row_base[split], lo[split], hi[split]
+            mid_left = np.minimum(s_hi, k)
+            mid_right = np.maximum(s_lo, k)
+            left = s_lo < mid_left
+            right = mid_right < s_hi
+            pair = np.concatenate([pair[fixed], s_pair[left], s_pair[right]])
+            node = np.concatenate([node[fixed], forest.children[2 * s_node[left]],
+                                   forest.children[2 * s_node[right] + 1]])
+            row_base = np.concatenate([row_base[fixed], s_base[left], s_base[right]])
+            lo = np.concatenate([lo[fixed], s_lo[left], mid_right[right]])
+            hi = np.concatenate([hi[fixed], mid_left[left], s_hi[right]])
+
+    pair, lo, hi, leaf = (np.concatenate(parts) for parts in zip(*segments))
+    return pair // forest.n_trees, pair % forest.n_trees, lo, hi, leaf
+
+
+def sweep_proba(forest, index, X, features, values):
+    """``predict_proba`` of every machine at every sweep point, shape (n_rows, n_points, n_classes).
+
+    Points of a row that reach the same leaf in every tree form one piece
+    and are summed once. Each piece is summed over the trees in order, as
+    FlatForest does.
+    """
+    row, tree, lo, hi, leaf = sweep_segments(forest, index, X, features, values)
+    n_rows, n_points = len(X), np.shape(values)[1]
+
+    # Pieces start wherever a segment of the row starts, in any tree
+    stride = n_points + 1
+    starts = np.unique(row * stride + lo)
+    first = np.searchsorted(starts, row * stride + lo)
+    last = np.searchsorted(starts, row * stride + hi)
+
+    # The segments of one tree cover every piece once, so in (tree, first piece) order
+    # they run-length encode the (tree, piece) leaf table
+    order = np.argsort(tree * len(starts) + first, kind="stable")
+    leaves = np.repeat(leaf[order], (last - first)[order]).reshape(forest.n_trees, len(starts))
+    proba = np.zeros((len(starts), forest.n_classes_), dtype=np.float64)
+    for t in range(forest.n_trees):
+        proba += forest.value[leaves[t]]
+    proba /= forest.n_trees
+
+    # Back to one entry per point: each piece runs up to the next start of its row
+    piece_lo = starts % stride
+    piece_hi = np.append(piece_lo[1:], 0)
+    piece_hi[piece_hi == 0] = n_points
+    piece = np.repeat(np.arange(len(starts)), piece_hi - piece_lo)
+    return proba[piece].reshape(n_rows, n_points, forest.n_classes_)
+
+
+def default_grid(kernel, column, points=GRID_POINTS):
+    """``points`` values over the range the scaler was fitted on, whole numbers for integer readings."""
+    low, high = kernel.input_ranges[column]
+    grid = np.linspace(low, high, points)
+    if column in INT_COLS:
+        grid = np.round(grid)
+    return np.unique(grid)
+
+
+def expand_scenarios(machines, scenarios):
+    """One copy of ``machines`` per combination of scenario values (column -> list of values)."""
+    if not scenarios:
+        return machines
+    frames = []
+    for combination in itertools.product(*scenarios.values()):
+        frame = machines.copy()
+        for col, value in zip(scenarios, combination):
+            frame[col] = value
+        frames.append(frame)
+    return pd.concat(frames)
+
+
+class Simulator:
+    """Sweeps readings through a loaded Cascade (see the module docstring).
+
+    The forests are used as FlatForest copies and the preprocessing as a
+    FeatureKernel, which match the cascade's own output exactly. Building
+    one takes a few tens of milliseconds, so keep it with the cascade.
+    """
+
+    def __init__(self, cascade):
+        self.cascade = cascade
+        preprocessor = cascade.kernel or cascade.preprocessor
+        self.kernel = preprocessor if isinstance(preprocessor, FeatureKernel) else FeatureKernel(preprocessor)
+        self.model = cascade.model if isinstance(cascade.model, FlatForest) else FlatForest(cascade.model)
+        self.model2 = cascade.model2 if isinstance(cascade.model2, FlatForest) else FlatForest(cascade.model2)
+        self.index = SplitIndex(self.model)
+        self._failure_class = np.flatnonzero(self.model.classes_ == 1)[0]
+
+    def _swept_values(self, machines, column, grid):
+        # The grid preprocessed like the machines, keeping only the features it changes
+        probe = {col: np.resize(np.asarray(machines[col])[:1], len(grid)) for col in self.kernel.input_columns}
+        probe[column] = grid
+        processed = self.kernel.transform(probe)
+        features = self.kernel.output_columns(column)
+        values = processed[:, features].T
+        if (np.diff(values.astype(np.float32), axis=1) < 0).any():
+            raise ValueError(f"Preprocessing of {column!r} is not increasing; cannot sweep it")
+        return features, values
+
+    def _flagged(self, proba, threshold):
+        if threshold is None:
+            return self.model.classes_.take(np.argmax(proba, axis=-1), axis=0) != 0
+        return proba[..., self._failure_class] >= threshold
+
+    def sweep(self, machines, column=SWEEP_COLUMN, grid=None, scenarios=None, threshold=DECISION_THRESHOLD,
+              from_current=True, curves=False):
+        """First failure along a sweep of ``column``, for every machine and scenario.
+
+        ``machines`` is a training-layout DataFrame. ``grid`` defaults to
+        default_grid. With ``from_current`` only grid values at or above a
+        machine's current reading count, so ``remaining`` is how much more
+        of ``column`` it can take before the cascade flags a failure.
+        ``threshold`` works as in the predict routes (None = the model's own
+        decision).
+
+        Returns one row per machine and scenario, indexed like ``machines``:
+        the scenario values, ``failure_at``, ``remaining``,
+        ``failure_probability`` and ``failure_type`` (NaN / None when no grid
+        value is flagged). With ``curves`` returns (result, grid, failure
+        probability per row and grid value) instead.
+        """
+        if column not in self.kernel.input_ranges:
+            raise ValueError(f"Cannot sweep {column!r}; expected one of {list(self.kernel.input_ranges)}")
+        scenarios = {col: list(values) for col, values in (scenarios or {}).items()}
+        for col in scenarios:
+            if col == column or col not in self.kernel.input_columns:
+                raise ValueError(f"Invalid scenario column {col!r}")
+        grid = default_grid(self.kernel, column) if grid is None else np.unique(np.asarray(grid, dtype=np.float64))
+        if not grid.size or not np.isfinite(grid).all():
+            raise ValueError("The sweep grid must be a non-empty list of finite values")
+        if not len(machines):
+            raise ValueError("No machines to simulate")
+
+        machines = expand_scenarios(machines, scenarios)
+        features, values = self._swept_values(machines, column, grid)
+        X = self.kernel.transform(machines)
+        if not np.isfinite(X).all():
+            raise ValueError("Machine readings contain NaN or infinity")
+        current = np.asarray(machines[column], dtype=np.float64)
+
+        # Score the first grid point of each run that no threshold separates
+        regions = np.stack([self.index.regions(f, v.astype(np.float32)) for f, v in zip(features, values)])
+        change = (np.diff(regions, axis=1) != 0).any(axis=0)
+        scored = np.flatnonzero(np.concatenate([[True], change]))
+        run = np.cumsum(np.concatenate([[0], change]))
+
+        n_rows = len(machines)
+        first = np.zeros(n_rows, dtype=np.intp)
+        found = np.zeros(n_rows, dtype=bool)
+        at_first = np.full(n_rows, np.nan)
+        probability = np.empty((n_rows, len(grid))) if curves else None
+        chunk = max(1, CHUNK_LEAVES // (self.model.n_trees * len(scored)))
+        for start in range(0, n_rows, chunk):
+            rows = slice(start, start + chunk)
+            proba = sweep_proba(self.model, self.index, X[rows], features, values[:, scored])
+            flagged = self._flagged(proba, threshold)[:, run]
+            if from_current:
+                flagged &= grid >= current[rows, None]
+            first[rows] = np.argmax(flagged, axis=1)
+            found[rows] = flagged.any(axis=1)
+            failure_proba = proba[:, run, self._failure_class]
+            at_first[rows] = failure_proba[np.arange(len(failure_proba)), first[rows]]
+            if curves:
+                probability[rows] = failure_proba
+
+        result = machines[list(scenarios)].copy()
+        result["failure_at"] = np.where(found, grid[first], np.nan)
+        result["remaining"] = result["failure_at"] - current
+        result["failure_probability"] = np.where(found, at_first, np.nan)
+        result["failure_type"] = None
+
+        # Failure type at each crossing: one row per flagged machine through the second model
+        hit = np.flatnonzero(found)
+        if hit.size:
+            crossing = X[hit].copy()
+            crossing[:, features] = values[:, first[hit]].T
+            types = self.model2.predict(crossing)
+            result.iloc[hit, result.columns.get_loc("failure_type")] = [
+                label_mapping.get(code, "Unknown Failure Type") for code in types
+            ]
+
+        if curves:
+            return result, grid, probability
+        return result
+
+
+def expanded_sweep(cascade, machines, column, grid, threshold=DECISION_THRESHOLD, from_current=True):
+    """The same sweep by running the cascade over every expanded row (for --check).
+
+    Returns (failure_at, failure_type, failure probability per row and grid value).
+    """
+    expanded = machines.iloc[np.repeat(np.arange(len(machines)), len(grid))].copy()
+    expanded[column] = np.tile(grid, len(machines))
+    failure, failure_type, failure_proba, _ = cascade.run(cascade.transform(expanded), threshold, probabilities=True)
+
+    shape = (len(machines), len(grid))
+    flagged = (failure != 0).reshape(shape)
+    if from_current:
+        flagged &= grid >= np.asarray(machines[column], dtype=np.float64)[:, None]
+    first = np.argmax(flagged, axis=1)
+    found = flagged.any(axis=1)
+    crossing = np.arange(len(machines)) * len(grid) + first
+    failure_at = np.where(found, grid[first], np.nan)
+    types = [label_mapping.get(code, "Unknown Failure Type") if hit else None
+             for code, hit in zip(failure_type[crossing], found)]
+    return failure_at, types, failure_proba.reshape(shape)
+
+
+def parse_grid(text):
+    """"start:stop:step" (stop included) or a comma-separated list."""
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        return np.arange(start, stop + step / 2, step)
+    return np.array([float(part) for part in text.split(",")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("machines", help="CSV of current readings in the data.csv layout, one row per machine")
+    parser.add_argument("--column", default=SWEEP_COLUMN, help="reading to sweep")
+    parser.add_argument("--grid", help='"start:stop:step" or comma-separated values (default: the fitted range)')
+    parser.add_argument("--scenario", action="append", default=[], metavar="COLUMN=V1,V2",
+                        help="also vary another reading; may be repeated")
+    parser.add_argument("--threshold", type=float, default=DECISION_THRESHOLD)
+    parser.add_argument("--all", action="store_true", help="search the whole grid, not just from current readings")
+    parser.add_argument("--out", help="write the results as CSV")
+    parser.add_argument("--check", action="store_true", help="compare with scoring every expanded row")
+    args = parser.parse_args()
+
+    from artifacts import load_cascade
+
+    machines = pd.read_csv(args.machines)
+    scenarios = {}
+    for item in args.scenario:
+        col, _, values = item.partition("=")
+        scenarios[col] = [float(value) for value in values.split(",")]
+
+    start = time.perf_counter()
+    simulator = Simulator(load_cascade())
+    load_seconds = time.perf_counter() - start
+
+    grid = parse_grid(args.grid) if args.grid else None
+    start = time.perf_counter()
+    result, grid, probability = simulator.sweep(
+        machines, args.column, grid, scenarios, args.threshold, not args.all, curves=True
+    )
+    seconds = time.perf_counter() - start
+
+    flagged = result["failure_at"].notna()
+    print(f"{len(result):,} machines x {len(grid):,} values of {args.column} in {seconds:.2f} s "
+          f"(models loaded in {load_seconds:.2f} s)")
+    print(f"  {flagged.sum():,} reach a failure; median remaining {result.loc[flagged, 'remaining'].median():.1f}")
+    for label, count in result["failure_type"].value_counts().items():
+        print(f"  {label:<26}{count:>8,}")
+
+    if args.check:
+        start = time.perf_counter()
+        failure_at, failure_type, expected = expanded_sweep(
+            simulator.cascade, expand_scenarios(machines, scenarios), args.column, grid, args.threshold, not args.all
+        )
+        seconds = time.perf_counter() - start
+        if not np.array_equal(expected, probability):
+            raise AssertionError("Sweep probabilities differ from predict_proba on the expanded rows")
+        if not np.array_equal(failure_at, result["failure_at"].to_numpy(), equal_nan=True):
+            raise AssertionError("Sweep failure points differ from the cascade on the expanded rows")
+        if failure_type != result["failure_type"].tolist():
+            raise AssertionError("Sweep failure types differ from the cascade on the expanded rows")
+        print(f"  matches the cascade on {expected.size:,} expanded rows ({seconds:.2f} s)")
+
+    if args.out:
+        result.to_csv(args.out)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
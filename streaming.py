@@ -0,0 +1,219 @@
+import io
+import json
+import queue
+import threading
+
+import pandas as pd
+
+from cascade import COLUMN_NAMES, FIELD_NAMES
+from config import STREAM_CHUNK_ROWS as CHUNK_ROWS
+
+# Identifier columns copied from the input into the results, when present
+ID_COLUMNS = ["UDI", "Product ID"]
+
+_DONE = object()
+
+
+def read_chunks(stream, input_format="csv", chunk_rows=CHUNK_ROWS):
+    """Parse a binary stream (data.csv layout CSV, or NDJSON) into DataFrames of at most chunk_rows rows.
+
+    NDJSON objects may use either the data.csv column names or the /predict
+    field names.
+    """
+    if input_format == "csv":
+        reader = pd.read_csv(stream, chunksize=chunk_rows, encoding="utf-8-sig")
+    elif input_format == "ndjson":
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+        reader = pd.read_json(text, lines=True, chunksize=chunk_rows, dtype=False, convert_dates=False)
+    else:
+        raise ValueError(f"Unsupported input format: {input_format!r}")
+
+    for chunk in reader:
+        yield chunk.rename(columns=COLUMN_NAMES)
+
+
+def prefetch(iterable, depth=1):
+    """Iterate in a background thread, keeping up to ``depth`` items ready.
+
+    Lets parsing of the next chunk overlap with inference on the current one.
+    Exceptions from the producer are re-raised in the consumer; closing the
+    consumer early stops the producer.
+    """
+    ready = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+            return
+        put((_DONE, None))
+
+    worker = threading.Thread(target=produce, name="prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = ready.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def machine_features(machines, chunk):
+    """Feed a chunk into per-machine windows (keyed by Product ID) and return its rolling features."""
+    columns = {FIELD_NAMES[col]: chunk[col].to_numpy() for col in FIELD_NAMES}
+    timestamps = chunk["timestamp"].to_numpy() if "timestamp" in chunk.columns else None
+    return pd.DataFrame(machines.update(chunk["Product ID"].to_numpy(), columns, timestamps))
+
+
+def score_chunks(cascade, chunks, threshold=None, probabilities=False, machines=None):
+    """Push each parsed chunk through the preprocessor and both models; yield result tables.
+
+    With ``machines`` (a telemetry.MachineStates), rows that carry a
+    Product ID also update that machine's rolling window, and the window
+    features are added to the results.
+    """
+    for chunk in prefetch(chunks):
+        ids = chunk[[col for col in ID_COLUMNS if col in chunk.columns]].reset_index(drop=True)
+        results = cascade.predict_table(chunk, threshold, probabilities)
+        tables = [ids, results]
+        if machines is not None and "Product ID" in chunk.columns:
+            tables.append(machine_features(machines, chunk))
+        yield pd.concat(tables, axis=1)
+
+
+def encode_tables(tables, output_format="ndjson"):
+    """Serialize result tables as they are produced, as bytes."""
+    first = True
+    for table in tables:
+        if output_format == "csv":
+            text = table.to_csv(index=False, header=first, lineterminator="\n")
+        else:
+            text = table.to_json(orient="records", lines=True)
+            if text and not text.endswith("\n"):
+                text += "\n"
+        first = False
+        yield text.encode("utf-8")
+
+
+def score_stream(cascade, stream, input_format="csv", output_format="ndjson",
+                 chunk_rows=CHUNK_ROWS, threshold=None, probabilities=False, machines=None):
+    """Bytes in, bytes out: parse, score and serialize a stream chunk by chunk.
+
+    Errors after output has started are reported as a final {"error": ...} line.
+    """
+    chunks = read_chunks(stream, input_format, chunk_rows)
+    try:
+        tables = score_chunks(cascade, chunks, threshold, probabilities, machines)
+        yield from encode_tables(tables, output_format)
+    except Exception as e:
+        yield (json.dumps({"error": str(e)}) + "\n").encode("utf-8")
+
+
+class QueueReader(io.RawIOBase):
+    """Readable byte stream fed from another thread (or the event loop) through a bounded queue.
+
+    ``feed`` blocks while the queue is full, so a fast producer is held back
+    by the consumer; ``feed(None)`` marks end of input and ``fail`` an
+    aborted one. Reads poll the queue, so a reader never waits forever on
+    a producer that has gone away.
+    """
+
+    def __init__(self, max_pending=8):
+        super().__init__()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._abandoned = threading.Event()
+        self._data = memoryview(b"")
+        self._eof = False
+        self._error = None
+
+    def readable(self):
+        return True
+
+    def feed(self, data):
+        while not self._abandoned.is_set():
+            try:
+                self._queue.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def abandon(self):
+        """Called by the consumer when it stops reading; unblocks the producer."""
+        self._abandoned.set()
+
+    def fail(self, error):
+        """Called by the producer when input stops early; reads raise ``error`` once the queue is drained."""
+        self._error = error
+
+    def readinto(self, buffer):
+        while not self._data and not self._eof:
+            try:
+                data = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._error is not None:
+                    raise self._error
+                if self._abandoned.is_set():
+                    self._eof = True
+                continue
+            if data is None:
+                self._eof = True
+            else:
+                self._data = memoryview(data)
+        n = min(len(buffer), len(self._data))
+        buffer[:n] = self._data[:n]
+        self._data = self._data[n:]
+        return n
+
+
+def main():
+    import argparse
+    import sys
+    import warnings
+
+    from artifacts import load_cascade
+    from telemetry import MachineStates
+
+    parser = argparse.ArgumentParser(description="Score a data.csv-layout CSV or NDJSON file in bounded-size chunks.")
+    parser.add_argument("input", help="input file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout (default)")
+    parser.add_argument("--input-format", choices=["csv", "ndjson"], help="default: from the input file extension")
+    parser.add_argument("--output-format", choices=["csv", "ndjson"], default="ndjson")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--probabilities", action="store_true")
+    parser.add_argument("--machine-features", action="store_true",
+                        help="add rolling per-machine features (rows keyed by Product ID, in time order)")
+    args = parser.parse_args()
+
+    input_format = args.input_format or ("csv" if args.input.lower().endswith(".csv") else "ndjson")
+    warnings.simplefilter("ignore", FutureWarning)
+    cascade = load_cascade()
+    machines = MachineStates() if args.machine_features else None
+
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    dst = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    with src, dst:
+        for data in score_stream(cascade, src, input_format, args.output_format,
+                                 args.chunk_rows, args.threshold, args.probabilities, machines):
+            dst.write(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import threading
+
+import numpy as np
+
+from config import MACHINE_CAPACITY, MACHINE_WINDOW
+
+# Failure-mode physics (see the Failure Modes table on the Home page)
+HDF_MAX_TEMP_DELTA_K = 8.6            # heat dissipation: process - air temperature below this...
+HDF_MAX_SPEED_RPM = 1380              # ...and rotational speed below this
+PWF_MIN_POWER_W = 3500                # power failure: torque x speed (rad/s) outside this band
+PWF_MAX_POWER_W = 9000
+OSF_STRAIN_LIMIT = {"L": 11000, "M": 12000, "H": 13000}   # overstrain: tool wear x torque [min Nm]
+TWF_MIN_WEAR_MIN = 200                # tool wear failures happen between 200 and 240 min
+
+RPM_TO_RAD_S = 2 * np.pi / 60
+
+# Per-reading signals kept in each machine's window: the raw readings plus
+# the physics quantities the failure modes are defined on
+ROLLING_SIGNALS = [
+    "air_temperature_K",
+    "process_temperature_K",
+    "rotational_speed_rpm",
+    "torque_Nm",
+    "tool_wear_min",
+    "temp_delta_K",
+    "power_W",
+    "strain_minNm",
+]
+
+# Machine time is rebased once it runs this far past a machine's origin, so
+# the running time sums stay small enough for exact slopes
+REBASE_AFTER = 2.0 ** 16
+
+
+def physics_features(columns):
+    """Instantaneous failure-mode quantities and rule flags for a block of API-layout columns."""
+    air = np.asarray(columns["air_temperature_K"], dtype=np.float64)
+    process = np.asarray(columns["process_temperature_K"], dtype=np.float64)
+    speed = np.asarray(columns["rotational_speed_rpm"], dtype=np.float64)
+    torque = np.asarray(columns["torque_Nm"], dtype=np.float64)
+    wear = np.asarray(columns["tool_wear_min"], dtype=np.float64)
+    types = np.asarray(columns["type"])
+    limit = np.full(len(types), np.nan)
+    for quality, strain_limit in OSF_STRAIN_LIMIT.items():
+        limit[types == quality] = strain_limit
+
+    temp_delta = process - air
+    power = torque * speed * RPM_TO_RAD_S
+    strain = wear * torque
+    return {
+        "temp_delta_K": temp_delta,
+        "power_W": power,
+        "strain_minNm": strain,
+        "strain_ratio": strain / limit,
+        "hdf_risk": (temp_delta < HDF_MAX_TEMP_DELTA_K) & (speed < HDF_MAX_SPEED_RPM),
+        "pwf_risk": (power < PWF_MIN_POWER_W) | (power > PWF_MAX_POWER_W),
+        "osf_risk": strain > limit,
+        "twf_risk": wear >= TWF_MIN_WEAR_MIN,
+    }
+
+
+def rolling_feature_names():
+    return [f"{signal}_{stat}" for signal in ROLLING_SIGNALS for stat in ("mean", "std", "slope")] + ["window_size"]
+
+
+class MachineStates:
+    """Rolling per-machine windows over a telemetry stream, keyed by machine ID (data.csv ``Product ID``).
+
+    Every machine owns one row of a preallocated float32 ring buffer of its
+    last ``window`` readings. Count, sum, sum of squares and the time sums
+    for a least-squares slope are kept in float64 and updated with the
+    incoming value minus the value it overwrites, so an update is O(1)
+    whatever the window length; mean, std and slope per signal are read off
+    the sums. Sums are recomputed from the buffer whenever a machine's time
+    base is shifted, which also stops rounding drift from accumulating.
+
+    Time is the reading's timestamp when given (slopes are then per time
+    unit, e.g. tool wear rate per second), otherwise the machine's reading
+    count (slopes per reading). ``update`` is vectorized over a whole
+    block: readings for the same machine within a block are applied in
+    input order, in as many passes as the most repeated machine.
+    """
+
+    def __init__(self, window=MACHINE_WINDOW, capacity=MACHINE_CAPACITY):
+        self.window = window
+        self.slots = {}   # machine id -> row in the arrays below
+        self._lock = threading.Lock()
+        self._capacity = 0
+        self._grow(max(capacity, 1))
+
+    def _grow(self, capacity):
+        k = len(ROLLING_SIGNALS)
+        n = self._capacity
+
+        def array(name, shape, dtype, fill=0):
+            a = np.full((capacity,) + shape, fill, dtype=dtype)
+            if n:
+                a[:n] = getattr(self, name)
+            setattr(self, name, a)
+
+        array("values", (self.window, k), np.float32)   # ring buffer of signals
+        array("times", (self.window,), np.float64)      # ring buffer of time since origin
+        array("head", (), np.int32)                     # next position to write
+        array("count", (), np.int32)                    # readings in the window
+        array("seq", (), np.int64)                      # readings ever seen
+        array("origin", (), np.float64, np.nan)         # time base
+        array("sum_x", (k,), np.float64)
+        array("sum_xx", (k,), np.float64)
+        array("sum_tx", (k,), np.float64)
+        array("sum_t", (), np.float64)
+        array("sum_tt", (), np.float64)
+        self._capacity = capacity
+
+    def _slots_for(self, machine_ids):
+        slots = list(map(self.slots.get, machine_ids))
+        if None in slots:
+            for i, slot in enumerate(slots):
+                if slot is None:
+                    slots[i] = self.slots.setdefault(machine_ids[i], len(self.slots))
+            if len(self.slots) > self._capacity:
+                self._grow(max(2 * self._capacity, len(self.slots)))
+        return np.array(slots, dtype=np.int64)
+
+    def update(self, machine_ids, columns, timestamps=None):
+        """Push a block of readings and return each reading's rolling features.
+
+        ``columns`` holds the API-layout fields (see physics_features);
+        ``timestamps`` is optional, NaN entries fall back to reading count.
+        Returns a dict of feature name -> array, one entry per input reading,
+        describing the machine's window right after that reading.
+        """
+        physics = physics_features(columns)
+        signals = np.column_stack([
+            physics[name] if name in physics else np.asarray(columns[name], dtype=np.float64)
+            for name in ROLLING_SIGNALS
+        ]).astype(np.float32)
+        n_rows = len(signals)
+        out = np.empty((n_rows, 3 * len(ROLLING_SIGNALS) + 1))
+
+        with self._lock:
+            slots = self._slots_for(list(machine_ids))
+            times = np.full(n_rows, np.nan) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+
+            # Occurrence rank of each reading within its machine: pass r applies
+            # every machine's r-th reading, so a pass never touches a slot twice
+            order = np.argsort(slots, kind="stable")
+            sorted_slots = slots[order]
+            starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+            rank = np.empty(n_rows, dtype=np.int64)
+            rank[order] = np.arange(n_rows) - np.repeat(starts, np.diff(np.r_[starts, n_rows]))
+
+            passes = int(rank.max()) + 1 if n_rows else 0
+            for r in range(passes):
+                rows = np.arange(n_rows) if passes == 1 else np.flatnonzero(rank == r)
+                self._push(slots[rows], signals[rows], times[rows])
+                out[rows] = self._features(slots[rows])
+
+        names = rolling_feature_names()
+        features = {name: out[:, j] for j, name in enumerate(names)}
+        features["window_size"] = features["window_size"].astype(np.int64)
+        features.update(physics)
+        return features
+
+    def _push(self, s, x, t):
+        seq = self.seq[s]
+        t = np.where(np.isnan(t), seq, t)
+        self.seq[s] = seq + 1
+
+        first = np.isnan(self.origin[s])
+        self.origin[s[first]] = t[first]
+        rel = t - self.origin[s]
+
+        pos = self.head[s]
+        full = (self.count[s] == self.window).astype(np.float64)
+        old_x = self.values[s, pos].astype(np.float64) * full[:, None]
+        old_t = self.times[s, pos] * full
+        new_x = x.astype(np.float64)
+
+        self.sum_x[s] += new_x - old_x
+        self.sum_xx[s] += new_x * new_x - old_x * old_x
+        self.sum_tx[s] += rel[:, None] * new_x - old_t[:, None] * old_x
+        self.sum_t[s] += rel - old_t
+        self.sum_tt[s] += rel * rel - old_t * old_t
+
+        self.values[s, pos] = x
+        self.times[s, pos] = rel
+        self.head[s] = (pos + 1) % self.window
+        self.count[s] = np.minimum(self.count[s] + 1, self.window)
+
+        stale = s[rel > REBASE_AFTER]
+        if stale.size:
+            self._rebase(stale)
+
+    def _rebase(self, s):
+        """Move the time origin of machines ``s`` to their latest reading and recompute their sums."""
+        latest = self.times[s, (self.head[s] - 1) % self.window]
+        self.origin[s] += latest
+        self.times[s] -= latest[:, None]
+
+        valid = (np.arange(self.window) < self.count[s][:, None]).astype(np.float64)
+        t = self.times[s] * valid
+        x = self.values[s].astype(np.float64) * valid[:, :, None]
+        self.sum_x[s] = x.sum(axis=1)
+        self.sum_xx[s] = (x * x).sum(axis=1)
+        self.sum_tx[s] = (t[:, :, None] * x).sum(axis=1)
+        self.sum_t[s] = t.sum(axis=1)
+        self.sum_tt[s] = (t * t).sum(axis=1)
+
+    def _features(self, s):
+        n = self.count[s].astype(np.float64)
+        sum_x, sum_t = self.sum_x[s], self.sum_t[s]
+        mean = sum_x / n[:, None]
+        std = np.sqrt(np.maximum(self.sum_xx[s] / n[:, None] - mean * mean, 0.0))
+
+        denominator = n * self.sum_tt[s] - sum_t * sum_t
+        numerator = n[:, None] * self.sum_tx[s] - sum_t[:, None] * sum_x
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(denominator[:, None] > 0, numerator / denominator[:, None], 0.0)
+
+        return np.column_stack([np.stack([mean, std, slope], axis=2).reshape(len(s), -1), n])
+
+    def snapshot(self, machine_id):
+        """Current rolling features of one machine, or None if it has never been seen."""
+        with self._lock:
+            slot = self.slots.get(machine_id)
+            if slot is None:
+                return None
+            row = self._features(np.array([slot]))[0]
+        features = dict(zip(rolling_feature_names(), row.tolist()))
+        features["window_size"] = int(features["window_size"])
+        return features
+
+    def __len__(self):
+        return len(self.slots)
+
+    def stats(self):
+        return {
+            "machines": len(self.slots),
+            "capacity": self._capacity,
+            "window": self.window,
+            "signals": len(ROLLING_SIGNALS),
+            "buffer_bytes": sum(a.nbytes for a in (
+                self.values, self.times, self.head, self.count, self.seq, self.origin,
+                self.sum_x, self.sum_xx, self.sum_tx, self.sum_t, self.sum_tt,
+            )),
+        }
@@ -0,0 +1,30 @@
+"""FeatureKernel against the fitted preprocessing ColumnTransformer.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import pandas as pd
+import pytest
+
+from artifacts import load_preprocessor
+from features import FeatureKernel, verify_parity
+
+CSV_PATH = "data.csv"
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return load_preprocessor()
+
+
+def test_kernel_matches_preprocessor_on_data_csv(preprocessor):
+    # Block and single-row transforms, every row, bit for bit
+    assert verify_parity(preprocessor, CSV_PATH) == len(pd.read_csv(CSV_PATH))
+
+
+def test_from_params_matches_kernel(preprocessor):
+    df = pd.read_csv(CSV_PATH)
+    kernel = FeatureKernel(preprocessor)
+    rebuilt = FeatureKernel.from_params(kernel.params())
+    assert rebuilt.transform(df).tobytes() == kernel.transform(df).tobytes()
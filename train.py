@@ -0,0 +1,435 @@
+"""Rebuild preprocessing.joblib, model_failure.joblib and failure_type.joblib from data.csv.
+
+Reproduces notebooks/final.ipynb with fixed seeds, so the same data always
+gives the same artifacts, with one fix: the preprocessing pipeline is fitted
+once, on the binary model's training split, and the failure-type model is
+trained on that same scaling instead of a refit one, matching how the API
+serves both models through a single preprocessor.
+
+    python train.py [--data data.csv] [--out-dir .] [--max-samples 0.1]
+
+Incremental mode grows the forests of an existing model with trees fitted on
+a file of newly labelled readings only, and writes a new version under
+models/ (see train_incremental):
+
+    python train.py --incremental new_readings.csv [--base-dir .] [--new-trees 20]
+
+Resampling needs imbalanced-learn (``pip install imbalanced-learn``), which
+is only required for training, not for serving.
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import FunctionTransformer, MinMaxScaler
+
+import dataset
+from artifacts import MODEL2_PATH, MODEL_PATH, PREPROCESSOR_PATH, kelvin_to_celsius, load_artifacts, ordinal_encoding
+from config import MODEL_REGISTRY_DIR
+from eda_data import FAILURE_FLAGS, NO_FAILURE, NUM_COLS, failure_types
+from packed import PACKED_PATH, export_packed
+from registry import ModelRegistry, write_manifest
+
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+
+CELSIUS_COLS = ["Air temperature [K]", "Process temperature [K]"]
+CATEGORICAL_COLS = ["Type"]
+FEATURE_COLS = CATEGORICAL_COLS + NUM_COLS
+
+# failure_type codes: the notebook's LabelEncoder sorts the labels (HDF=0,
+# OSF=1, PWF=2, RNF=3, TWF=4, no failure=5), and cascade.label_mapping names
+# the codes in that order
+FAILURE_TYPE_LABELS = sorted(FAILURE_FLAGS + [NO_FAILURE])
+
+# Incremental retraining: state saved next to the artifacts, historical rows
+# kept per reservoir group, and where new versions are written
+STATE_PATH = "training_state.joblib"
+RESERVOIR_PER_GROUP = 2000
+NEW_TREES = 20
+VERSIONS_DIR = MODEL_REGISTRY_DIR
+
+
+@contextmanager
+def stage(name, timings):
+    """Time one training stage and print it as it finishes."""
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+    print(f"{name:<28}{timings[name]:9.2f} s", flush=True)
+
+
+def build_preprocessing():
+    return ColumnTransformer(
+        transformers=[
+            ("kelvin_to_celsius", FunctionTransformer(kelvin_to_celsius), CELSIUS_COLS),
+            ("ordinal_encoding", FunctionTransformer(ordinal_encoding), CATEGORICAL_COLS),
+            ("scaler", MinMaxScaler(), NUM_COLS),
+        ],
+        remainder="passthrough",
+    )
+
+
+def load_training_data(path):
+    """Features, binary target and failure-type codes, with labels derived column-wise.
+
+    Read through the columnar copy of the file (see dataset.py), with the
+    same float64 / int64 values pd.read_csv gives, so artifacts don't change.
+    """
+    df = dataset.load(path, FEATURE_COLS + ["Machine failure"] + FAILURE_FLAGS, wide=True)
+    # The pickled preprocessing maps Type with DataFrame.replace, which expects strings
+    df["Type"] = df["Type"].astype(object)
+    labels = pd.Categorical(failure_types(df), categories=FAILURE_TYPE_LABELS)
+    return df[FEATURE_COLS], df["Machine failure"], pd.Series(labels.codes.astype(np.int64), index=df.index)
+
+
+def split_rows(y, y_type):
+    """Row positions of the train and test splits of both models: (train, test, train2, test2).
+
+    The failure-type split is drawn from the failed rows only, stratified by
+    failure type. evaluate.py scores the same test rows.
+    """
+    rows = np.arange(len(y))
+    train_rows, test_rows = train_test_split(rows, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    failed = rows[np.asarray(y) == 1]
+    train_rows2, test_rows2 = train_test_split(
+        failed, stratify=np.asarray(y_type)[failed], test_size=TEST_SIZE, random_state=RANDOM_STATE
+    )
+    return train_rows, test_rows, train_rows2, test_rows2
+
+
+def resample(X, y, n_jobs=-1):
+    """SMOTETomek as in the notebook (same defaults and seed), with neighbour searches on n_jobs cores."""
+    try:
+        from imblearn.combine import SMOTETomek
+        from imblearn.over_sampling import SMOTE
+        from imblearn.under_sampling import TomekLinks
+    except ImportError as e:
+        raise ImportError("Resampling needs imbalanced-learn: pip install imbalanced-learn (or pass --no-resample)") from e
+    from sklearn.neighbors import NearestNeighbors
+
+    smote_tomek = SMOTETomek(
+        random_state=RANDOM_STATE,
+        smote=SMOTE(random_state=RANDOM_STATE, k_neighbors=NearestNeighbors(n_neighbors=6, n_jobs=n_jobs)),
+        tomek=TomekLinks(sampling_strategy="all", n_jobs=n_jobs),
+    )
+    return smote_tomek.fit_resample(X, y)
+
+
+def build_forest(n_jobs=-1, max_samples=None):
+    return RandomForestClassifier(
+        random_state=RANDOM_STATE, class_weight="balanced", n_jobs=n_jobs, max_samples=max_samples
+    )
+
+
+def train(data_path="data.csv", out_dir=".", n_jobs=-1, max_samples=None, resampling=True):
+    """Fit and save all three artifacts; returns the per-stage timings in seconds."""
+    timings = {}
+
+    with stage("load + labels", timings):
+        X, y, y_type = load_training_data(data_path)
+    print(f"  {len(X):,} rows, {int(y.sum()):,} failures")
+
+    with stage("split", timings):
+        train_rows, test_rows, train_rows2, test_rows2 = split_rows(y, y_type)
+        X_train, X_test, y_train, y_test = X.iloc[train_rows], X.iloc[test_rows], y.iloc[train_rows], y.iloc[test_rows]
+        X_train2, X_test2 = X.iloc[train_rows2], X.iloc[test_rows2]
+        y_train2, y_test2 = y_type.iloc[train_rows2], y_type.iloc[test_rows2]
+
+    with stage("preprocess", timings):
+        preprocessing = build_preprocessing()
+        X_train_preprocessed = preprocessing.fit_transform(X_train)
+        X_test_preprocessed = preprocessing.transform(X_test)
+        # Same fitted pipeline for the failure-type model: no refit
+        X_train2_preprocessed = preprocessing.transform(X_train2)
+        X_test2_preprocessed = preprocessing.transform(X_test2)
+
+    if resampling:
+        with stage("resample (SMOTETomek)", timings):
+            X_train_preprocessed, y_train = resample(X_train_preprocessed, y_train, n_jobs)
+        print(f"  {len(X_train_preprocessed):,} rows after resampling")
+
+    with stage("fit failure model", timings):
+        model = build_forest(n_jobs, max_samples).fit(X_train_preprocessed, y_train)
+
+    with stage("fit failure-type model", timings):
+        model2 = build_forest(n_jobs, max_samples).fit(X_train2_preprocessed, y_train2)
+
+    with stage("evaluate", timings):
+        failure_pred = model.predict(X_test_preprocessed)
+        type_pred = model2.predict(X_test2_preprocessed)
+    print(f"  failure:      accuracy {accuracy_score(y_test, failure_pred):.4f}  "
+          f"F1 {f1_score(y_test, failure_pred):.4f}")
+    print(f"  failure type: accuracy {accuracy_score(y_test2, type_pred):.4f}  "
+          f"macro F1 {f1_score(y_test2, type_pred, average='macro'):.4f}")
+
+    with stage("reservoir", timings):
+        state = new_state()
+        update_reservoir(state, X, y, y_type)
+
+    with stage("save", timings):
+        save_version(out_dir, preprocessing, model, model2, state, {
+            "mode": "full", "data": data_path, "rows": len(X), "timings": timings,
+        })
+
+    print(f"{'total':<28}{sum(timings.values()):9.2f} s")
+    return timings
+
+
+def save_version(out_dir, preprocessing, model, model2, state, info):
+    """Write the three artifacts, their packed copy, the incremental state and a manifest.json describing them."""
+    os.makedirs(out_dir, exist_ok=True)
+    joblib.dump(preprocessing, os.path.join(out_dir, os.path.basename(PREPROCESSOR_PATH)))
+    joblib.dump(model, os.path.join(out_dir, os.path.basename(MODEL_PATH)))
+    joblib.dump(model2, os.path.join(out_dir, os.path.basename(MODEL2_PATH)))
+    joblib.dump(state, os.path.join(out_dir, STATE_PATH))
+    export_packed(preprocessing, model, model2, os.path.join(out_dir, PACKED_PATH))
+    # Written last and with checksums, so the registry sees a complete version
+    write_manifest(out_dir, {
+        "version": state["version"],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "rows_seen": state["rows_seen"],
+        "trees": {"failure": len(model.estimators_), "failure_type": len(model2.estimators_)},
+        **info,
+    })
+
+
+# -------------------- Incremental retraining --------------------
+# New trees are fitted on the new readings plus a bounded reservoir of history
+# and appended to the existing forests (warm_start), so a retrain costs time
+# in proportion to the new data, not to everything seen so far.
+
+def new_state():
+    return {
+        "version": 1,
+        "rows_seen": 0,
+        "seen": {},        # reservoir group -> rows seen in that group
+        "reservoir": {},   # reservoir group -> DataFrame of at most RESERVOIR_PER_GROUP rows
+    }
+
+
+def reservoir_groups(y, y_type):
+    """Reservoir group of each row: its failure-type code if it failed, -1 otherwise.
+
+    One reservoir per group keeps every failure type represented however rare.
+    """
+    return np.where(y.to_numpy() == 1, y_type.to_numpy(), -1)
+
+
+def reservoir_rows(state):
+    """The historical sample as (X, y, y_type)."""
+    if not state["reservoir"]:
+        return pd.DataFrame(columns=FEATURE_COLS), pd.Series(dtype=np.int64), pd.Series(dtype=np.int64)
+    rows = pd.concat(state["reservoir"].values(), ignore_index=True)
+    return rows[FEATURE_COLS], rows["Machine failure"], rows["failure_type"]
+
+
+def update_reservoir(state, X, y, y_type, size=RESERVOIR_PER_GROUP):
+    """Fold new rows into the per-group uniform samples of every row seen so far (Algorithm R)."""
+    rng = np.random.default_rng([RANDOM_STATE, state["version"], state["rows_seen"]])
+    rows = pd.concat([X, y.rename("Machine failure"), y_type.rename("failure_type")], axis=1).reset_index(drop=True)
+    groups = reservoir_groups(y, y_type)
+    for group in np.unique(groups):
+        new = rows[groups == group].reset_index(drop=True)
+        kept = state["reservoir"].get(group, new.iloc[:0])
+        seen = state["seen"].get(group, 0)
+
+        # The i-th new row is row number seen + i of the group: it fills a free
+        # slot, or replaces a random slot with probability size / (seen + i + 1)
+        position = seen + np.arange(len(new))
+        fill = position < size
+        slot = rng.integers(0, position + 1)
+        kept = pd.concat([kept, new[fill]], ignore_index=True)
+        replace = np.flatnonzero(~fill & (slot < size))
+        if replace.size:
+            # Later rows win when they land on the same slot
+            last = len(replace) - 1 - np.unique(slot[replace][::-1], return_index=True)[1]
+            pick = np.arange(len(kept))
+            pick[slot[replace[last]]] = len(kept) + replace[last]
+            kept = pd.concat([kept, new], ignore_index=True).iloc[pick].reset_index(drop=True)
+
+        state["reservoir"][group] = kept
+        state["seen"][group] = seen + len(new)
+    state["rows_seen"] += len(rows)
+
+
+def scaler_outputs(preprocessing):
+    """Output column index of each MinMaxScaler input column in the transformed matrix."""
+    outputs, out = {}, 0
+    for name, trans, cols in preprocessing.transformers_:
+        if isinstance(trans, str) and trans == "drop" or not len(cols):
+            continue
+        if isinstance(trans, MinMaxScaler):
+            outputs.update({col: out + k for k, col in enumerate(cols)})
+        out += len(cols)
+    return outputs
+
+
+def update_scaler(preprocessing, forests, X_new):
+    """Widen the MinMaxScaler bounds with a new batch (streaming min/max) and report the drift.
+
+    The scaler is affine per column, so the split thresholds of every
+    existing tree on a scaled column are mapped through the old -> new
+    scaling and old trees keep making the same decisions on the new
+    features, up to float32 rounding: trees compare float32 features, so a
+    reading within one float32 step of a threshold can go the other way
+    in a single tree (predicted classes on data.csv are unchanged). Returns, per column, the old,
+    batch and new ranges and the share of new readings outside the old
+    range.
+    """
+    scaler = preprocessing.named_transformers_["scaler"]
+    cols = list(scaler.feature_names_in_)
+    old_min, old_max = scaler.data_min_.copy(), scaler.data_max_.copy()
+    old_scale, old_offset = scaler.scale_.copy(), scaler.min_.copy()
+    batch = X_new[cols].to_numpy(dtype=np.float64)
+
+    scaler.partial_fit(X_new[cols])
+
+    outputs = scaler_outputs(preprocessing)
+    for k, col in enumerate(cols):
+        if scaler.scale_[k] == old_scale[k] and scaler.min_[k] == old_offset[k]:
+            continue
+        for forest in forests:
+            for estimator in forest.estimators_:
+                tree = estimator.tree_
+                nodes = tree.feature == outputs[col]
+                # tree.threshold is a view of the tree's node array: updated in place
+                tree.threshold[nodes] = (tree.threshold[nodes] - old_offset[k]) / old_scale[k] * scaler.scale_[k] + scaler.min_[k]
+
+    drift = {}
+    for k, col in enumerate(cols):
+        outside = (batch[:, k] < old_min[k]) | (batch[:, k] > old_max[k])
+        drift[col] = {
+            "old_range": [float(old_min[k]), float(old_max[k])],
+            "batch_range": [float(batch[:, k].min()), float(batch[:, k].max())],
+            "new_range": [float(scaler.data_min_[k]), float(scaler.data_max_[k])],
+            "outside_old_range": float(outside.mean()),
+        }
+    return drift
+
+
+def print_drift(drift):
+    print(f"  {'scaler column':<26}{'old range':>22}{'batch range':>22}{'outside':>10}")
+    for col, d in drift.items():
+        old, new = "[{:.1f}, {:.1f}]".format(*d["old_range"]), "[{:.1f}, {:.1f}]".format(*d["batch_range"])
+        flag = "  range widened" if d["new_range"] != d["old_range"] else ""
+        print(f"  {col:<26}{old:>22}{new:>22}{d['outside_old_range']:>9.1%}{flag}")
+
+
+def grow_forest(forest, X, y, new_trees, max_trees=None, n_jobs=-1):
+    """Append new_trees trees fitted on (X, y) to a fitted forest; keep at most max_trees, newest first."""
+    known = np.isin(y, forest.classes_)
+    missing = np.setdiff1d(forest.classes_, y[known])
+    if missing.size:
+        raise ValueError(f"No training rows for classes {missing.tolist()}: every class the model knows must be present")
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + new_trees, n_jobs=n_jobs)
+    forest.fit(X[known], y[known])
+    forest.set_params(warm_start=False)
+    if max_trees and len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+        forest.n_estimators = max_trees
+    return forest
+
+
+def train_incremental(new_path, base_dir=".", out_dir=VERSIONS_DIR, new_trees=NEW_TREES, max_trees=None,
+                      n_jobs=-1, resampling=True):
+    """Grow the forests in base_dir with trees fitted on a file of new labelled readings.
+
+    Only the new file is read. The new trees of both models are fitted on
+    the new rows plus the reservoir of historical rows (every failure type
+    kept), the scaler bounds are widened as needed (see update_scaler), and
+    the result is written as version N+1 under out_dir/vNNNN. Returns the
+    per-stage timings in seconds.
+    """
+    timings = {}
+
+    with stage("load base version", timings):
+        preprocessing, model, model2 = load_artifacts(*(
+            os.path.join(base_dir, os.path.basename(path)) for path in (PREPROCESSOR_PATH, MODEL_PATH, MODEL2_PATH)
+        ))
+        state_path = os.path.join(base_dir, STATE_PATH)
+        if not os.path.exists(state_path):
+            raise FileNotFoundError(f"{state_path} not found: run a full `python train.py` first")
+        state = joblib.load(state_path)
+
+    with stage("load new data", timings):
+        X_new, y_new, y_type_new = load_training_data(new_path)
+    print(f"  {len(X_new):,} new rows, {int(y_new.sum()):,} failures")
+
+    with stage("update scaler", timings):
+        drift = update_scaler(preprocessing, [model, model2], X_new)
+    print_drift(drift)
+
+    with stage("training set", timings):
+        X_old, y_old, y_type_old = reservoir_rows(state)
+        X_fit = pd.concat([X_new, X_old], ignore_index=True)
+        y_fit = pd.concat([y_new, y_old], ignore_index=True).to_numpy(dtype=np.int64)
+        y_type_fit = pd.concat([y_type_new, y_type_old], ignore_index=True).to_numpy(dtype=np.int64)
+        update_reservoir(state, X_new, y_new, y_type_new)
+        # Next free number in out_dir, if another update from an older base got there first
+        state["version"] = max(state["version"] + 1, ModelRegistry(out_dir).next_version())
+    print(f"  {len(X_fit):,} rows ({len(X_old):,} from the reservoir)")
+
+    with stage("preprocess", timings):
+        X_fit_preprocessed = preprocessing.transform(X_fit)
+        failed = y_fit == 1
+
+    X_train, y_train = X_fit_preprocessed, y_fit
+    if resampling:
+        with stage("resample (SMOTETomek)", timings):
+            X_train, y_train = resample(X_train, y_train, n_jobs)
+
+    with stage(f"grow failure model +{new_trees}", timings):
+        grow_forest(model, X_train, y_train, new_trees, max_trees, n_jobs)
+
+    with stage(f"grow failure-type model +{new_trees}", timings):
+        grow_forest(model2, X_fit_preprocessed[failed], y_type_fit[failed], new_trees, max_trees, n_jobs)
+
+    version_dir = os.path.join(out_dir, f"v{state['version']:04d}")
+    with stage("save", timings):
+        save_version(version_dir, preprocessing, model, model2, state, {
+            "mode": "incremental", "parent": os.path.abspath(base_dir), "data": new_path,
+            "rows": len(X_new), "training_rows": len(X_fit), "drift": drift, "timings": timings,
+        })
+
+    print(f"{'total':<28}{sum(timings.values()):9.2f} s")
+    print(f"wrote {version_dir}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="data.csv")
+    parser.add_argument("--out-dir", help="where to write the artifacts (default: . for a full train, "
+                                          f"{VERSIONS_DIR}/vNNNN for an incremental one)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores for resampling and forest fitting (-1 = all)")
+    parser.add_argument("--max-samples", type=float, default=None,
+                        help="bootstrap sample per tree, as a fraction of the training rows (default: all rows, as "
+                             "in the notebook); e.g. 0.1 keeps 10M-row retrains to minutes")
+    parser.add_argument("--no-resample", dest="resampling", action="store_false", help="skip SMOTETomek")
+
+    incremental = parser.add_argument_group("incremental mode")
+    incremental.add_argument("--incremental", metavar="NEW_CSV",
+                             help="grow the model in --base-dir with trees fitted on these new labelled readings")
+    incremental.add_argument("--base-dir", default=".", help="version to start from (default: the served artifacts)")
+    incremental.add_argument("--new-trees", type=int, default=NEW_TREES, help="trees added to each forest")
+    incremental.add_argument("--max-trees", type=int, default=None, help="drop the oldest trees beyond this many")
+    args = parser.parse_args()
+
+    if args.incremental:
+        train_incremental(args.incremental, args.base_dir, args.out_dir or VERSIONS_DIR, args.new_trees,
+                          args.max_trees, args.n_jobs, args.resampling)
+    else:
+        train(args.data, args.out_dir or ".", args.n_jobs, args.max_samples, args.resampling)
+
+
+if __name__ == "__main__":
+    main()